@@ -0,0 +1,136 @@
+"""
+Admission control for the API.
+
+Each lane caps how many requests run at once and how many may wait for a
+slot. A request that finds the queue full, or waits longer than the queue-time
+budget, is rejected immediately with 503 + Retry-After instead of piling up
+behind work the server cannot finish in time. Cheap endpoints (/health, /)
+get their own lane so they are never starved by /recommend traffic.
+
+Limits are per worker process; the event loop is single-threaded, so lane
+bookkeeping needs no locks.
+"""
+import asyncio
+import collections
+import time
+
+from starlette.responses import JSONResponse
+
+from histogram import Histogram
+from metrics import record_stage
+
+QUEUE_WAIT_BUCKETS_MS = (0.1, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+class Lane:
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self.active = 0
+        self.waiters = collections.deque()
+        self.admitted = 0
+        self.shed = {"queue_full": 0, "queue_timeout": 0}
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_BUCKETS_MS)
+
+    async def acquire(self):
+        """Wait for a slot. Returns False if the request should be shed."""
+        if self.active < self.max_concurrent and not self.waiters:
+            self.active += 1
+            self.admitted += 1
+            self.queue_wait_ms.observe(0)
+            return True
+
+        if len(self.waiters) >= self.max_queue:
+            self.shed["queue_full"] += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # Client went away; give back a slot that was handed over meanwhile
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+
+        # release() hands its slot over by resolving the waiter, so a resolved
+        # waiter already owns a slot even if the timeout fired at the same time
+        if waiter.done() and not waiter.cancelled():
+            wait_ms = (time.perf_counter() - start) * 1000
+            self.admitted += 1
+            self.queue_wait_ms.observe(wait_ms)
+            record_stage("queue_wait", wait_ms)
+            return True
+
+        self.shed["queue_timeout"] += 1
+        return False
+
+    def release(self):
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self):
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "queue_timeout_ms": self.queue_timeout * 1000,
+            "active": self.active,
+            "queued": len(self.waiters),
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+        }
+
+
+class AdmissionController:
+    def __init__(self, default_lane, priority_lane, priority_paths, retry_after):
+        self.default_lane = default_lane
+        self.priority_lane = priority_lane
+        self.priority_paths = frozenset(priority_paths)
+        self.retry_after = retry_after
+
+    def lane_for(self, path):
+        return self.priority_lane if path in self.priority_paths else self.default_lane
+
+    def stats(self):
+        return {lane.name: lane.stats() for lane in (self.priority_lane, self.default_lane)}
+
+
+class AdmissionControlMiddleware:
+    def __init__(self, app, controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        lane = self.controller.lane_for(scope["path"])
+        if not await lane.acquire():
+            response = JSONResponse(
+                {"detail": "Server overloaded, retry later"},
+                status_code=503,
+                headers={"Retry-After": str(self.controller.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            lane.release()
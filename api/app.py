@@ -1,13 +1,23 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from fastapi.responses import JSONResponse, PlainTextResponse
+import asyncio
+import hmac
 import json
 import time
 import os
 from typing import List, Dict, Any
 import uvicorn
 
+from admission import AdmissionControlMiddleware, AdmissionController, Lane
+from circuit_breaker import CircuitBreaker, StaleCache
+from config import Config
+from db import get_pool, pool_size_per_worker
+from metrics import REGISTRY, MetricsMiddleware, stage
+from profiler import PROFILER, ProfileBusy, SlowRequestLog
+from state import STATE, preload_state, start_popularity_refresher
+from versions import VERSIONS, etag_matches, last_modified, make_etag
+
 app = FastAPI(
     title="Recommendation API - No Cloud",
     description="Single-server recommendation engine on localhost",
@@ -22,21 +32,200 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-DB_CONFIG = {
-    'host': 'localhost',
-    'database': 'recommendations',
-    'user': "s4p",
-    'password': os.getenv('DB_PASSWORD', '')
-}
+admission = AdmissionController(
+    default_lane=Lane(
+        "default",
+        max_concurrent=Config.ADMISSION_MAX_CONCURRENT or max(
+            1, pool_size_per_worker() - Config.PRIORITY_MAX_CONCURRENT),
+        max_queue=Config.ADMISSION_MAX_QUEUE,
+        queue_timeout=Config.ADMISSION_QUEUE_TIMEOUT,
+    ),
+    priority_lane=Lane(
+        "priority",
+        max_concurrent=Config.PRIORITY_MAX_CONCURRENT,
+        max_queue=Config.ADMISSION_MAX_QUEUE,
+        queue_timeout=Config.ADMISSION_QUEUE_TIMEOUT,
+    ),
+    priority_paths=Config.PRIORITY_PATHS,
+    retry_after=Config.ADMISSION_RETRY_AFTER,
+)
+if Config.ADMISSION_ENABLED:
+    app.add_middleware(AdmissionControlMiddleware, controller=admission)
+
+slow_requests = SlowRequestLog(Config.SLOW_REQUEST_MS, capacity=Config.SLOW_REQUEST_LOG_SIZE)
+
+# Added last so it is outermost and also times (and counts) shed requests
+if Config.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, server_timing=Config.SERVER_TIMING_ENABLED,
+                       slow_log=slow_requests if Config.ADMIN_ENABLED else None)
+
+
+db_breaker = CircuitBreaker(
+    "postgres",
+    failure_threshold=Config.DB_BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=Config.DB_BREAKER_RESET_TIMEOUT,
+    enabled=Config.DB_BREAKER_ENABLED,
+)
+stale_cache = StaleCache(Config.STALE_CACHE_SIZE)
 
 
 def get_db_connection():
+    # While the circuit is open, fail fast instead of waiting on a dead server
+    if not db_breaker.allow():
+        raise HTTPException(
+            status_code=503,
+            detail="Database unavailable (circuit open)",
+            headers={"Retry-After": str(max(1, round(db_breaker.retry_after())))}
+        )
     try:
-        return psycopg2.connect(**DB_CONFIG, cursor_factory=RealDictCursor)
+        with stage("pool_wait"):
+            return get_pool().getconn()
     except Exception as e:
+        if db_breaker.is_outage(e):
+            db_breaker.record(e)
+        else:
+            # No connection was obtained (e.g. pool exhausted), so Postgres was never asked
+            db_breaker.release_probe()
         raise HTTPException(status_code=503, detail=f"Database connection failed: {str(e)}")
 
 
+def release_db_connection(conn, discard=False, error=None):
+    # Broken connections are closed instead of going back to the pool
+    get_pool().putconn(conn, close=discard or error is not None)
+    db_breaker.record(error)
+
+
+@app.on_event("startup")
+def start_refreshers():
+    # Runs in every worker after fork; threads do not survive the fork
+    VERSIONS.start_refresher(Config.VERSION_MAP_REFRESH_SECONDS, Config.VERSION_MAP_LOOKBACK_SECONDS,
+                             Config.VERSION_MAP_FULL_RELOAD_SECONDS)
+    start_popularity_refresher(Config.POPULARITY_REFRESH_SECONDS)
+
+
+def validator_headers(computed_at, limit):
+    if computed_at is None:
+        return {}
+    return {
+        "ETag": make_etag(computed_at, limit),
+        "Last-Modified": last_modified(computed_at),
+        "Cache-Control": "no-cache",
+    }
+
+
+def not_modified(request, computed_at, limit):
+    if_none_match = request.headers.get("if-none-match")
+    return bool(if_none_match and computed_at and etag_matches(if_none_match, make_etag(computed_at, limit)))
+
+
+def recommendation_response(user_id, enriched_recommendations, computed_at, start_time, limit, stale_source=None):
+    latency_ms = (time.time() - start_time) * 1000
+    body = {
+        "user_id": user_id,
+        "recommendations": enriched_recommendations,
+        "count": len(enriched_recommendations),
+        "computed_at": computed_at.isoformat() if computed_at else None,
+        "latency_ms": round(latency_ms, 2),
+        "cold_start": False,
+        "architecture": "no-cloud"
+    }
+    headers = validator_headers(computed_at, limit)
+    if stale_source:
+        body.update({"stale": True, "stale_source": stale_source})
+        headers["Warning"] = '110 - "Response is Stale"'
+
+    # Serialized here rather than by FastAPI so the cost shows up as a stage
+    with stage("serialize"):
+        return JSONResponse(body, headers=headers)
+
+
+def stale_response(user_id, start_time, limit):
+    """
+    Last known recommendations while Postgres is unavailable: the worker's LRU
+    of recently served lists, then the preloaded snapshot, then popularity.
+    None if there is nothing to serve.
+    """
+    for source, entry in (("cache", stale_cache.get(user_id)), ("snapshot", STATE.recommendations.get(user_id))):
+        REGISTRY.cache_lookup(f"stale_{source}", entry is not None)
+        if entry is not None:
+            recommended_items, computed_at = entry
+            # Without the item index, lists are served unfiltered; they only hold catalog items
+            enriched_recommendations = (
+                enrich_recommendations(recommended_items[:limit], None) if STATE.loaded
+                else [{"item_id": rec['item_id'], "predicted_score": rec['score']} for rec in recommended_items[:limit]]
+            )
+            return recommendation_response(user_id, enriched_recommendations, computed_at, start_time, limit,
+                                           stale_source=source)
+
+    response = popularity_response(user_id, start_time, limit, stale=True)
+    REGISTRY.cache_lookup("stale_popularity", response is not None)
+    return response
+
+
+def popularity_response(user_id, start_time, limit, stale=False):
+    """Popular items for a user without precomputed recommendations, or None."""
+    ranking = Config.COLD_START_RANKING
+    if not STATE.popularity.get(ranking, ([], None))[0]:
+        ranking = "global"
+    ranked_items, computed_at = STATE.popularity.get(ranking, ([], None))
+    if not ranked_items:
+        return None
+
+    recommendations = [
+        {
+            "item_id": rec['item_id'],
+            "predicted_score": rec['score']
+        }
+        for rec in ranked_items[:limit]
+    ]
+    latency_ms = (time.time() - start_time) * 1000
+    body = {
+        "user_id": user_id,
+        "recommendations": recommendations,
+        "count": len(recommendations),
+        "computed_at": computed_at.isoformat() if computed_at else None,
+        "latency_ms": round(latency_ms, 2),
+        "cold_start": True,
+        "fallback": f"popularity:{ranking}",
+        "architecture": "no-cloud"
+    }
+    headers = {}
+    if stale:
+        body.update({"stale": True, "stale_source": "popularity"})
+        headers["Warning"] = '110 - "Response is Stale"'
+
+    with stage("serialize"):
+        return JSONResponse(body, headers=headers)
+
+
+def enrich_recommendations(recommendations, cursor):
+    item_ids = [rec['item_id'] for rec in recommendations]
+    known_items = set()
+    if STATE.loaded:
+        # The index is loaded before fork and never refreshed, so only query
+        # for ids it does not have (items added since startup). Without a
+        # cursor (lists from the snapshot, loaded with the index) it is final.
+        known_items = STATE.item_ids.intersection(item_ids)
+        item_ids = [item_id for item_id in item_ids if item_id not in known_items]
+    REGISTRY.cache_lookup("item_index", STATE.loaded and not item_ids)
+    if item_ids and cursor is not None:
+        with stage("item_query"):
+            cursor.execute(
+                "SELECT item_id FROM items WHERE item_id = ANY(%s)",
+                (item_ids,)
+            )
+            known_items.update(row['item_id'] for row in cursor.fetchall())
+
+    return [
+        {
+            "item_id": rec['item_id'],
+            "predicted_score": rec['score']
+        }
+        for rec in recommendations
+        if rec['item_id'] in known_items
+    ]
+
+
 @app.get("/")
 async def root():
     return {
@@ -53,50 +242,177 @@ async def root():
     }
 
 
+# Handlers that talk to Postgres are plain `def` so FastAPI runs them in its
+# threadpool, each with its own pooled connection, instead of blocking the loop.
 @app.get("/health")
-async def health_check():
+def health_check():
+    conn = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT 1")
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
+        conn = None
 
         return {
             "status": "healthy",
             "database": "connected",
+            "circuit": db_breaker.state,
             "timestamp": time.time()
         }
     except Exception as e:
+        if conn:
+            release_db_connection(conn, error=e)
         return {
             "status": "unhealthy",
             "database": "disconnected",
-            "error": str(e),
+            "circuit": db_breaker.state,
+            "error": str(getattr(e, "detail", e)),
             "timestamp": time.time()
         }
 
 
+@app.get("/admission")
+async def admission_stats():
+    return admission.stats()
+
+
+@app.get("/circuit")
+async def circuit_stats():
+    return {**db_breaker.stats(), "stale_cache_entries": len(stale_cache)}
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(
+        REGISTRY.render_prometheus(admission if Config.ADMISSION_ENABLED else None, db_breaker),
+        media_type="text/plain; version=0.0.4"
+    )
+
+
+def require_admin(request):
+    # 404 rather than 403 while disabled, so the endpoints do not advertise themselves
+    if not (Config.ADMIN_ENABLED and Config.ADMIN_TOKEN):
+        raise HTTPException(status_code=404, detail="Not Found")
+    token = request.headers.get("x-admin-token", "")
+    if not hmac.compare_digest(token.encode(), Config.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@app.get("/admin/profile")
+async def profile(request: Request, seconds: float = 10.0, interval_ms: float = Config.PROFILE_DEFAULT_INTERVAL_MS,
+                  format: str = "collapsed", idle: bool = False):
+    """
+    Samples every thread of this worker for `seconds` and returns collapsed
+    stacks (format=collapsed, ready for flamegraph.pl / speedscope) or a
+    summary of the hottest leaf frames (format=json).
+    """
+    require_admin(request)
+    if not 0 < seconds <= Config.PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {Config.PROFILE_MAX_SECONDS}]")
+    if not 1 <= interval_ms <= 1000:
+        raise HTTPException(status_code=400, detail="interval_ms must be between 1 and 1000")
+    if format not in ("collapsed", "json"):
+        raise HTTPException(status_code=400, detail="format must be 'collapsed' or 'json'")
+
+    try:
+        PROFILER.start(seconds, interval=interval_ms / 1000, include_idle=idle)
+    except ProfileBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    try:
+        # Waits on the event loop, so the worker keeps serving while it is sampled
+        await asyncio.sleep(seconds)
+    finally:
+        await asyncio.get_running_loop().run_in_executor(None, PROFILER.stop)
+
+    if format == "json":
+        return PROFILER.summary()
+    return PlainTextResponse(
+        PROFILER.collapsed(),
+        headers={"Content-Disposition": f'attachment; filename="profile-{os.getpid()}-{int(time.time())}.collapsed"'}
+    )
+
+
+def slow_request_status():
+    return {
+        "pid": os.getpid(),
+        "enabled": slow_requests.enabled and Config.METRICS_ENABLED,
+        "threshold_ms": slow_requests.threshold_ms,
+        "recorded": slow_requests.recorded,
+    }
+
+
+@app.get("/admin/slow-requests")
+async def slow_request_traces(request: Request, limit: int = 50):
+    require_admin(request)
+    return {**slow_request_status(), "traces": slow_requests.traces(limit)}
+
+
+# Changes state, so it is a POST: a prefetch or a scrape of the GET cannot reconfigure or wipe the log
+@app.post("/admin/slow-requests")
+async def configure_slow_requests(request: Request, threshold_ms: float = None, enabled: bool = None,
+                                  clear: bool = False):
+    require_admin(request)
+    if threshold_ms is not None and threshold_ms <= 0:
+        raise HTTPException(status_code=400, detail="threshold_ms must be positive; use enabled=false to disable")
+    if threshold_ms is not None and enabled is None:
+        enabled = True  # setting a threshold turns the log on
+    slow_requests.configure(threshold_ms=threshold_ms, enabled=enabled)
+    if clear:
+        slow_requests.clear()
+    return slow_request_status()
+
+
 @app.get("/recommend/{user_id}")
-async def get_recommendations(user_id: str, limit: int = 10):
+def get_recommendations(request: Request, user_id: str, limit: int = Config.DEFAULT_RECOMMENDATION_LIMIT):
     start_time = time.time()
 
-    if limit < 1 or limit > 20:
-        raise HTTPException(status_code=400, detail="Limit must be between 1 and 20")
+    if limit < 1 or limit > Config.TOP_N_LIMIT:
+        raise HTTPException(status_code=400, detail=f"Limit must be between 1 and {Config.TOP_N_LIMIT}")
+
+    # Revalidation is answered from the version map without touching Postgres
+    if "if-none-match" in request.headers:
+        known_version = VERSIONS.get(user_id)
+        REGISTRY.cache_lookup("version_map", known_version is not None)
+        if not_modified(request, known_version, limit):
+            return Response(status_code=304, headers=validator_headers(known_version, limit))
+
+    if Config.SERVE_FROM_SNAPSHOT:
+        REGISTRY.cache_lookup("snapshot", user_id in STATE.recommendations)
+        if user_id in STATE.recommendations:
+            recommended_items, computed_at = STATE.recommendations[user_id]
+            with stage("enrich"):
+                enriched_recommendations = enrich_recommendations(recommended_items[:limit], None)
+            return recommendation_response(user_id, enriched_recommendations, computed_at, start_time, limit)
 
-    conn = None
     try:
         conn = get_db_connection()
+    except HTTPException:
+        # Circuit open or no connection: serve the last known list instead of failing
+        response = stale_response(user_id, start_time, limit)
+        if response is not None:
+            return response
+        raise
+
+    try:
         cursor = conn.cursor()
 
-        cursor.execute(
-            "SELECT recommended_items, computed_at FROM recommendations WHERE user_id = %s",
-            (user_id,)
-        )
-        result = cursor.fetchone()
+        with stage("recommendation_query"):
+            cursor.execute(
+                "SELECT recommended_items, computed_at FROM recommendations WHERE user_id = %s",
+                (user_id,)
+            )
+            result = cursor.fetchone()
 
         if not result:
             cursor.close()
-            conn.close()
+            release_db_connection(conn)
+            conn = None
+            response = popularity_response(user_id, start_time, limit)
+            REGISTRY.cache_lookup("popularity", response is not None)
+            if response is not None:
+                return response
             raise HTTPException(
                 status_code=404,
                 detail=f"No recommendations found for user: {user_id}"
@@ -104,47 +420,39 @@ async def get_recommendations(user_id: str, limit: int = 10):
 
         recommendations = result['recommended_items'][:limit]
         computed_at = result['computed_at']
+        VERSIONS.update(user_id, computed_at)
+        stale_cache.put(user_id, result['recommended_items'], computed_at)
 
-        item_ids = [rec['item_id'] for rec in recommendations]
-        cursor.execute(
-            "SELECT item_id FROM items WHERE item_id = ANY(%s)",
-            (item_ids,)
-        )
-        items = {row['item_id']: dict(row) for row in cursor.fetchall()}
+        if not_modified(request, computed_at, limit):
+            cursor.close()
+            release_db_connection(conn)
+            conn = None
+            return Response(status_code=304, headers=validator_headers(computed_at, limit))
 
-        enriched_recommendations = []
-        for rec in recommendations:
-            item_id = rec['item_id']
-            if item_id in items:
-                enriched_recommendations.append({
-                    "item_id": item_id,
-                    "predicted_score": rec['score']
-                })
+        with stage("enrich"):
+            enriched_recommendations = enrich_recommendations(recommendations, cursor)
 
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
+        conn = None
 
-        latency_ms = (time.time() - start_time) * 1000
-
-        return {
-            "user_id": user_id,
-            "recommendations": enriched_recommendations,
-            "count": len(enriched_recommendations),
-            "computed_at": computed_at.isoformat() if computed_at else None,
-            "latency_ms": round(latency_ms, 2),
-            "architecture": "no-cloud"
-        }
+        return recommendation_response(user_id, enriched_recommendations, computed_at, start_time, limit)
 
     except HTTPException:
         raise
     except Exception as e:
         if conn:
-            conn.close()
+            release_db_connection(conn, error=e)
+        if db_breaker.is_outage(e):
+            response = stale_response(user_id, start_time, limit)
+            if response is not None:
+                return response
+            raise HTTPException(status_code=503, detail=f"Database unavailable: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
 
 
 @app.get("/stats")
-async def get_stats():
+def get_stats():
     conn = None
     try:
         conn = get_db_connection()
@@ -167,7 +475,8 @@ async def get_stats():
         num_recommendations = cursor.fetchone()['count']
 
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
+        conn = None
 
         return {
             "users": num_users,
@@ -180,14 +489,16 @@ async def get_stats():
             "auto_scaling": "disabled"
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         if conn:
-            conn.close()
+            release_db_connection(conn, error=e)
         raise HTTPException(status_code=500, detail=f"Error fetching stats: {str(e)}")
 
 
 @app.post("/interaction")
-async def record_interaction(user_id: str, item_id: str, rating: float):
+def record_interaction(user_id: str, item_id: str, rating: float):
     if rating < 1.0 or rating > 5.0:
         raise HTTPException(status_code=400, detail="Rating must be between 1.0 and 5.0")
 
@@ -201,39 +512,52 @@ async def record_interaction(user_id: str, item_id: str, rating: float):
             """
             INSERT INTO interactions (user_id, item_id, rating, timestamp)
             VALUES (%s, %s, %s, %s)
+            RETURNING interaction_id
             """,
             (user_id, item_id, rating, int(time.time()))
         )
+        interaction_id = cursor.fetchone()['interaction_id']
 
         conn.commit()
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
+        conn = None
 
         return {
             "status": "success",
             "message": "Interaction recorded",
+            "interaction_id": interaction_id,
             "note": "Recommendations will be updated in next batch re-computation"
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         if conn:
-            conn.rollback()
-            conn.close()
+            release_db_connection(conn, error=e)
         raise HTTPException(status_code=500, detail=f"Error recording interaction: {str(e)}")
 
 
 if __name__ == "__main__":
-    print("Starting No-Cloud Recommendation API")
-    print("Architecture: Single-threaded server on localhost")
-    print("Database: PostgreSQL (no connection pooling)")
-    print("Scaling: None (fixed capacity)")
-    print("Monitoring: Basic logging only")
-
-    # Run with single worker (intentional bottleneck)
-    uvicorn.run(
-        app,
-        host="0.0.0.0",
-        port=8000,
-        workers=1,  # Single process - bottleneck for demo
-        log_level="info"
-    )
\ No newline at end of file
+    if Config.API_WORKERS > 1:
+        from launcher import run_production
+        run_production()
+    else:
+        print("Starting No-Cloud Recommendation API")
+        print(f"Environment: {Config.ENVIRONMENT}")
+        print("Architecture: Single worker on localhost")
+        print("Database: PostgreSQL (per-worker connection pool)")
+        print("Scaling: None (fixed capacity)")
+        print("Monitoring: Basic logging only")
+
+        if Config.PRELOAD_STATE:
+            preload_state()
+
+        # Single worker; set APP_ENV=PRODUCTION for the multi-worker launcher
+        uvicorn.run(
+            app,
+            host=Config.API_HOST,
+            port=Config.API_PORT,
+            workers=1,
+            log_level="info"
+        )
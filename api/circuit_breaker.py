@@ -0,0 +1,167 @@
+"""
+Circuit breaker around Postgres, and the last-known lists served while it is open.
+
+CircuitBreaker counts consecutive connection-level failures (the database is
+down or unreachable, not a bad query). After `failure_threshold` of them it
+opens: callers fail fast without touching the pool, so requests no longer
+each wait out a connect attempt. After `reset_timeout` seconds it goes
+half-open and lets a single probe request through; success closes it,
+failure re-opens it for another `reset_timeout`.
+
+StaleCache keeps the most recent recommendation list of recently served
+users (LRU, per worker), so /recommend can answer them with `stale: true`
+while the breaker is open, alongside the preloaded snapshot in state.py.
+
+Both are per worker process; each worker trips and recovers on its own.
+"""
+import collections
+import threading
+import time
+
+import psycopg2
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Errors that mean the database itself is unavailable. Pool timeouts
+# (psycopg2.pool.PoolError) mean we are overloaded, not that Postgres is down.
+OUTAGE_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold, reset_timeout, enabled=True, outage_errors=OUTAGE_ERRORS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.enabled = enabled
+        self.outage_errors = outage_errors
+
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_started = None
+        self.trips = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def is_outage(self, error):
+        return isinstance(error, self.outage_errors)
+
+    def allow(self):
+        """Whether a call may go to the database now. In half-open, one probe at a time."""
+        if not self.enabled:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self.probe_started = None
+            if self.state == HALF_OPEN:
+                # A probe that never reported back (e.g. its client went away) is given up on
+                if self.probe_started is None or now - self.probe_started >= self.reset_timeout:
+                    self.probe_started = now
+                    return True
+            elif self.state == CLOSED:
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, error=None):
+        """Outcome of an allowed call that reached the database: None for success, else its exception."""
+        if not self.enabled:
+            return
+        if error is None:
+            self._success()
+        elif self.is_outage(error):
+            self._failure()
+        else:
+            # The database answered; only a probe needs to hear about it
+            with self._lock:
+                if self.state == HALF_OPEN:
+                    self._close()
+
+    def release_probe(self):
+        """
+        An allowed call ended without reaching the database (e.g. a pool
+        timeout), so it says nothing about Postgres: a half-open breaker stays
+        half-open and lets the next caller probe.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.probe_started = None
+
+    def _success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                self._close()
+            self.consecutive_failures = 0
+
+    def _failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or (
+                    self.state == CLOSED and self.consecutive_failures >= self.failure_threshold):
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.probe_started = None
+                self.trips += 1
+                print(f"Circuit '{self.name}' opened after {self.consecutive_failures} consecutive failures")
+
+    def _close(self):
+        print(f"Circuit '{self.name}' closed")
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_started = None
+
+    def retry_after(self):
+        """Seconds until the next probe may go through (0 when closed)."""
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_timeout_seconds": self.reset_timeout,
+                "open_for_seconds": round(time.monotonic() - self.opened_at, 3) if self.opened_at else None,
+                "trips": self.trips,
+                "rejected": self.rejected,
+            }
+
+
+class StaleCache:
+    """Thread-safe LRU of user_id -> (recommended_items, computed_at)."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, user_id, recommended_items, computed_at):
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = (recommended_items, computed_at)
+            self._entries.move_to_end(user_id)
+            if len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+            return entry
+
+    def __len__(self):
+        return len(self._entries)
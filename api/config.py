@@ -9,25 +9,92 @@ class BaseConfig:
     DB_USER: str = "s4p"
     # Use os.getenv() here, but the actual retrieval is handled in app.py
     DB_PASSWORD: str = os.getenv('DB_PASSWORD', '')
+    # Seconds; without it a connect to a dead host can hang for minutes
+    DB_CONNECT_TIMEOUT: int = int(os.getenv('DB_CONNECT_TIMEOUT', 2))
 
     DB_CONFIG: Dict[str, str] = {
         'host': DB_HOST,
         'database': DB_NAME,
         'user': DB_USER,
-        'password': DB_PASSWORD
+        'password': DB_PASSWORD,
+        'connect_timeout': DB_CONNECT_TIMEOUT
     }
 
+    # Connection pooling (one pool per worker process)
+    # Postgres default max_connections; the launcher replaces it with the server's value
+    DB_MAX_CONNECTIONS: int = 100
+    # Left free for precompute, psql and the monitor
+    DB_RESERVED_CONNECTIONS: int = 10
+    DB_POOL_MIN_SIZE: int = 1
+    DB_POOL_MAX_SIZE: int = 20 # Upper bound per worker, even if the budget allows more
+    DB_POOL_TIMEOUT: float = 5.0 # Seconds to wait for a free connection before 503
+
+    # Circuit breaker (per worker): open after this many consecutive connection
+    # failures, fail fast while open, probe again after the reset timeout
+    DB_BREAKER_ENABLED: bool = True
+    DB_BREAKER_FAILURE_THRESHOLD: int = 5
+    DB_BREAKER_RESET_TIMEOUT: float = 5.0
+    # Last-known recommendation lists kept per worker for stale serving
+    STALE_CACHE_SIZE: int = 10000
+
     # 2. API Configuration
     API_HOST: str = "0.0.0.0"
     API_PORT: int = 8000
     API_WORKERS: int = 1 # Overridden in Production
 
+    # Admission control (per worker). Excess requests get 503 + Retry-After
+    # instead of queueing indefinitely.
+    ADMISSION_ENABLED: bool = True
+    # Requests running at once; None means the worker's connection pool size
+    # minus PRIORITY_MAX_CONCURRENT, so the priority lane always finds a connection
+    ADMISSION_MAX_CONCURRENT: int = None
+    ADMISSION_MAX_QUEUE: int = 64
+    ADMISSION_QUEUE_TIMEOUT: float = 0.25 # Seconds a request may wait for a slot
+    ADMISSION_RETRY_AFTER: int = 1 # Seconds, sent in the Retry-After header
+    # Served from their own lane so they are never starved by /recommend
+    # (/admin/profile is not one: it holds its request for the whole capture)
+    PRIORITY_PATHS: tuple = ("/", "/health", "/admission", "/circuit", "/metrics",
+                             "/admin/slow-requests")
+    PRIORITY_MAX_CONCURRENT: int = 4
+
+    # Per-stage latency histograms on /metrics and in Server-Timing headers
+    METRICS_ENABLED: bool = True
+    SERVER_TIMING_ENABLED: bool = True
+
+    # Admin endpoints (/admin/profile, /admin/slow-requests). Off unless both are
+    # set; requests must send the token in the X-Admin-Token header.
+    ADMIN_ENABLED: bool = os.getenv('ADMIN_ENABLED', '').lower() in ('1', 'true', 'yes')
+    ADMIN_TOKEN: str = os.getenv('ADMIN_TOKEN', '')
+    PROFILE_MAX_SECONDS: float = 60.0
+    PROFILE_DEFAULT_INTERVAL_MS: float = 5.0
+    # Requests slower than this keep their stage breakdown; 0 or empty disables the log
+    SLOW_REQUEST_MS: float = float(os.getenv('SLOW_REQUEST_MS', '500') or 0) or None
+    SLOW_REQUEST_LOG_SIZE: int = 200
+
+    # Conditional GET: how often each worker refreshes its user_id -> computed_at
+    # map, and how far back each incremental refresh looks
+    VERSION_MAP_REFRESH_SECONDS: float = 30.0
+    VERSION_MAP_LOOKBACK_SECONDS: float = 3600.0
+    # Full rebuild of the map, which also drops users whose row was deleted
+    VERSION_MAP_FULL_RELOAD_SECONDS: float = 600.0
+
+    # Cold users (no precomputed list) get this popularity ranking instead of a 404
+    COLD_START_RANKING: str = "trending"
+    POPULARITY_REFRESH_SECONDS: float = 60.0
+
     # 3. Model/Recommendation Settings
     # Maximum number of recommendations to return
     TOP_N_LIMIT: int = 20
     # Default limit for the API endpoint
     DEFAULT_RECOMMENDATION_LIMIT: int = 10
 
+    # Read-only state loaded once before the workers are forked (see state.py)
+    PRELOAD_STATE: bool = True
+    # Serve /recommend from the preloaded snapshot instead of querying Postgres.
+    # The snapshot only changes on restart, so leave this off unless precompute
+    # is followed by a restart.
+    SERVE_FROM_SNAPSHOT: bool = False
+
     # 4. Base File Paths
     # Define a base path if needed, or define specific paths below.
     DATA_BASE_PATH: str = "../data/processed"
@@ -57,7 +124,7 @@ class ProductionConfig(BaseConfig):
 
     # 2. API Configuration (Optimized for performance)
     API_PORT: int = 8000
-    API_WORKERS: int = 4 # Use multiple workers for concurrency
+    API_WORKERS: int = int(os.getenv('API_WORKERS', 4)) # Use multiple workers for concurrency
 
     # 4. File Paths (Using the full dataset files)
     CSV_PATHS: Dict[str, str] = {
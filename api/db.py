@@ -0,0 +1,71 @@
+"""
+Per-process PostgreSQL connection pool for the API.
+
+Each worker process owns its own pool. A pool created before a fork shares
+sockets with the parent, so the pool is (re)built lazily the first time it is
+used in a new process. Pool sizes are derived from the worker count so the
+total across all workers stays under the server's max_connections.
+"""
+import os
+import threading
+
+from psycopg2 import pool
+from psycopg2.extras import RealDictCursor
+
+from config import Config
+
+
+class BlockingConnectionPool(pool.ThreadedConnectionPool):
+    """ThreadedConnectionPool that waits for a free connection instead of raising."""
+
+    def __init__(self, minconn, maxconn, timeout, *args, **kwargs):
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._timeout = timeout
+        super().__init__(minconn, maxconn, *args, **kwargs)
+
+    def getconn(self, key=None):
+        if not self._slots.acquire(timeout=self._timeout):
+            raise pool.PoolError(f"Timed out after {self._timeout}s waiting for a pooled connection")
+        try:
+            return super().getconn(key)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn=None, key=None, close=False):
+        try:
+            super().putconn(conn, key, close)
+        finally:
+            self._slots.release()
+
+
+def pool_size_per_worker(config=Config, max_connections=None):
+    """Largest per-worker pool that keeps all workers under max_connections."""
+    max_connections = max_connections or config.DB_MAX_CONNECTIONS
+    workers = max(1, config.API_WORKERS)
+    budget = max_connections - config.DB_RESERVED_CONNECTIONS
+    return max(1, min(config.DB_POOL_MAX_SIZE, budget // workers))
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(config=Config):
+    global _pool, _pool_pid
+
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                max_size = pool_size_per_worker(config)
+                _pool = BlockingConnectionPool(
+                    min(config.DB_POOL_MIN_SIZE, max_size),
+                    max_size,
+                    config.DB_POOL_TIMEOUT,
+                    cursor_factory=RealDictCursor,
+                    **config.DB_CONFIG
+                )
+                _pool_pid = pid
+    return _pool
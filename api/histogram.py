@@ -0,0 +1,53 @@
+"""
+Fixed-bucket latency histogram, cheap enough to update on every request.
+"""
+import bisect
+import threading
+
+# Upper bounds in milliseconds; anything slower lands in the +Inf bucket
+DEFAULT_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# Per-stage timings: cache lookups and serialization finish well under 1ms,
+# so the default buckets would put all of them in the first one
+STAGE_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5) + DEFAULT_BUCKETS_MS
+
+
+class Histogram:
+    def __init__(self, bounds=DEFAULT_BUCKETS_MS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (None if empty)."""
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for bound, count in zip(self.bounds + (float('inf'),), counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def snapshot(self):
+        """Cumulative bucket counts, Prometheus style."""
+        with self._lock:
+            counts, total, value_sum = list(self.counts), self.count, self.sum
+
+        buckets = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float('inf'),), counts):
+            cumulative += count
+            buckets.append({"le": "+Inf" if bound == float('inf') else bound, "count": cumulative})
+        return {"count": total, "sum": round(value_sum, 3), "buckets": buckets}
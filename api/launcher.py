@@ -0,0 +1,82 @@
+"""
+Production launcher: N uvicorn workers under gunicorn, sized from Config.
+
+Usage:
+    cd api; APP_ENV=PRODUCTION python launcher.py
+
+The master process loads the shared read-only state (state.py) and imports the
+app before forking, so workers share those pages copy-on-write. Each worker then
+builds its own connection pool on first use (db.py), sized so that
+API_WORKERS * pool size stays below the server's max_connections.
+"""
+import gc
+
+import psycopg2
+from gunicorn.app.base import BaseApplication
+
+from config import Config
+from db import pool_size_per_worker
+from state import preload_state
+
+
+class ProductionServer(BaseApplication):
+    def __init__(self, application, options):
+        self.application = application
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+def detect_max_connections(config=Config):
+    try:
+        conn = psycopg2.connect(**config.DB_CONFIG)
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SHOW max_connections")
+                return int(cur.fetchone()[0])
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"Could not read max_connections, assuming {config.DB_MAX_CONNECTIONS}: {e}")
+        return config.DB_MAX_CONNECTIONS
+
+
+def run_production(config=Config):
+    config.DB_MAX_CONNECTIONS = detect_max_connections(config)
+    per_worker = pool_size_per_worker(config)
+
+    print(f"Starting Recommendation API ({config.ENVIRONMENT})")
+    print(f"Workers: {config.API_WORKERS} (uvicorn under gunicorn, preloaded app)")
+    print(
+        f"Database pool: {per_worker} connections per worker, "
+        f"{per_worker * config.API_WORKERS} total of max_connections={config.DB_MAX_CONNECTIONS}"
+    )
+
+    if config.PRELOAD_STATE:
+        preload_state(config)
+
+    from app import app
+
+    # Move everything allocated so far out of the collector's reach, so gc passes
+    # in the workers don't touch (and un-share) the preloaded pages.
+    gc.collect()
+    gc.freeze()
+
+    options = {
+        "bind": f"{config.API_HOST}:{config.API_PORT}",
+        "workers": config.API_WORKERS,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "loglevel": "info",
+    }
+    ProductionServer(app, options).run()
+
+
+if __name__ == "__main__":
+    run_production()
@@ -0,0 +1,205 @@
+"""
+Lightweight request instrumentation for the API.
+
+MetricsMiddleware starts a RequestTimer for every HTTP request and keeps it in
+a context variable, which FastAPI copies into the threadpool running sync
+handlers. Code on the request path wraps its work in `stage("name")`; at the
+end of the request each stage lands in a fixed-bucket histogram per endpoint
+and the breakdown is returned in a Server-Timing header. Recording a stage is a
+perf_counter() pair, a bisect and a short lock, so it can stay on in production.
+
+Metrics are per worker process and every series carries a pid label. With
+API_WORKERS > 1 the workers share one port, so a scrape of /metrics reaches
+whichever worker accepts it and returns only that worker's counters. Counters
+of a worker also restart from zero when it is replaced. So in queries,
+aggregate over pid (e.g. `sum without (pid) (rate(api_requests_total[1m]))`),
+with a rate window long enough that every worker is scraped at least twice.
+For exact per-worker series, run one worker per port
+(API_WORKERS=1 behind the load balancer) and scrape each port as its own
+target.
+"""
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from starlette.datastructures import MutableHeaders
+
+from circuit_breaker import STATE_VALUES
+from histogram import STAGE_BUCKETS_MS, Histogram
+
+_current_timer = contextvars.ContextVar("request_timer", default=None)
+
+
+class RequestTimer:
+    __slots__ = ("start", "stages")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = []
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.start) * 1000
+
+    def server_timing(self, total_ms):
+        parts = [f"{name};dur={duration:.2f}" for name, duration in self.stages]
+        parts.append(f"total;dur={total_ms:.2f}")
+        return ", ".join(parts)
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, (time.perf_counter() - start) * 1000)
+
+
+def record_stage(name, duration_ms):
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.stages.append((name, duration_ms))
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.stage_ms = {}  # (endpoint, stage) -> Histogram
+        self.requests = {}  # (endpoint, status) -> count
+        self.cache = {}  # (cache, "hit" | "miss") -> count
+        self._lock = threading.Lock()
+
+    def _histogram(self, endpoint, stage_name):
+        key = (endpoint, stage_name)
+        histogram = self.stage_ms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.stage_ms.setdefault(key, Histogram(STAGE_BUCKETS_MS))
+        return histogram
+
+    def record_request(self, endpoint, status, stages, total_ms):
+        for stage_name, duration in stages:
+            self._histogram(endpoint, stage_name).observe(duration)
+        self._histogram(endpoint, "total").observe(total_ms)
+        with self._lock:
+            self.requests[(endpoint, status)] = self.requests.get((endpoint, status), 0) + 1
+
+    def cache_lookup(self, cache_name, hit):
+        key = (cache_name, "hit" if hit else "miss")
+        with self._lock:
+            self.cache[key] = self.cache.get(key, 0) + 1
+
+    def cache_hit_ratios(self):
+        with self._lock:
+            cache = dict(self.cache)
+        ratios = {}
+        for name in {name for name, _ in cache}:
+            hits, misses = cache.get((name, "hit"), 0), cache.get((name, "miss"), 0)
+            ratios[name] = hits / (hits + misses) if hits + misses else 0.0
+        return ratios
+
+    def render_prometheus(self, admission=None, breaker=None):
+        pid = os.getpid()
+        lines = [
+            "# TYPE api_stage_duration_ms histogram",
+        ]
+        for (endpoint, stage_name), histogram in sorted(self.stage_ms.items()):
+            _render_histogram(
+                lines, "api_stage_duration_ms",
+                f'pid="{pid}",endpoint="{endpoint}",stage="{stage_name}"', histogram
+            )
+
+        lines.append("# TYPE api_requests_total counter")
+        for (endpoint, status), count in sorted(self.requests.items()):
+            lines.append(f'api_requests_total{{pid="{pid}",endpoint="{endpoint}",status="{status}"}} {count}')
+
+        lines.append("# TYPE api_cache_lookups_total counter")
+        for (cache_name, result), count in sorted(self.cache.items()):
+            lines.append(f'api_cache_lookups_total{{pid="{pid}",cache="{cache_name}",result="{result}"}} {count}')
+        lines.append("# TYPE api_cache_hit_ratio gauge")
+        for cache_name, ratio in sorted(self.cache_hit_ratios().items()):
+            lines.append(f'api_cache_hit_ratio{{pid="{pid}",cache="{cache_name}"}} {ratio:.4f}')
+
+        if admission is not None:
+            lanes = (admission.priority_lane, admission.default_lane)
+            lines.append("# TYPE api_admission_active gauge")
+            lines.append("# TYPE api_admission_queued gauge")
+            lines.append("# TYPE api_admission_admitted_total counter")
+            lines.append("# TYPE api_admission_shed_total counter")
+            for lane in lanes:
+                labels = f'pid="{pid}",lane="{lane.name}"'
+                lines.append(f"api_admission_active{{{labels}}} {lane.active}")
+                lines.append(f"api_admission_queued{{{labels}}} {len(lane.waiters)}")
+                lines.append(f"api_admission_admitted_total{{{labels}}} {lane.admitted}")
+                for reason, count in sorted(lane.shed.items()):
+                    lines.append(f'api_admission_shed_total{{{labels},reason="{reason}"}} {count}')
+            lines.append("# TYPE api_admission_queue_wait_ms histogram")
+            for lane in lanes:
+                _render_histogram(
+                    lines, "api_admission_queue_wait_ms",
+                    f'pid="{pid}",lane="{lane.name}"', lane.queue_wait_ms
+                )
+
+        if breaker is not None:
+            stats = breaker.stats()
+            labels = f'pid="{pid}",circuit="{breaker.name}"'
+            lines.append("# TYPE api_circuit_state gauge")
+            # 0 closed, 1 half-open, 2 open
+            lines.append(f"api_circuit_state{{{labels}}} {STATE_VALUES[stats['state']]}")
+            lines.append("# TYPE api_circuit_trips_total counter")
+            lines.append(f"api_circuit_trips_total{{{labels}}} {stats['trips']}")
+            lines.append("# TYPE api_circuit_rejected_total counter")
+            lines.append(f"api_circuit_rejected_total{{{labels}}} {stats['rejected']}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _render_histogram(lines, name, labels, histogram):
+    snapshot = histogram.snapshot()
+    for bucket in snapshot["buckets"]:
+        lines.append(f'{name}_bucket{{{labels},le="{bucket["le"]}"}} {bucket["count"]}')
+    lines.append(f"{name}_sum{{{labels}}} {snapshot['sum']}")
+    lines.append(f"{name}_count{{{labels}}} {snapshot['count']}")
+
+
+REGISTRY = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    def __init__(self, app, registry=REGISTRY, server_timing=True, slow_log=None):
+        self.app = app
+        self.registry = registry
+        self.server_timing = server_timing
+        self.slow_log = slow_log
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timer = RequestTimer()
+        token = _current_timer.set(timer)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", timer.server_timing(timer.elapsed_ms()))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_timer.reset(token)
+            # The router stores the matched endpoint in the shared scope
+            endpoint = scope.get("endpoint")
+            endpoint_name = endpoint.__name__ if endpoint else "unmatched"
+            total_ms = timer.elapsed_ms()
+            self.registry.record_request(endpoint_name, status, timer.stages, total_ms)
+            if self.slow_log is not None:
+                self.slow_log.maybe_record(scope["method"], scope["path"], endpoint_name,
+                                           status, timer.stages, total_ms)
@@ -0,0 +1,191 @@
+"""
+In-process sampling profiler and slow request log for the live API.
+
+StackSampler runs a daemon thread that, every `interval` seconds, reads the
+current frame of every other thread (sys._current_frames) and counts the
+stack it finds. Nothing is installed in the interpreter (no settrace or
+setprofile), so requests run at full speed and the cost is one walk over a
+few dozen frames per thread per sample, on a thread that mostly sleeps.
+Stacks are reported in the collapsed format ("outer;inner;leaf count") read
+by flamegraph.pl, speedscope and inferno.
+
+SlowRequestLog keeps the stage breakdown (see metrics.py) of the last
+requests slower than a threshold, so a slow request can be matched with the
+stages it spent its time in without turning on the profiler.
+
+Both are per worker process, like the metrics.
+"""
+import collections
+import os
+import sys
+import threading
+import time
+
+DEFAULT_INTERVAL = 0.005  # seconds between samples
+MAX_DEPTH = 64  # frames kept per stack (outermost dropped beyond this)
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def collapse_stack(frame, max_depth=MAX_DEPTH):
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()  # outermost first
+    # Keep the innermost frames: the leaf is where the time is spent
+    return ";".join(labels[-max_depth:])
+
+
+class ProfileBusy(Exception):
+    pass
+
+
+class StackSampler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.counts = collections.Counter()
+        self.samples = 0
+        self.started_at = None
+        self.finished_at = None
+        self.interval = DEFAULT_INTERVAL
+        self.include_idle = True
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds, interval=DEFAULT_INTERVAL, include_idle=True):
+        """Samples for `seconds` in the background; raises ProfileBusy if a run is in progress."""
+        with self._lock:
+            if self.running:
+                raise ProfileBusy("A profile is already running")
+            self.counts = collections.Counter()
+            self.samples = 0
+            self.interval = interval
+            self.include_idle = include_idle
+            self.started_at = time.time()
+            self.finished_at = None
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(seconds,), name="stack-sampler", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _run(self, seconds):
+        own_ident = threading.get_ident()
+        deadline = time.perf_counter() + seconds
+        next_sample = time.perf_counter()
+        try:
+            while not self._stop.is_set() and next_sample < deadline:
+                frames = sys._current_frames()
+                for ident, frame in frames.items():
+                    if ident == own_ident:
+                        continue
+                    if not self.include_idle and is_idle(frame):
+                        continue
+                    self.counts[collapse_stack(frame)] += 1
+                del frames  # do not keep other threads' frames alive
+                self.samples += 1
+                # Fixed schedule, so slow samples do not stretch the interval
+                next_sample += self.interval
+                self._stop.wait(max(0.0, next_sample - time.perf_counter()))
+        finally:
+            self.finished_at = time.time()
+
+    def collapsed(self):
+        """Collapsed stacks, heaviest first, one "frame;frame;frame count" per line."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+    def summary(self, top=20):
+        duration = (self.finished_at or time.time()) - self.started_at if self.started_at else 0.0
+        leaves = collections.Counter()
+        for stack, count in self.counts.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(self.counts.values())
+        return {
+            "pid": os.getpid(),
+            "running": self.running,
+            "started_at": self.started_at,
+            "duration_seconds": round(duration, 3),
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "stacks": len(self.counts),
+            "include_idle": self.include_idle,
+            "top_leaf_frames": [
+                {"frame": frame, "samples": count, "share": round(count / total, 4)}
+                for frame, count in leaves.most_common(top)
+            ],
+        }
+
+
+# Leaf frames of threads that are parked rather than working: the event loop
+# waiting in select/epoll, idle threadpool workers, the metrics refreshers.
+IDLE_LEAVES = frozenset({
+    "selectors.py:select",
+    "threading.py:wait",
+    "queue.py:get",
+    "thread.py:_worker",
+    "base_events.py:_run_once",
+})
+
+
+def is_idle(frame):
+    return frame_label(frame) in IDLE_LEAVES
+
+
+class SlowRequestLog:
+    def __init__(self, threshold_ms, capacity=100):
+        self.threshold_ms = threshold_ms
+        self.enabled = threshold_ms is not None
+        self._traces = collections.deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self.recorded = 0
+
+    def maybe_record(self, method, path, endpoint, status, stages, total_ms):
+        if not self.enabled or total_ms < self.threshold_ms:
+            return
+        trace = {
+            "timestamp": time.time(),
+            "method": method,
+            "path": path,
+            "endpoint": endpoint,
+            "status": status,
+            "total_ms": round(total_ms, 2),
+            "stages": [{"name": name, "ms": round(duration, 2)} for name, duration in stages],
+            # Time no stage accounts for: middleware, routing, threadpool hand-off
+            "unaccounted_ms": round(total_ms - sum(duration for _, duration in stages), 2),
+        }
+        with self._lock:
+            self._traces.append(trace)
+            self.recorded += 1
+
+    def configure(self, threshold_ms=None, enabled=None):
+        if threshold_ms is not None:
+            self.threshold_ms = threshold_ms
+        if enabled is not None:
+            self.enabled = enabled and self.threshold_ms is not None
+
+    def traces(self, limit=None):
+        with self._lock:
+            traces = list(self._traces)
+        traces.reverse()  # newest first
+        return traces[:limit] if limit else traces
+
+    def clear(self):
+        with self._lock:
+            self._traces.clear()
+
+
+PROFILER = StackSampler()
@@ -0,0 +1,121 @@
+"""
+Read-only state shared by all API workers.
+
+The launcher loads this once in the master process before forking, so every
+worker inherits the same pages copy-on-write instead of rebuilding them.
+When the API runs without preloading, STATE stays empty and the endpoints
+fall back to querying Postgres.
+"""
+import threading
+import time
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from config import Config
+from db import get_pool
+from versions import VERSIONS
+
+
+class SharedState:
+    def __init__(self):
+        # Every item_id in the catalog as of load time, used to enrich recommendations
+        # without a query; ids missing from it (items added later) are looked up in Postgres
+        self.item_ids = frozenset()
+        # user_id -> (recommended_items, computed_at) as of load time
+        self.recommendations = {}
+        # ranking name -> (ranked_items, computed_at), the cold-user fallback
+        self.popularity = {}
+        self.loaded_at = None
+
+    @property
+    def loaded(self):
+        return self.loaded_at is not None
+
+
+STATE = SharedState()
+
+
+def load_item_index(cursor):
+    cursor.execute("SELECT item_id FROM items")
+    return frozenset(row['item_id'] for row in cursor.fetchall())
+
+
+def load_recommendation_snapshot(cursor):
+    cursor.execute("SELECT user_id, recommended_items, computed_at FROM recommendations")
+    return {
+        row['user_id']: (row['recommended_items'], row['computed_at'])
+        for row in cursor.fetchall()
+    }
+
+
+def load_popularity(cursor):
+    cursor.execute("SELECT ranking, ranked_items, computed_at FROM popularity_rankings")
+    return {
+        row['ranking']: (row['ranked_items'], row['computed_at'])
+        for row in cursor.fetchall()
+    }
+
+
+def refresh_popularity(conn):
+    """Swap in the latest rankings; the dict is replaced, never mutated in place."""
+    with conn.cursor() as cursor:
+        STATE.popularity = load_popularity(cursor)
+
+
+_popularity_refresher = None
+
+
+def start_popularity_refresher(interval):
+    """Re-read popularity_rankings every `interval` seconds (one thread per worker)."""
+    global _popularity_refresher
+    if _popularity_refresher is not None:
+        return
+
+    def run():
+        while True:
+            conn = None
+            try:
+                conn = get_pool().getconn()
+                refresh_popularity(conn)
+                get_pool().putconn(conn)
+            except Exception as e:
+                print(f"Popularity refresh failed: {e}")
+                if conn:
+                    get_pool().putconn(conn, close=True)
+            time.sleep(interval)
+
+    _popularity_refresher = threading.Thread(target=run, name="popularity-refresh", daemon=True)
+    _popularity_refresher.start()
+
+
+def preload_state(config=Config):
+    """Populate STATE from Postgres. Returns False if the database is unreachable."""
+    start_time = time.time()
+    try:
+        conn = psycopg2.connect(**config.DB_CONFIG, cursor_factory=RealDictCursor)
+    except Exception as e:
+        print(f"Skipping state preload, database unavailable: {e}")
+        return False
+
+    try:
+        with conn.cursor() as cursor:
+            STATE.item_ids = load_item_index(cursor)
+            STATE.recommendations = load_recommendation_snapshot(cursor)
+        try:
+            refresh_popularity(conn)
+        except psycopg2.Error as e:
+            print(f"Skipping popularity rankings: {e}")
+    finally:
+        conn.close()
+
+    VERSIONS.seed({
+        user_id: computed_at for user_id, (_, computed_at) in STATE.recommendations.items()
+    })
+
+    STATE.loaded_at = time.time()
+    print(
+        f"Preloaded {len(STATE.item_ids)} items, {len(STATE.recommendations)} "
+        f"recommendation lists and {len(STATE.popularity)} popularity rankings in {STATE.loaded_at - start_time:.2f} seconds"
+    )
+    return True
@@ -0,0 +1,106 @@
+"""
+In-memory map of user_id -> computed_at for conditional GETs.
+
+/recommend answers If-None-Match from this map without fetching the
+recommendation row. Each worker refreshes it in a background thread with an
+incremental query on computed_at, so after a precompute run a client can keep
+getting 304 for at most one refresh interval. Incremental refreshes cannot see
+deleted rows, so every `full_reload_seconds` the map is rebuilt from scratch
+and replaced; a deleted user stops matching within that interval.
+"""
+import threading
+import time
+from datetime import timedelta, timezone
+from email.utils import format_datetime
+
+from db import get_pool
+
+
+def make_etag(computed_at, limit):
+    # Weak: the body also carries latency_ms, so only the content is equivalent
+    return f'W/"{int(computed_at.timestamp() * 1000000)}-{limit}"'
+
+
+def etag_matches(if_none_match, etag):
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # If-None-Match uses weak comparison, so W/ prefixes are ignored
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return any((tag[2:] if tag.startswith("W/") else tag) == opaque for tag in candidates)
+
+
+def last_modified(computed_at):
+    # computed_at is a naive TIMESTAMP in the (local) database server's time zone
+    return format_datetime(computed_at.astimezone(timezone.utc), usegmt=True)
+
+
+class VersionMap:
+    def __init__(self):
+        self.versions = {}
+        self.high_water = None
+        self.reloaded_at = None  # monotonic time of the last full load
+        self._lock = threading.Lock()
+        self._refresher = None
+
+    def get(self, user_id):
+        return self.versions.get(user_id)
+
+    def update(self, user_id, computed_at):
+        if computed_at is None:
+            return
+        with self._lock:
+            self.versions[user_id] = computed_at
+            if self.high_water is None or computed_at > self.high_water:
+                self.high_water = computed_at
+
+    def seed(self, versions):
+        with self._lock:
+            self.versions = dict(versions)
+            present = [computed_at for computed_at in self.versions.values() if computed_at]
+            self.high_water = max(present) if present else None
+            self.reloaded_at = time.monotonic()
+
+    def refresh(self, conn, lookback_seconds, full=False):
+        """Pull rows changed since the high-water mark; a full refresh replaces the whole map."""
+        with conn.cursor() as cursor:
+            if full or self.high_water is None:
+                cursor.execute("SELECT user_id, computed_at FROM recommendations")
+                rows = cursor.fetchall()
+                self.seed((row['user_id'], row['computed_at']) for row in rows)
+                return len(rows)
+            # Look back a little: a transaction that started earlier can commit
+            # rows with an older computed_at after we have moved past it
+            cursor.execute(
+                "SELECT user_id, computed_at FROM recommendations WHERE computed_at > %s",
+                (self.high_water - timedelta(seconds=lookback_seconds),)
+            )
+            rows = cursor.fetchall()
+
+        for row in rows:
+            self.update(row['user_id'], row['computed_at'])
+        return len(rows)
+
+    def start_refresher(self, interval, lookback_seconds, full_reload_seconds):
+        if self._refresher is not None:
+            return
+
+        def run():
+            while True:
+                conn = None
+                try:
+                    conn = get_pool().getconn()
+                    full = self.reloaded_at is None or time.monotonic() - self.reloaded_at >= full_reload_seconds
+                    self.refresh(conn, lookback_seconds, full)
+                    get_pool().putconn(conn)
+                except Exception as e:
+                    print(f"Version map refresh failed: {e}")
+                    if conn:
+                        get_pool().putconn(conn, close=True)
+                time.sleep(interval)
+
+        self._refresher = threading.Thread(target=run, name="version-map-refresh", daemon=True)
+        self._refresher.start()
+
+
+VERSIONS = VersionMap()
@@ -0,0 +1,298 @@
+"""
+Micro-benchmarks for the precompute and serving hot paths.
+
+Stages, each timed in isolation on synthetic data (see synthetic.py):
+
+    load_interactions       precompute.load_interaction_data       ops = rows
+    train_model             precompute.train_and_save_model        ops = ratings
+    recommend_all_users     precompute.get_recommendations_for_all_users  ops = users
+    store_recommendations   precompute.store_recommendations       ops = rows
+    enrich_db               app.enrich_recommendations (items query)    ops = requests
+    enrich_index            app.enrich_recommendations (preloaded index) ops = requests
+    serialize_response      app.recommendation_response (JSON body)     ops = requests
+
+The data lives in a separate `bench` schema of the local recommendations
+database (database/schema.sql is replayed there with search_path=bench), so
+the real tables are never touched. Each stage runs --repeat times for wall
+time (the median is kept), plus once under tracemalloc for peak memory.
+
+Results are compared with baseline.json for the same data size. A stage
+regresses when its ops/sec falls by more than --threshold, or its peak
+memory grows by more than --memory-threshold. Any regression, or a missing
+baseline for the data size (so CI never passes without comparing anything),
+makes the run exit with status 1.
+
+Usage (from benchmarks/):
+    python run_benchmarks.py                       # compare with the baseline
+    python run_benchmarks.py --update-baseline     # record a new baseline
+    python run_benchmarks.py --users 500 --items 5000 --stages train_model recommend_all_users
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+import synthetic
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "database"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+import precompute_recommendations as precompute  # noqa: E402
+
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "database": os.getenv("DB_NAME", "recommendations"),
+    "user": os.getenv("DB_USER", "s4p"),
+    "password": os.getenv("DB_PASSWORD", ""),
+}
+BENCH_SCHEMA = "bench"
+SCHEMA_SQL = "../database/schema.sql"
+BASELINE_PATH = "baseline.json"
+
+NUM_USERS = 200
+NUM_ITEMS = 2000
+SERVING_REQUESTS = 2000
+REPEAT = 3
+THRESHOLD = 0.20  # allowed ops/sec drop
+MEMORY_THRESHOLD = 0.25  # allowed peak memory growth
+
+
+#################### --- BENCH SCHEMA ---#################################
+def get_bench_connection():
+    return psycopg2.connect(**DB_CONFIG, options=f"-c search_path={BENCH_SCHEMA}")
+
+
+def setup_bench_schema(user_ids, item_ids, interactions):
+    """Recreate the bench schema from schema.sql and COPY the synthetic data in."""
+    with open(SCHEMA_SQL) as f:
+        schema_sql = f.read()
+
+    conn = get_bench_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+            cur.execute(f"CREATE SCHEMA {BENCH_SCHEMA}")
+            cur.execute(f"SET search_path TO {BENCH_SCHEMA}")
+            cur.execute(schema_sql)
+            copy_rows(cur, "users (user_id)", ((user_id,) for user_id in user_ids))
+            copy_rows(cur, "items (item_id)", ((item_id,) for item_id in item_ids))
+            copy_rows(cur, "interactions (user_id, item_id, rating, timestamp)", interactions)
+            cur.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def copy_rows(cur, target, rows):
+    with tempfile.TemporaryFile("w+") as buffer:
+        for row in rows:
+            buffer.write("\t".join(str(value) for value in row) + "\n")
+        buffer.seek(0)
+        cur.copy_expert(f"COPY {target} FROM STDIN", buffer)
+
+
+#################### --- MEASUREMENT ---#################################
+def measure(name, fn, ops_of, repeat, selected=True):
+    """
+    Median wall time over `repeat` untraced runs, then one run under
+    tracemalloc for peak memory (tracing slows the code, so it is not timed).
+    Returns (stats, result of the last run). Stages that were not selected
+    but whose output later stages need run once, unmeasured.
+    """
+    if not selected:
+        return None, fn()
+
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    wall = statistics.median(timings)
+    ops = ops_of(result)
+    stats = {
+        "ops": ops,
+        "wall_seconds": round(wall, 4),
+        "ops_per_sec": round(ops / wall, 2) if wall else None,
+        "peak_memory_mb": round(peak / (1024 * 1024), 2),
+    }
+    print(f"  {name:<24}{stats['wall_seconds']:>10.3f}s{stats['ops_per_sec'] or 0:>14.1f} ops/s"
+          f"{stats['peak_memory_mb']:>10.1f} MB")
+    return stats, result
+
+
+def run_precompute_stages(stages, repeat, model_dir):
+    results = {}
+    conn = get_bench_connection()
+    try:
+        results["load_interactions"], df = measure(
+            "load_interactions", lambda: precompute.load_interaction_data(conn),
+            len, repeat, "load_interactions" in stages)
+
+        model_path = os.path.join(model_dir, "svd_model.pkl")
+        results["train_model"], (model, trainset, _) = measure(
+            "train_model", lambda: precompute.train_and_save_model(df, model_path),
+            lambda result: result[1].n_ratings, repeat, "train_model" in stages)
+
+        all_item_ids = set(df['item_id'].unique())
+        results["recommend_all_users"], (recommendations, _) = measure(
+            "recommend_all_users",
+            lambda: precompute.get_recommendations_for_all_users(model, trainset, all_item_ids, precompute.TOP_N),
+            lambda result: len(result[0]), repeat, "recommend_all_users" in stages)
+
+        # The serving stages read what this stores
+        results["store_recommendations"], _ = measure(
+            "store_recommendations", lambda: precompute.store_recommendations(conn, recommendations),
+            lambda count: count, repeat, "store_recommendations" in stages)
+    finally:
+        conn.close()
+    return {name: stats for name, stats in results.items() if stats is not None}
+
+
+def run_serving_stages(stages, repeat, num_requests):
+    # Imported here: only the serving stages need the API's dependencies
+    from app import enrich_recommendations, recommendation_response
+    from state import STATE, load_item_index
+
+    results = {}
+    conn = get_bench_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("SELECT user_id, recommended_items, computed_at FROM recommendations")
+            rows = cur.fetchall()
+            requests = [rows[i % len(rows)] for i in range(num_requests)]
+
+            def enrich_all():
+                return [enrich_recommendations(row['recommended_items'], cur) for row in requests]
+
+            STATE.loaded_at = None
+            if "enrich_db" in stages:
+                results["enrich_db"], _ = measure("enrich_db", enrich_all, len, repeat)
+
+            STATE.item_ids = load_item_index(cur)
+            STATE.loaded_at = time.time()
+            results["enrich_index"], enriched = measure("enrich_index", enrich_all, len, repeat,
+                                                        "enrich_index" in stages)
+
+            def serialize_all():
+                return [
+                    recommendation_response(row['user_id'], recs, row['computed_at'], time.time(), len(recs))
+                    for row, recs in zip(requests, enriched)
+                ]
+
+            if "serialize_response" in stages:
+                results["serialize_response"], _ = measure("serialize_response", serialize_all, len, repeat)
+    finally:
+        conn.close()
+    return {name: stats for name, stats in results.items() if stats is not None}
+
+
+#################### --- BASELINE ---#################################
+def size_key(args):
+    return f"users={args.users},items={args.items},requests={args.requests}"
+
+
+def compare(results, baseline, threshold, memory_threshold):
+    """Returns a list of regression messages (empty when everything is within limits)."""
+    regressions = []
+    print(f"\n  {'Stage':<24}{'ops/s':>14}{'baseline':>14}{'change':>9}{'peak MB':>10}{'baseline':>10}")
+    for name, stats in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"  {name:<24}{stats['ops_per_sec']:>14.1f}{'(new)':>14}")
+            continue
+        speed = stats["ops_per_sec"] / previous["ops_per_sec"] - 1 if previous["ops_per_sec"] else 0.0
+        memory = stats["peak_memory_mb"] / previous["peak_memory_mb"] - 1 if previous["peak_memory_mb"] else 0.0
+        flag = ""
+        if speed < -threshold:
+            regressions.append(f"{name}: {speed:+.1%} ops/sec (limit -{threshold:.0%})")
+            flag = "  SLOWER"
+        if memory > memory_threshold:
+            regressions.append(f"{name}: {memory:+.1%} peak memory (limit +{memory_threshold:.0%})")
+            flag += "  MORE MEMORY"
+        print(f"  {name:<24}{stats['ops_per_sec']:>14.1f}{previous['ops_per_sec']:>14.1f}{speed:>+9.1%}"
+              f"{stats['peak_memory_mb']:>10.1f}{previous['peak_memory_mb']:>10.1f}{flag}")
+    return regressions
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    all_stages = ["load_interactions", "train_model", "recommend_all_users", "store_recommendations",
+                  "enrich_db", "enrich_index", "serialize_response"]
+    parser = argparse.ArgumentParser(description="Benchmark precompute and serving hot paths")
+    parser.add_argument("--users", type=int, default=NUM_USERS)
+    parser.add_argument("--items", type=int, default=NUM_ITEMS)
+    parser.add_argument("--requests", type=int, default=SERVING_REQUESTS, help="Requests per serving stage")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--stages", nargs="*", choices=all_stages, default=all_stages)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--memory-threshold", type=float, default=MEMORY_THRESHOLD)
+    parser.add_argument("--skip-setup", action="store_true", help="Reuse the existing bench schema")
+    args = parser.parse_args()
+    stages = set(args.stages)
+
+    if not args.skip_setup:
+        print(f"Generating {args.users} users x {args.items} items of synthetic data...")
+        user_ids, item_ids, interactions = synthetic.generate(args.users, args.items)
+        print(f"Loading {len(interactions)} interactions into schema '{BENCH_SCHEMA}'...")
+        setup_bench_schema(user_ids, item_ids, interactions)
+
+    print(f"\nRunning stages ({args.repeat} timed runs each):")
+    with tempfile.TemporaryDirectory() as model_dir:
+        results = run_precompute_stages(stages, args.repeat, model_dir)
+    if stages & {"enrich_db", "enrich_index", "serialize_response"}:
+        results.update(run_serving_stages(stages, args.repeat, args.requests))
+
+    baseline_file = load_baseline(args.baseline)
+    key = size_key(args)
+    if args.update_baseline:
+        baseline_file[key] = {
+            "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "stages": {**baseline_file.get(key, {}).get("stages", {}), **results},
+        }
+        with open(args.baseline, "w") as f:
+            json.dump(baseline_file, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaseline for {key} written to {args.baseline}")
+        return
+
+    if key not in baseline_file:
+        print(f"\nNo baseline for {key} in {args.baseline}; run with --update-baseline to record one.")
+        sys.exit(1)
+
+    regressions = compare(results, baseline_file[key]["stages"], args.threshold, args.memory_threshold)
+    if regressions:
+        print("\nREGRESSIONS:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("\nNo regressions.")
+
+
+if __name__ == "__main__":
+    main()
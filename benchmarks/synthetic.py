@@ -0,0 +1,76 @@
+"""
+Synthetic interaction data scaled from the processed sample CSVs.
+
+The shape comes from data/processed/interactions_sample.csv:
+- interactions per user: resampled from the sample's per-user counts
+- ratings: resampled from the sample's rating distribution
+- timestamps: uniform over the sample's timestamp range
+- items: real ids from items_metadata.csv, picked with Zipf(ITEM_ZIPF_S)
+  popularity so a few items are rated by many users, as in the real data
+
+User ids are synthetic (BENCHU000001...). Everything is drawn from one
+seeded RNG, so the same arguments always produce the same data.
+"""
+import bisect
+import csv
+import itertools
+import random
+
+SAMPLE_INTERACTIONS = "../data/processed/interactions_sample.csv"
+ITEMS_CSV = "../data/processed/items_metadata.csv"
+ITEM_ZIPF_S = 1.0
+SEED = 42
+
+
+class SampleProfile:
+    def __init__(self, path=SAMPLE_INTERACTIONS):
+        per_user = {}
+        self.ratings = []
+        timestamps = []
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                per_user[row["User_ID"]] = per_user.get(row["User_ID"], 0) + 1
+                self.ratings.append(float(row["Rating"]))
+                timestamps.append(int(row["Timestamp"]))
+        self.per_user_counts = sorted(per_user.values())
+        self.first_timestamp = min(timestamps)
+        self.last_timestamp = max(timestamps)
+
+
+def load_item_ids(path=ITEMS_CSV, limit=None):
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        next(reader)  # Skip header
+        rows = (row[0] for row in reader)
+        return list(itertools.islice(rows, limit)) if limit else list(rows)
+
+
+def generate(num_users, num_items, profile=None, seed=SEED):
+    """
+    Returns (user_ids, item_ids, interactions) with interactions as
+    (user_id, item_id, rating, timestamp) tuples, one rating per pair.
+    """
+    profile = profile or SampleProfile()
+    rng = random.Random(seed)
+    item_ids = load_item_ids(limit=num_items)
+    num_items = len(item_ids)
+    ranked = item_ids[:]
+    rng.shuffle(ranked)
+    cumulative = list(itertools.accumulate(1 / (rank ** ITEM_ZIPF_S) for rank in range(1, num_items + 1)))
+
+    user_ids = [f"BENCHU{i:06d}" for i in range(1, num_users + 1)]
+    interactions = []
+    for user_id in user_ids:
+        count = min(rng.choice(profile.per_user_counts), num_items // 2)
+        rated = set()
+        while len(rated) < count:
+            index = bisect.bisect_left(cumulative, rng.random() * cumulative[-1])
+            rated.add(ranked[min(index, num_items - 1)])
+        for item_id in rated:
+            interactions.append((
+                user_id,
+                item_id,
+                rng.choice(profile.ratings),
+                rng.randint(profile.first_timestamp, profile.last_timestamp),
+            ))
+    return user_ids, item_ids, interactions
@@ -0,0 +1,208 @@
+"""
+Concurrent DynamoDB bulk writer shared by the loaders in load_dynamodb.py.
+
+put() buffers items into 25-item batch_write_item requests that a thread pool
+sends concurrently. UnprocessedItems are retried with jittered exponential
+backoff instead of being dropped, and an AIMD rate limiter (halve on throttle,
+grow slowly on success) paces the whole writer to what the table accepts.
+In-flight batches are bounded, so put() blocks when the pool falls behind and
+memory stays constant however large the input is.
+
+The writer only needs a DynamoDB client, so it runs unchanged against
+DynamoDB Local or moto (see get_dynamodb_resource() for the endpoint).
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+BATCH_SIZE = 25  # batch_write_item maximum
+MAX_WORKERS = 8
+MAX_RETRIES = 8
+BASE_BACKOFF = 0.05  # seconds
+MAX_BACKOFF = 5.0
+REPORT_EVERY = 5000  # items between progress lines
+
+THROTTLE_ERRORS = {
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+}
+RETRYABLE_ERRORS = THROTTLE_ERRORS | {"InternalServerError", "ServiceUnavailable"}
+
+
+class AdaptiveRateLimiter:
+    """Token bucket whose rate (items/s) backs off on throttling and recovers on success."""
+
+    def __init__(self, initial_rate=1000.0, min_rate=25.0, max_rate=40000.0, increase=25.0):
+        self.rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.throttles = 0
+        self._tokens = 0.0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, n):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                # Allow at most one second of burst (or one batch, if the rate is tiny)
+                capacity = max(self.rate, n)
+                self._tokens = min(capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= n:
+                    self._tokens -= n
+                    return
+                wait = (n - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def on_throttle(self):
+        with self._lock:
+            self.throttles += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+
+def backoff_delay(attempt, base=BASE_BACKOFF, cap=MAX_BACKOFF):
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class BulkWriter:
+    def __init__(self, client, table_name, label="items", max_workers=MAX_WORKERS,
+                 limiter=None, max_retries=MAX_RETRIES, report_every=REPORT_EVERY):
+        self.client = client
+        self.table_name = table_name
+        self.label = label
+        self.max_retries = max_retries
+        self.report_every = report_every
+        self.limiter = limiter or AdaptiveRateLimiter()
+
+        self.written = 0
+        self.failed = 0
+        self.retries = 0
+        self.errors = []
+
+        self._batch = []
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dynamo-writer")
+        self._in_flight = threading.BoundedSemaphore(max_workers * 2)
+        self._futures = set()
+        self._lock = threading.Lock()
+        self._next_report = report_every
+        self._start = time.time()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def put(self, item):
+        self._batch.append({'PutRequest': {'Item': item}})
+        if len(self._batch) >= BATCH_SIZE:
+            self._submit(self._batch)
+            self._batch = []
+
+    def flush(self):
+        """Send the partial batch and wait until everything put so far is written."""
+        if self._batch:
+            self._submit(self._batch)
+            self._batch = []
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.result()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def _submit(self, requests):
+        self._in_flight.acquire()
+        future = self._executor.submit(self._write_batch, requests)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._done)
+
+    def _done(self, future):
+        with self._lock:
+            self._futures.discard(future)
+        self._in_flight.release()
+
+    def _write_batch(self, requests):
+        attempt = 0
+        while requests:
+            self.limiter.acquire(len(requests))
+            try:
+                response = self.client.batch_write_item(RequestItems={self.table_name: requests})
+            except ClientError as e:
+                code = e.response.get('Error', {}).get('Code')
+                if code not in RETRYABLE_ERRORS or attempt >= self.max_retries:
+                    self._record(0, len(requests), f"{code}: {e}")
+                    return
+                if code in THROTTLE_ERRORS:
+                    self.limiter.on_throttle()
+                self._retry_wait(attempt)
+                attempt += 1
+                continue
+            except BotoCoreError as e:
+                # Connection resets, timeouts and the like
+                if attempt >= self.max_retries:
+                    self._record(0, len(requests), str(e))
+                    return
+                self._retry_wait(attempt)
+                attempt += 1
+                continue
+
+            unprocessed = response.get('UnprocessedItems', {}).get(self.table_name, [])
+            self._record(len(requests) - len(unprocessed), 0)
+            if not unprocessed:
+                self.limiter.on_success()
+                return
+
+            # Partial success means the table is pushing back
+            self.limiter.on_throttle()
+            if attempt >= self.max_retries:
+                self._record(0, len(unprocessed), f"{len(unprocessed)} items still unprocessed")
+                return
+            self._retry_wait(attempt)
+            attempt += 1
+            requests = unprocessed
+
+    def _retry_wait(self, attempt):
+        with self._lock:
+            self.retries += 1
+        time.sleep(backoff_delay(attempt))
+
+    def _record(self, written, failed, error=None):
+        with self._lock:
+            self.written += written
+            self.failed += failed
+            if error and len(self.errors) < 20:
+                self.errors.append(error)
+            if self.written >= self._next_report:
+                self._next_report += self.report_every
+                print(f"  Loaded {self.written} {self.label}... ({self.throughput():.0f} items/s, "
+                      f"rate limit {self.limiter.rate:.0f}/s)")
+
+    def throughput(self):
+        elapsed = time.time() - self._start
+        return self.written / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        elapsed = time.time() - self._start
+        print(f"  {self.label}: {self.written} written, {self.failed} failed in {elapsed:.1f}s "
+              f"({self.throughput():.0f} items/s)")
+        print(f"  Retries: {self.retries}, throttle events: {self.limiter.throttles}, "
+              f"final rate limit: {self.limiter.rate:.0f} items/s")
+        for error in self.errors:
+            print(f"  ⚠️  {error}")
@@ -1,9 +1,12 @@
 import psycopg2
 from psycopg2.extras import execute_batch
-import csv
 import os
+import time
 from typing import List, Tuple
 
+from parquet_cache import column_range, is_fresh, iter_row_chunks
+from partitions import ensure_partitions, PARTITIONS_AHEAD
+
 DB_CONFIG = {
     "host": "localhost",
     "database": "recommendations",
@@ -32,24 +35,12 @@ def get_db_connection():
         return None
 
 def load_csv_data_chunks(file_path: str):
-    if not os.path.exists(file_path):
+    # Reads the Parquet copy instead when parquet_cache.py has written a fresh one
+    if not os.path.exists(file_path) and not is_fresh(file_path):
         print(f"Current working directory: {os.getcwd()}")
         raise FileNotFoundError(f"CSV file not found at: {file_path}")
 
-    with open(file_path, 'r', encoding='utf-8') as f:
-        reader = csv.reader(f)
-        next(reader)
-
-        data_chunk = []
-        for row in reader:
-            data_chunk.append(tuple(row))
-
-            if len(data_chunk) >= BATCH_SIZE:
-                yield data_chunk
-                data_chunk = []
-
-        if data_chunk:
-            yield data_chunk
+    yield from iter_row_chunks(file_path, BATCH_SIZE)
 
 def load_users(conn):
     print(f"\n Loading users from: {CSV_PATHS['users']}...")
@@ -87,12 +78,39 @@ def load_items(conn):
         print(f" Error loading items: {e}")
         return 0
 
+def timestamp_range(file_path: str):
+    # Row-group statistics answer this without reading the data
+    cached = column_range(file_path, 3)
+    if cached is not None:
+        return int(cached[0]), int(cached[1])
+    first, last = None, None
+    for chunk in load_csv_data_chunks(file_path):
+        timestamps = [int(row[3]) for row in chunk]
+        first = min(timestamps) if first is None else min(first, min(timestamps))
+        last = max(timestamps) if last is None else max(last, max(timestamps))
+    return first, last
+
+def create_interaction_partitions(conn):
+    """Monthly partitions for the CSV's time range, so no row is routed to the default partition."""
+    first, last = timestamp_range(CSV_PATHS['interactions'])
+    if first is None:
+        return []
+    with conn.cursor() as cur:
+        created = ensure_partitions(cur, first, last)
+        # Plus the months the API will write live interactions into
+        now = int(time.time())
+        created += ensure_partitions(cur, now, now, PARTITIONS_AHEAD)
+    conn.commit()
+    print(f" {len(created)} new interaction partitions")
+    return created
+
 def load_interactions(conn):
     print(f"\n Loading interactions from: {CSV_PATHS['interactions']}...")
     sql = "INSERT INTO interactions (user_id, item_id, rating, timestamp) VALUES (%s, %s, %s, %s)"
     count = 0
 
     try:
+        create_interaction_partitions(conn)
         with conn.cursor() as cur:
             for chunk in load_csv_data_chunks(CSV_PATHS['interactions']):
                 casted_chunk = [
@@ -104,8 +122,11 @@ def load_interactions(conn):
                     )
                     for row in chunk
                 ]
+                # Time order keeps each partition's BRIN ranges narrow
+                casted_chunk.sort(key=lambda row: row[3])
                 execute_batch(cur, sql, casted_chunk, page_size=BATCH_SIZE)
                 count += len(casted_chunk)
+            cur.execute("ANALYZE interactions")
         conn.commit()
         print(f" Successfully loaded {count} rows into 'interactions' table.")
         return count
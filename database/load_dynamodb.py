@@ -1,10 +1,18 @@
+import argparse
 import boto3
 import csv
 import json
+import os
 import time
+import psycopg2
 from decimal import Decimal
+from botocore.config import Config as BotoConfig
 from botocore.exceptions import ClientError
 
+from dynamo_writer import BulkWriter
+from parquet_cache import iter_row_chunks
+from rec_codec import encode_item, estimate_item_size
+
 # ============================================================================
 # CONFIGURATION - EDIT THIS SECTION TO SWITCH BETWEEN 10 AND 10K USERS
 # ============================================================================
@@ -36,26 +44,63 @@ DYNAMODB_TABLES = {
     "recommendations": "rec-recommendations"
 }
 
-# Batch size for DynamoDB batch writes (max 25)
-BATCH_SIZE = 25
+# Concurrent batch_write_item requests per table (each carries up to 25 items)
+MAX_WORKERS = 8
 
 # AWS region
 AWS_REGION = "us-east-1"  # Change to your preferred region
 
+# Point at DynamoDB Local or a moto server, e.g. http://localhost:8000
+DYNAMODB_ENDPOINT_URL = os.getenv("DYNAMODB_ENDPOINT_URL")
+
+# Source database for the recommendations migration
+POSTGRES_CONFIG = {
+    "host": "localhost",
+    "database": "recommendations",
+    "user": os.environ.get("DB_USER", "postgres")
+}
+
+# How recommendation lists are stored: "list" (List of Maps, what the Lambda reads today)
+# or "compact" (one packed Binary attribute, see rec_codec.py)
+RECOMMENDATION_ENCODING = "list"
+
+# Rows fetched from the server-side cursor (and flushed to DynamoDB) per chunk
+STREAM_CHUNK_SIZE = 1000
+# Last user_id written by the streaming migration, for resuming after a failure
+CHECKPOINT_PATH = "../data/models/recommendations_migration_checkpoint.json"
+
 
 # ============================================================================
 # END CONFIGURATION
 # ============================================================================
 
 
+def get_boto_config():
+    """One pooled connection per writer thread; BulkWriter does its own retries"""
+    return BotoConfig(
+        max_pool_connections=MAX_WORKERS,
+        retries={'total_max_attempts': 1}
+    )
+
+
 def get_dynamodb_client():
     """Initialize DynamoDB client"""
-    return boto3.client('dynamodb', region_name=AWS_REGION)
+    return boto3.client('dynamodb', region_name=AWS_REGION,
+                        endpoint_url=DYNAMODB_ENDPOINT_URL, config=get_boto_config())
 
 
 def get_dynamodb_resource():
     """Initialize DynamoDB resource"""
-    return boto3.resource('dynamodb', region_name=AWS_REGION)
+    return boto3.resource('dynamodb', region_name=AWS_REGION,
+                          endpoint_url=DYNAMODB_ENDPOINT_URL, config=get_boto_config())
+
+
+def get_bulk_writer(dynamodb, table_name, label):
+    """
+    Concurrent writer for one table. The resource's client accepts plain
+    Python values, like table.batch_write_item did before.
+    """
+    return BulkWriter(dynamodb.meta.client, table_name, label=label, max_workers=MAX_WORKERS)
 
 
 def convert_to_decimal(value):
@@ -72,42 +117,22 @@ def load_users(dynamodb, csv_path, table_name):
     print(f"Target table: {table_name}")
     print(f"{'=' * 70}")
 
-    table = dynamodb.Table(table_name)
-    count = 0
-    batch = []
-
     try:
-        with open(csv_path, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            next(reader)  # Skip header
+        with get_bulk_writer(dynamodb, table_name, "users") as writer:
+            # Parquet copy when fresh, else the CSV (see parquet_cache.py)
+            for chunk in iter_row_chunks(csv_path):
+                for row in chunk:
+                    user_id = row[0]
 
-            for row in reader:
-                user_id = row[0]
+                    item = {
+                        'user_id': user_id
+                    }
 
-                item = {
-                    'user_id': user_id
-                }
+                    writer.put(item)
 
-                batch.append({'PutRequest': {'Item': item}})
-
-                if len(batch) >= BATCH_SIZE:
-                    table.meta.client.batch_write_item(
-                        RequestItems={table_name: batch}
-                    )
-                    count += len(batch)
-                    print(f"  Loaded {count} users...")
-                    batch = []
-                    time.sleep(0.1)  # Avoid throttling
-
-            # Write remaining items
-            if batch:
-                table.meta.client.batch_write_item(
-                    RequestItems={table_name: batch}
-                )
-                count += len(batch)
-
-        print(f"✅ Successfully loaded {count} users")
-        return count
+        writer.report()
+        print(f"✅ Successfully loaded {writer.written} users")
+        return writer.written
 
     except Exception as e:
         print(f"❌ Error loading users: {e}")
@@ -121,41 +146,21 @@ def load_items(dynamodb, csv_path, table_name):
     print(f"Target table: {table_name}")
     print(f"{'=' * 70}")
 
-    table = dynamodb.Table(table_name)
-    count = 0
-    batch = []
-
     try:
-        with open(csv_path, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            next(reader)  # Skip header
+        with get_bulk_writer(dynamodb, table_name, "items") as writer:
+            for chunk in iter_row_chunks(csv_path):
+                for row in chunk:
+                    item_id = row[0]
 
-            for row in reader:
-                item_id = row[0]
+                    item = {
+                        'item_id': item_id
+                    }
 
-                item = {
-                    'item_id': item_id
-                }
+                    writer.put(item)
 
-                batch.append({'PutRequest': {'Item': item}})
-
-                if len(batch) >= BATCH_SIZE:
-                    table.meta.client.batch_write_item(
-                        RequestItems={table_name: batch}
-                    )
-                    count += len(batch)
-                    print(f"  Loaded {count} items...")
-                    batch = []
-                    time.sleep(0.1)
-
-            if batch:
-                table.meta.client.batch_write_item(
-                    RequestItems={table_name: batch}
-                )
-                count += len(batch)
-
-        print(f"✅ Successfully loaded {count} items")
-        return count
+        writer.report()
+        print(f"✅ Successfully loaded {writer.written} items")
+        return writer.written
 
     except Exception as e:
         print(f"❌ Error loading items: {e}")
@@ -169,51 +174,31 @@ def load_interactions(dynamodb, csv_path, table_name):
     print(f"Target table: {table_name}")
     print(f"{'=' * 70}")
 
-    table = dynamodb.Table(table_name)
-    count = 0
-    batch = []
-
     try:
-        with open(csv_path, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            next(reader)  # Skip header
-
-            for row in reader:
-                user_id = row[0]
-                item_id = row[1]
-                rating = convert_to_decimal(float(row[2]))
-                timestamp = int(row[3])
-
-                # Create unique interaction_id as composite key
-                interaction_id = f"{timestamp}#{item_id}"
-
-                item = {
-                    'user_id': user_id,
-                    'interaction_id': interaction_id,  # New sort key
-                    'item_id': item_id,
-                    'rating': rating,
-                    'timestamp': timestamp  # Keep for querying
-                }
-
-                batch.append({'PutRequest': {'Item': item}})
-
-                if len(batch) >= BATCH_SIZE:
-                    table.meta.client.batch_write_item(
-                        RequestItems={table_name: batch}
-                    )
-                    count += len(batch)
-                    print(f"  Loaded {count} interactions...")
-                    batch = []
-                    time.sleep(0.1)
-
-            if batch:
-                table.meta.client.batch_write_item(
-                    RequestItems={table_name: batch}
-                )
-                count += len(batch)
-
-        print(f"✅ Successfully loaded {count} interactions")
-        return count
+        with get_bulk_writer(dynamodb, table_name, "interactions") as writer:
+            for chunk in iter_row_chunks(csv_path):
+                for row in chunk:
+                    user_id = row[0]
+                    item_id = row[1]
+                    rating = convert_to_decimal(float(row[2]))
+                    timestamp = int(row[3])
+
+                    # Create unique interaction_id as composite key
+                    interaction_id = f"{timestamp}#{item_id}"
+
+                    item = {
+                        'user_id': user_id,
+                        'interaction_id': interaction_id,  # New sort key
+                        'item_id': item_id,
+                        'rating': rating,
+                        'timestamp': timestamp  # Keep for querying
+                    }
+
+                    writer.put(item)
+
+        writer.report()
+        print(f"✅ Successfully loaded {writer.written} interactions")
+        return writer.written
 
     except Exception as e:
         print(f"❌ Error loading interactions: {e}")
@@ -225,23 +210,14 @@ def export_recommendations_from_postgres():
     Export recommendations from PostgreSQL to CSV
     Run this first if you haven't already
     """
-    print("\n{'='*70}")
+    print(f"\n{'=' * 70}")
     print("EXPORTING RECOMMENDATIONS FROM POSTGRESQL")
     print(f"{'=' * 70}")
 
-    import psycopg2
-    import os
-
-    DB_CONFIG = {
-        "host": "localhost",
-        "database": "recommendations",
-        "user": os.environ.get("DB_USER", "postgres")
-    }
-
-    output_path = "../data/models/recommendations_export.csv"
+    output_path = CSV_PATHS['recommendations']
 
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
+        conn = psycopg2.connect(**POSTGRES_CONFIG)
         cursor = conn.cursor()
 
         query = "SELECT user_id, recommended_items FROM recommendations"
@@ -267,68 +243,179 @@ def export_recommendations_from_postgres():
         return False
 
 
-def load_recommendations(dynamodb, csv_path, table_name):
+def load_recommendations(dynamodb, csv_path, table_name, encoding=RECOMMENDATION_ENCODING):
     """Load recommendations into DynamoDB"""
     print(f"\n{'=' * 70}")
     print(f"Loading RECOMMENDATIONS from: {csv_path}")
     print(f"Target table: {table_name}")
     print(f"{'=' * 70}")
 
-    table = dynamodb.Table(table_name)
-    count = 0
-    batch = []
-
+    sizes = ItemSizeReport(encoding)
     try:
-        with open(csv_path, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            next(reader)  # Skip header
+        with get_bulk_writer(dynamodb, table_name, "recommendation lists") as writer:
+            with open(csv_path, 'r', encoding='utf-8') as f:
+                reader = csv.reader(f)
+                next(reader)  # Skip header
 
-            for row in reader:
-                user_id = row[0]
-                recommended_items_json = row[1]
-
-                # Parse JSON and convert floats to Decimals
-                recommended_items = json.loads(recommended_items_json)
-                for rec in recommended_items:
-                    rec['score'] = convert_to_decimal(rec['score'])
-
-                item = {
-                    'user_id': user_id,
-                    'recommended_items': recommended_items
-                }
-
-                batch.append({'PutRequest': {'Item': item}})
-
-                if len(batch) >= BATCH_SIZE:
-                    table.meta.client.batch_write_item(
-                        RequestItems={table_name: batch}
-                    )
-                    count += len(batch)
-                    print(f"  Loaded {count} recommendation lists...")
-                    batch = []
-                    time.sleep(0.1)
-
-            if batch:
-                table.meta.client.batch_write_item(
-                    RequestItems={table_name: batch}
-                )
-                count += len(batch)
-
-        print(f"✅ Successfully loaded {count} recommendation lists")
-        return count
+                for row in reader:
+                    user_id = row[0]
+                    recommended_items_json = row[1]
+
+                    recommended_items = json.loads(recommended_items_json)
+                    writer.put(recommendation_to_item(user_id, recommended_items, encoding, sizes))
+
+        writer.report()
+        sizes.report()
+        print(f"✅ Successfully loaded {writer.written} recommendation lists")
+        return writer.written
 
     except Exception as e:
         print(f"❌ Error loading recommendations: {e}")
         return 0
 
 
+class ItemSizeReport:
+    """Average DynamoDB item size with the plain List-of-Maps encoding vs the one written"""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        self.count = 0
+        self.list_bytes = 0
+        self.written_bytes = 0
+
+    def add(self, list_size, written_size):
+        self.count += 1
+        self.list_bytes += list_size
+        self.written_bytes += written_size
+
+    def report(self):
+        if not self.count:
+            return
+        before = self.list_bytes / self.count
+        after = self.written_bytes / self.count
+        print(f"  Average item size: {before:.0f} bytes as list -> {after:.0f} bytes as {self.encoding} "
+              f"({(1 - after / before) * 100:.1f}% smaller)")
+
+
+def recommendation_to_item(user_id, recommended_items, encoding=RECOMMENDATION_ENCODING, sizes=None):
+    """Parsed recommendation list (JSONB from Postgres or the CSV export) -> DynamoDB item"""
+    list_item = {
+        'user_id': user_id,
+        'recommended_items': [
+            {'item_id': rec['item_id'], 'score': convert_to_decimal(rec['score'])}
+            for rec in recommended_items
+        ]
+    }
+    item = encode_item(user_id, recommended_items) if encoding == 'compact' else list_item
+
+    if sizes is not None:
+        sizes.add(estimate_item_size(list_item), estimate_item_size(item))
+    return item
+
+
+def read_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_checkpoint(path, last_user_id, written, complete=False):
+    # Write-then-rename so a crash never leaves a half-written checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'last_user_id': last_user_id,
+            'written': written,
+            'complete': complete,
+            'updated_at': time.time()
+        }, f)
+    os.replace(tmp_path, path)
+
+
+def stream_recommendations_to_dynamodb(dynamodb, table_name, checkpoint_path=CHECKPOINT_PATH,
+                                       restart=False, chunk_size=STREAM_CHUNK_SIZE,
+                                       encoding=RECOMMENDATION_ENCODING):
+    """
+    Stream recommendations from Postgres straight into DynamoDB.
+
+    A named (server-side) cursor hands rows over in chunks ordered by user_id,
+    so memory stays constant regardless of table size. The checkpoint only
+    advances after a whole chunk has been acknowledged by DynamoDB; a rerun
+    resumes after the last checkpointed user_id (puts are idempotent, so a
+    partially written chunk is simply written again).
+    """
+    print(f"\n{'=' * 70}")
+    print("STREAMING RECOMMENDATIONS: PostgreSQL -> DynamoDB")
+    print(f"Target table: {table_name}")
+    print(f"{'=' * 70}")
+
+    checkpoint = None if restart else read_checkpoint(checkpoint_path)
+    if checkpoint and checkpoint.get('complete'):
+        print(f"Checkpoint {checkpoint_path} says the migration already completed; use --restart to redo it")
+        return 0
+
+    last_user_id = checkpoint['last_user_id'] if checkpoint else None
+    written_before = checkpoint['written'] if checkpoint else 0
+    if last_user_id:
+        print(f"Resuming after user_id {last_user_id} ({written_before} already written)")
+
+    sizes = ItemSizeReport(encoding)
+    conn = None
+    try:
+        conn = psycopg2.connect(**POSTGRES_CONFIG)
+        cursor = conn.cursor(name="recommendations_migration")
+        cursor.itersize = chunk_size
+
+        if last_user_id:
+            cursor.execute(
+                "SELECT user_id, recommended_items FROM recommendations WHERE user_id > %s ORDER BY user_id",
+                (last_user_id,)
+            )
+        else:
+            cursor.execute("SELECT user_id, recommended_items FROM recommendations ORDER BY user_id")
+
+        with get_bulk_writer(dynamodb, table_name, "recommendation lists") as writer:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+
+                for user_id, recommended_items in rows:
+                    writer.put(recommendation_to_item(user_id, recommended_items, encoding, sizes))
+                writer.flush()
+
+                if writer.failed:
+                    print(f"❌ {writer.failed} items failed; stopping at checkpoint {last_user_id}")
+                    break
+
+                last_user_id = rows[-1][0]
+                write_checkpoint(checkpoint_path, last_user_id, written_before + writer.written)
+
+        if not writer.failed:
+            write_checkpoint(checkpoint_path, last_user_id, written_before + writer.written, complete=True)
+
+        cursor.close()
+        writer.report()
+        sizes.report()
+        print(f"✅ Streamed {writer.written} recommendation lists")
+        return writer.written
+
+    except Exception as e:
+        print(f"❌ Error streaming recommendations: {e}")
+        return 0
+    finally:
+        if conn and not conn.closed:
+            conn.close()
+
+
 def verify_tables(dynamodb):
     """Verify data was loaded correctly"""
     print(f"\n{'=' * 70}")
     print("VERIFICATION")
     print(f"{'=' * 70}")
 
-    client = boto3.client('dynamodb', region_name=AWS_REGION)
+    client = get_dynamodb_client()
 
     for key, table_name in DYNAMODB_TABLES.items():
         try:
@@ -339,7 +426,23 @@ def verify_tables(dynamodb):
             print(f"  {table_name}: Error - {e}")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load users, items, interactions and recommendations into DynamoDB")
+    parser.add_argument("--tables", default="users,items,interactions,recommendations",
+                        help="Comma-separated subset of tables to load")
+    parser.add_argument("--recommendations-source", choices=["postgres", "csv"], default="postgres",
+                        help="Stream recommendations from Postgres (default) or load the CSV export")
+    parser.add_argument("--recommendation-encoding", choices=["list", "compact"], default=RECOMMENDATION_ENCODING,
+                        help="List of Maps (default) or one packed Binary attribute per user")
+    parser.add_argument("--restart", action="store_true",
+                        help="Ignore the streaming checkpoint and migrate all recommendations again")
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
+    tables = set(args.tables.split(","))
+
     print("\n" + "=" * 70)
     print("DYNAMODB DATA LOADER")
     print("=" * 70)
@@ -350,45 +453,52 @@ def main():
     # Initialize DynamoDB
     dynamodb = get_dynamodb_resource()
 
-    # Step 1: Export recommendations from PostgreSQL (if not done)
-    print("\nStep 1: Export recommendations from PostgreSQL")
-    print("Have you already exported? (y/n)")
-    export_choice = input().strip().lower()
-
-    if export_choice != 'y':
-        export_recommendations_from_postgres()
-
-    # Step 2: Load data
-    loaded_counts = {}
-
-    print("\nStep 2: Load data into DynamoDB")
-
-    loaded_counts['users'] = load_users(
-        dynamodb,
-        CSV_PATHS['users'],
-        DYNAMODB_TABLES['users']
-    )
-
-    loaded_counts['items'] = load_items(
-        dynamodb,
-        CSV_PATHS['items'],
-        DYNAMODB_TABLES['items']
-    )
-
-    loaded_counts['interactions'] = load_interactions(
-        dynamodb,
-        CSV_PATHS['interactions'],
-        DYNAMODB_TABLES['interactions']
-    )
-
-    loaded_counts['recommendations'] = load_recommendations(
-        dynamodb,
-        CSV_PATHS['recommendations'],
-        DYNAMODB_TABLES['recommendations']
-    )
-
-    # Step 3: Verify
-    print("\nStep 3: Verify data")
+    # Step 1: Load data
+    loaded_counts = {table: 0 for table in DYNAMODB_TABLES}
+
+    print("\nStep 1: Load data into DynamoDB")
+
+    if 'users' in tables:
+        loaded_counts['users'] = load_users(
+            dynamodb,
+            CSV_PATHS['users'],
+            DYNAMODB_TABLES['users']
+        )
+
+    if 'items' in tables:
+        loaded_counts['items'] = load_items(
+            dynamodb,
+            CSV_PATHS['items'],
+            DYNAMODB_TABLES['items']
+        )
+
+    if 'interactions' in tables:
+        loaded_counts['interactions'] = load_interactions(
+            dynamodb,
+            CSV_PATHS['interactions'],
+            DYNAMODB_TABLES['interactions']
+        )
+
+    if 'recommendations' in tables:
+        if args.recommendations_source == 'postgres':
+            loaded_counts['recommendations'] = stream_recommendations_to_dynamodb(
+                dynamodb,
+                DYNAMODB_TABLES['recommendations'],
+                restart=args.restart,
+                encoding=args.recommendation_encoding
+            )
+        else:
+            if not os.path.exists(CSV_PATHS['recommendations']):
+                export_recommendations_from_postgres()
+            loaded_counts['recommendations'] = load_recommendations(
+                dynamodb,
+                CSV_PATHS['recommendations'],
+                DYNAMODB_TABLES['recommendations'],
+                encoding=args.recommendation_encoding
+            )
+
+    # Step 2: Verify
+    print("\nStep 2: Verify data")
     verify_tables(dynamodb)
 
     print("\n" + "=" * 70)
@@ -0,0 +1,214 @@
+"""
+Parquet copies of the processed CSVs, for loaders that re-read them on every run.
+
+`python parquet_cache.py` writes <name>.parquet next to every CSV in
+../data/processed: typed columns (ids as dictionary-encoded strings, rating as
+float32, timestamp as int64), zstd-compressed, in row groups of
+ROW_GROUP_SIZE rows with min/max statistics. The CSV is streamed through
+pyarrow's block reader, so converting the full interactions file does not
+need it in memory.
+
+The readers below use the Parquet copy when pyarrow is installed and the copy
+is at least as new as its CSV, and fall back to reading the CSV otherwise, so
+callers never need to know which one they got. Rows come back in CSV column
+order either way; the Parquet path yields typed values where the CSV path
+yields strings, and callers cast as before.
+
+    python parquet_cache.py                      # convert stale or missing copies
+    python parquet_cache.py --force ../data/processed/interactions_filtered.csv
+"""
+import argparse
+import csv
+import glob
+import os
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:  # Optional: everything falls back to the CSVs
+    pa = None
+
+PROCESSED_DIR = "../data/processed"
+ROW_GROUP_SIZE = 256 * 1024
+READ_BLOCK_BYTES = 16 * 1024 * 1024
+CHUNK_SIZE = 10000
+
+# CSV header -> (Parquet column, type name); anything else is kept as a string
+COLUMNS = {
+    "User_ID": ("user_id", "string"),
+    "Product_ID": ("item_id", "string"),
+    "Rating": ("rating", "float32"),
+    "Timestamp": ("timestamp", "int64"),
+}
+
+
+def available():
+    return pa is not None
+
+
+def cache_path(csv_path):
+    return os.path.splitext(csv_path)[0] + ".parquet"
+
+
+def is_fresh(csv_path):
+    """True when a Parquet copy exists, pyarrow can read it and it is not older than the CSV."""
+    path = cache_path(csv_path)
+    if not available() or not os.path.exists(path):
+        return False
+    return not os.path.exists(csv_path) or os.path.getmtime(path) >= os.path.getmtime(csv_path)
+
+
+def read_header(csv_path):
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        return next(csv.reader(f))
+
+
+def arrow_type(name):
+    return {"string": pa.string(), "float32": pa.float32(), "int64": pa.int64()}[name]
+
+
+def convert(csv_path, row_group_size=ROW_GROUP_SIZE):
+    """Write the Parquet copy of one CSV; returns (rows, parquet bytes)."""
+    if not available():
+        raise RuntimeError("pyarrow is not installed (pip install pyarrow)")
+
+    header = read_header(csv_path)
+    names = [COLUMNS.get(column, (column.lower(), "string"))[0] for column in header]
+    types = [arrow_type(COLUMNS.get(column, (None, "string"))[1]) for column in header]
+    schema = pa.schema(list(zip(names, types)))
+    string_columns = [name for name, type_ in zip(names, types) if type_ == pa.string()]
+
+    reader = pa_csv.open_csv(
+        csv_path,
+        read_options=pa_csv.ReadOptions(block_size=READ_BLOCK_BYTES),
+        # Explicit types: item ids like 0528881469 must stay strings
+        convert_options=pa_csv.ConvertOptions(column_types=dict(zip(header, types))),
+    )
+
+    path = cache_path(csv_path)
+    temp_path = path + ".tmp"
+    rows = 0
+    pending, pending_rows = [], 0
+    with pq.ParquetWriter(temp_path, schema, compression="zstd", use_dictionary=string_columns,
+                          write_statistics=True) as writer:
+        for batch in reader:
+            pending.append(pa.RecordBatch.from_arrays(batch.columns, schema=schema))
+            pending_rows += batch.num_rows
+            # Buffer blocks so every row group (and its statistics) covers row_group_size rows
+            if pending_rows >= row_group_size:
+                writer.write_table(pa.Table.from_batches(pending, schema=schema), row_group_size=row_group_size)
+                rows += pending_rows
+                pending, pending_rows = [], 0
+        if pending:
+            writer.write_table(pa.Table.from_batches(pending, schema=schema), row_group_size=row_group_size)
+            rows += pending_rows
+    os.replace(temp_path, path)  # Readers never see a half-written file
+    return rows, os.path.getsize(path)
+
+
+#################### --- READERS ---#################################
+def iter_row_chunks(csv_path, chunk_size=CHUNK_SIZE):
+    """Lists of row tuples (header skipped), from the Parquet copy when it is fresh."""
+    if is_fresh(csv_path):
+        parquet_file = pq.ParquetFile(cache_path(csv_path))
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            yield list(zip(*(column.to_pylist() for column in batch.columns)))
+        return
+
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"CSV file not found at: {csv_path}")
+    with open(csv_path, "r", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader)
+        chunk = []
+        for row in reader:
+            chunk.append(tuple(row))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def read_column(csv_path, index=0):
+    """One column as a list, e.g. all user ids; reads nothing else from the Parquet copy."""
+    if is_fresh(csv_path):
+        parquet_file = pq.ParquetFile(cache_path(csv_path))
+        name = parquet_file.schema_arrow.names[index]
+        return parquet_file.read(columns=[name]).column(0).to_pylist()
+
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader)
+        return [row[index] for row in reader]
+
+
+def column_range(csv_path, index):
+    """(min, max) of a column from the row-group statistics, or None if there is no fresh copy."""
+    if not is_fresh(csv_path):
+        return None
+    metadata = pq.ParquetFile(cache_path(csv_path)).metadata
+    low, high = None, None
+    for group in range(metadata.num_row_groups):
+        statistics = metadata.row_group(group).column(index).statistics
+        if statistics is None or not statistics.has_min_max:
+            return None
+        low = statistics.min if low is None else min(low, statistics.min)
+        high = statistics.max if high is None else max(high, statistics.max)
+    return (low, high) if low is not None else None
+
+
+def read_dataframe(csv_path, columns=None):
+    """
+    pandas DataFrame with the Parquet column names (user_id, item_id, ...).
+
+    From the Parquet copy the id columns come back as pandas categoricals, which
+    keeps one copy of each distinct id instead of one Python string per row.
+    """
+    import pandas as pd
+
+    if is_fresh(csv_path):
+        parquet_file = pq.ParquetFile(cache_path(csv_path))
+        string_columns = [
+            field.name for field in parquet_file.schema_arrow
+            if field.type == pa.string() and (columns is None or field.name in columns)
+        ]
+        table = pq.read_table(cache_path(csv_path), columns=columns, read_dictionary=string_columns)
+        return table.to_pandas()
+
+    header = read_header(csv_path)
+    pandas_types = {"string": str, "float32": "float32", "int64": "int64"}
+    df = pd.read_csv(csv_path, dtype={
+        column: pandas_types[COLUMNS.get(column, (None, "string"))[1]] for column in header
+    })
+    df.columns = [COLUMNS.get(column, (column.lower(), None))[0] for column in header]
+    return df[columns] if columns else df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write Parquet copies of the processed CSVs")
+    parser.add_argument("paths", nargs="*", help=f"CSVs to convert (default: every CSV in {PROCESSED_DIR})")
+    parser.add_argument("--force", action="store_true", help="Rewrite copies that are already up to date")
+    parser.add_argument("--row-group-size", type=int, default=ROW_GROUP_SIZE)
+    args = parser.parse_args()
+
+    if not available():
+        print("pyarrow is not installed (pip install pyarrow); loaders keep reading the CSVs.")
+        return
+
+    paths = args.paths or sorted(glob.glob(os.path.join(PROCESSED_DIR, "*.csv")))
+    for csv_path in paths:
+        if is_fresh(csv_path) and not args.force:
+            print(f"{csv_path}: up to date")
+            continue
+        start_time = time.time()
+        rows, size = convert(csv_path, args.row_group_size)
+        csv_size = os.path.getsize(csv_path)
+        print(f"{csv_path}: {rows} rows, {csv_size / 1e6:.1f} MB -> {size / 1e6:.1f} MB "
+              f"({size / csv_size:.0%}) in {time.time() - start_time:.2f} seconds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+import psycopg2
+import argparse
+import os
+import re
+import time
+from datetime import datetime, timezone
+
+DB_CONFIG = {
+    "host": "localhost",
+    "database": "recommendations",
+    "user": "s4p",
+}
+
+# interactions is range-partitioned by month of its epoch-seconds `timestamp`
+# (see schema.sql). Rows outside every monthly partition land in the default one.
+PARENT = "interactions"
+DEFAULT_PARTITION = "interactions_default"
+# Months created past the current one, so live writes never hit the default partition
+PARTITIONS_AHEAD = 2
+# Incremental jobs rescan from the start of the month this far before their
+# watermark, to pick up rows written with slightly older timestamps
+LATE_ARRIVAL_SECONDS = 24 * 3600
+ARCHIVE_DIR = "../data/archive"
+
+BOUND_RE = re.compile(r"FROM \('?(-?\d+)'?\) TO \('?(-?\d+)'?\)")
+
+
+def get_db_connection():
+    try:
+        conn = psycopg2.connect(**DB_CONFIG)
+        conn.autocommit = False
+        return conn
+    except Exception as e:
+        print(f" Error connecting to database: {e}")
+        return None
+
+
+def month_start(timestamp):
+    """Epoch seconds of the first instant (UTC) of the month holding `timestamp`."""
+    day = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    return int(datetime(day.year, day.month, 1, tzinfo=timezone.utc).timestamp())
+
+
+def next_month(start):
+    day = datetime.fromtimestamp(start, tz=timezone.utc)
+    year, month = (day.year + 1, 1) if day.month == 12 else (day.year, day.month + 1)
+    return int(datetime(year, month, 1, tzinfo=timezone.utc).timestamp())
+
+
+def partition_name(start):
+    day = datetime.fromtimestamp(start, tz=timezone.utc)
+    return f"{PARENT}_p{day.year:04d}_{day.month:02d}"
+
+
+def parse_month(value):
+    """'2014-03' -> epoch seconds of 2014-03-01 00:00 UTC."""
+    return int(datetime.strptime(value, "%Y-%m").replace(tzinfo=timezone.utc).timestamp())
+
+
+def scan_floor(watermark_timestamp, slack=LATE_ARRIVAL_SECONDS):
+    """
+    Lowest timestamp an incremental job needs to read after `watermark_timestamp`.
+
+    Rounded down to a partition boundary, so a `timestamp >= floor` predicate
+    lets the planner skip every older partition outright.
+    """
+    if not watermark_timestamp:
+        return 0
+    return month_start(max(0, watermark_timestamp - slack))
+
+
+def list_partitions(cur):
+    """[(name, lower, upper, estimated rows)] ordered by range; the default partition has no bounds."""
+    cur.execute(
+        """
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::BIGINT
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+        """,
+        (PARENT,)
+    )
+    partitions = []
+    for name, bound, rows in cur.fetchall():
+        match = BOUND_RE.search(bound or "")
+        lower, upper = (int(match.group(1)), int(match.group(2))) if match else (None, None)
+        partitions.append((name, lower, upper, max(rows, 0)))
+    partitions.sort(key=lambda partition: (partition[1] is None, partition[1] or 0))
+    return partitions
+
+
+def ensure_partition(cur, start):
+    """
+    Create the monthly partition starting at `start` unless it exists.
+
+    Rows already sitting in the default partition for that month are moved
+    into the new partition before it is attached; Postgres refuses to attach
+    a range the default partition still has rows for.
+    """
+    name = partition_name(start)
+    cur.execute("SELECT to_regclass(%s)", (name,))
+    if cur.fetchone()[0] is not None:
+        return False
+
+    end = next_month(start)
+    cur.execute(
+        f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE timestamp >= %s AND timestamp < %s)",
+        (start, end)
+    )
+    if not cur.fetchone()[0]:
+        cur.execute(f"CREATE TABLE {name} PARTITION OF {PARENT} FOR VALUES FROM (%s) TO (%s)", (start, end))
+        return True
+
+    cur.execute(f"CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    cur.execute(
+        f"""
+        WITH moved AS (
+            DELETE FROM {DEFAULT_PARTITION} WHERE timestamp >= %s AND timestamp < %s RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+        """,
+        (start, end)
+    )
+    moved = cur.rowcount
+    cur.execute(f"ALTER TABLE {PARENT} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", (start, end))
+    print(f"Moved {moved} rows from {DEFAULT_PARTITION} into {name}")
+    return True
+
+
+def ensure_partitions(cur, first_timestamp, last_timestamp, ahead=0):
+    """Monthly partitions covering first..last (plus `ahead` months); returns the names created."""
+    created = []
+    start = month_start(first_timestamp)
+    end = month_start(last_timestamp)
+    for _ in range(ahead):
+        end = next_month(end)
+    while start <= end:
+        if ensure_partition(cur, start):
+            created.append(partition_name(start))
+        start = next_month(start)
+    return created
+
+
+def ensure_current(cur, ahead=PARTITIONS_AHEAD):
+    """Partitions for this month and the next `ahead`; run from cron so live writes have a home."""
+    now = int(time.time())
+    return ensure_partitions(cur, now, now, ahead)
+
+
+def archive_partition(cur, name, archive_dir):
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.csv")
+    with open(path, "w", encoding="utf-8") as f:
+        cur.copy_expert(
+            f"COPY (SELECT user_id, item_id, rating, timestamp, interaction_id FROM {name} "
+            f"ORDER BY timestamp) TO STDOUT WITH CSV HEADER",
+            f
+        )
+    return path
+
+
+def detach_partitions(conn, before, archive_dir=None, drop=False):
+    """
+    Detach every monthly partition that ends at or before `before`.
+
+    Detaching is a catalog change, not a rewrite: the rows stay in a plain
+    table of the same name that no longer shows up in `interactions`. With
+    `archive_dir` the rows are also written to <archive_dir>/<name>.csv, and
+    with `drop` the detached table is dropped (only after a successful archive
+    when both are given). Each partition is its own transaction.
+    """
+    with conn.cursor() as cur:
+        old = [
+            (name, lower, upper, rows) for name, lower, upper, rows in list_partitions(cur)
+            if upper is not None and upper <= before
+        ]
+    conn.rollback()
+
+    detached = []
+    for name, lower, upper, rows in old:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"ALTER TABLE {PARENT} DETACH PARTITION {name}")
+                if archive_dir:
+                    path = archive_partition(cur, name, archive_dir)
+                    print(f"Archived {name} to {path}")
+                if drop:
+                    cur.execute(f"DROP TABLE {name}")
+            conn.commit()
+            detached.append(name)
+            print(f"{'Dropped' if drop else 'Detached'} {name} (~{rows} rows)")
+        except Exception as e:
+            conn.rollback()
+            print(f"Error detaching {name}: {e}")
+            break
+    return detached
+
+
+def print_partitions(cur):
+    partitions = list_partitions(cur)
+    print(f"{'Partition':<28}{'From (UTC)':>14}{'To (UTC)':>14}{'Rows (est.)':>14}")
+    for name, lower, upper, rows in partitions:
+        if lower is None:
+            print(f"{name:<28}{'default':>14}{'':>14}{rows:>14}")
+            continue
+        frm = datetime.fromtimestamp(lower, tz=timezone.utc).strftime("%Y-%m-%d")
+        to = datetime.fromtimestamp(upper, tz=timezone.utc).strftime("%Y-%m-%d")
+        print(f"{name:<28}{frm:>14}{to:>14}{rows:>14}")
+    print(f"{len(partitions)} partitions")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the monthly partitions of the interactions table")
+    parser.add_argument("action", choices=["list", "ensure", "detach"])
+    parser.add_argument("--from", dest="first", help="ensure: first month (YYYY-MM), default this month")
+    parser.add_argument("--to", dest="last", help="ensure: last month (YYYY-MM), default this month")
+    parser.add_argument("--ahead", type=int, default=PARTITIONS_AHEAD, help="ensure: extra months after --to")
+    parser.add_argument("--before", help="detach: partitions ending on or before this month (YYYY-MM)")
+    parser.add_argument("--archive-dir", nargs="?", const=ARCHIVE_DIR, default=None,
+                        help=f"detach: also write each partition to CSV (default dir {ARCHIVE_DIR})")
+    parser.add_argument("--drop", action="store_true", help="detach: drop the detached tables")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    if conn is None:
+        print("Exiting due to database connection failure.")
+        return
+    try:
+        if args.action == "list":
+            with conn.cursor() as cur:
+                print_partitions(cur)
+        elif args.action == "ensure":
+            now = int(time.time())
+            first = parse_month(args.first) if args.first else now
+            last = parse_month(args.last) if args.last else max(first, now)
+            with conn.cursor() as cur:
+                created = ensure_partitions(cur, first, last, args.ahead)
+            conn.commit()
+            print(f"Created {len(created)} partitions{': ' + ', '.join(created) if created else ''}")
+        else:
+            if not args.before:
+                parser.error("detach needs --before YYYY-MM")
+            detached = detach_partitions(conn, parse_month(args.before), args.archive_dir, args.drop)
+            print(f"Detached {len(detached)} partitions")
+    except Exception as e:
+        conn.rollback()
+        print(f"Error managing partitions: {e}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
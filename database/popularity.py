@@ -0,0 +1,273 @@
+import psycopg2
+import argparse
+import json
+import time
+
+from partitions import scan_floor
+
+DB_CONFIG = {
+    "host": "localhost",
+    "database": "recommendations",
+    "user": "s4p",
+}
+
+TOP_N = 20
+# Trending scores halve for every HALF_LIFE_DAYS between an interaction and the newest one
+HALF_LIFE_DAYS = 30
+# Mean ratings are shrunk towards the global mean as if each item had this many extra average ratings
+PRIOR_WEIGHT = 10
+
+# How long a refresh waits for in-flight inserts to commit before giving up until the next run
+SETTLE_TIMEOUT_SECONDS = 30
+SETTLE_POLL_SECONDS = 0.05
+
+HALF_LIFE_SECONDS = HALF_LIFE_DAYS * 24 * 3600
+
+# Decay of one interaction at the reference time; the exponent is clamped so
+# power() never underflows for very old interactions.
+DECAY_SQL = "power(2, GREATEST(-(%(reference)s - timestamp)::float8 / %(half_life)s, -1000))"
+
+AGGREGATE_SQL = f"""
+WITH delta AS (
+    SELECT item_id,
+           COUNT(*) AS interaction_count,
+           SUM(rating) AS rating_sum,
+           SUM(rating::float8 / 5.0 * {DECAY_SQL}) AS decayed_score
+    FROM interactions
+    WHERE interaction_id > %(low)s AND interaction_id <= %(high)s
+      AND timestamp >= %(since)s
+    GROUP BY item_id
+)
+INSERT INTO item_popularity AS p
+    (item_id, interaction_count, rating_sum, decayed_score, decay_reference)
+SELECT item_id, interaction_count, rating_sum, decayed_score, %(reference)s
+FROM delta
+ON CONFLICT (item_id) DO UPDATE
+SET interaction_count = p.interaction_count + EXCLUDED.interaction_count,
+    rating_sum = p.rating_sum + EXCLUDED.rating_sum,
+    decayed_score = p.decayed_score
+        * power(2, GREATEST(-(EXCLUDED.decay_reference - p.decay_reference)::float8 / %(half_life)s, -1000))
+        + EXCLUDED.decayed_score,
+    decay_reference = EXCLUDED.decay_reference
+"""
+
+RANKING_SQL = {
+    # Damped mean rating weighted by log of the interaction count
+    "global": """
+        SELECT item_id,
+               (rating_sum + %(prior_weight)s * %(prior_mean)s) / (interaction_count + %(prior_weight)s)
+                   * ln(1 + interaction_count) AS score
+        FROM item_popularity
+        ORDER BY score DESC, item_id
+        LIMIT %(top_n)s
+    """,
+    # Rating-weighted interaction count with exponential time decay
+    "trending": """
+        SELECT item_id,
+               decayed_score
+                   * power(2, GREATEST(-(%(reference)s - decay_reference)::float8 / %(half_life)s, -1000)) AS score
+        FROM item_popularity
+        ORDER BY score DESC, item_id
+        LIMIT %(top_n)s
+    """,
+}
+
+
+def get_db_connection():
+    try:
+        conn = psycopg2.connect(**DB_CONFIG)
+        conn.autocommit = False
+        return conn
+    except Exception as e:
+        print(f" Error connecting to database: {e}")
+        return None
+
+
+def get_watermark(cur):
+    """Last interaction_id folded into item_popularity and the decay reference time."""
+    cur.execute("SELECT MAX(watermark), MAX(decay_reference) FROM popularity_rankings")
+    watermark, reference = cur.fetchone()
+    return watermark or 0, reference or 0
+
+
+def settled_interaction_id(cur, timeout=SETTLE_TIMEOUT_SECONDS):
+    """
+    Highest interaction_id below which no insert can still commit.
+
+    interaction_id is handed out when a row is inserted, not when its
+    transaction commits, so MAX(interaction_id) can be visible while a lower
+    id is still in flight; a watermark at that MAX would skip the lower row
+    for good. Instead the sequence's last issued value is read first, then
+    this waits until every transaction that was running at that point has
+    ended. Every id up to that value is then either visible or rolled back
+    (ids fetched with a bare nextval() in a transaction that has not written
+    yet are the exception; the loaders only take them through the column default).
+    Returns None if that takes longer than `timeout` (e.g. a long bulk load).
+    """
+    cur.execute("SELECT pg_get_serial_sequence('interactions', 'interaction_id')")
+    sequence = cur.fetchone()[0]
+    cur.execute(f"SELECT last_value, is_called FROM {sequence}")
+    last_value, is_called = cur.fetchone()
+    issued = last_value if is_called else last_value - 1
+
+    # Read after the sequence, so every transaction holding an id <= issued is older than xmax
+    cur.execute("SELECT txid_snapshot_xmax(txid_current_snapshot())")
+    xmax = cur.fetchone()[0]
+    deadline = time.monotonic() + timeout
+    while True:
+        cur.execute("SELECT txid_snapshot_xmin(txid_current_snapshot()) >= %s", (xmax,))
+        if cur.fetchone()[0]:
+            return issued
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(SETTLE_POLL_SECONDS)
+
+
+def fold_interactions(cur, low, high, reference, since=0):
+    cur.execute(AGGREGATE_SQL, {
+        "low": low,
+        "high": high,
+        "since": since,
+        "reference": reference,
+        "half_life": HALF_LIFE_SECONDS,
+    })
+    return cur.rowcount
+
+
+def write_rankings(cur, watermark, reference, top_n=TOP_N):
+    cur.execute("SELECT SUM(rating_sum) / NULLIF(SUM(interaction_count), 0) FROM item_popularity")
+    prior_mean = float(cur.fetchone()[0] or 0)
+
+    params = {
+        "prior_weight": PRIOR_WEIGHT,
+        "prior_mean": prior_mean,
+        "reference": reference,
+        "half_life": HALF_LIFE_SECONDS,
+        "top_n": top_n,
+    }
+    rankings = {}
+    for ranking, sql in RANKING_SQL.items():
+        cur.execute(sql, params)
+        rankings[ranking] = [
+            {"item_id": item_id, "score": round(float(score), 4)}
+            for item_id, score in cur.fetchall()
+        ]
+        cur.execute(
+            """
+            INSERT INTO popularity_rankings (ranking, ranked_items, watermark, decay_reference)
+            VALUES (%s, %s::JSONB, %s, %s)
+            ON CONFLICT (ranking) DO UPDATE
+            SET ranked_items = EXCLUDED.ranked_items,
+                watermark = EXCLUDED.watermark,
+                decay_reference = EXCLUDED.decay_reference,
+                computed_at = NOW()
+            """,
+            (ranking, json.dumps(rankings[ranking]), watermark, reference)
+        )
+    return rankings
+
+
+def build_popularity(conn, top_n=TOP_N):
+    """Rebuild item_popularity from the whole interactions table (used by precompute)."""
+    print("\nBuilding popularity rankings...")
+    start_time = time.time()
+    try:
+        with conn.cursor() as cur:
+            settled = settled_interaction_id(cur)
+            if settled is None:
+                raise RuntimeError(f"inserts still in flight after {SETTLE_TIMEOUT_SECONDS}s")
+            cur.execute("SELECT MAX(timestamp) FROM interactions WHERE interaction_id <= %s", (settled,))
+            reference = cur.fetchone()[0]
+            if reference is None:
+                print("No interactions, skipping popularity rankings.")
+                return {}
+            high = settled
+
+            cur.execute("TRUNCATE TABLE item_popularity")
+            items = fold_interactions(cur, 0, high, reference)
+            rankings = write_rankings(cur, high, reference, top_n)
+
+        conn.commit()
+        print(f"Popularity built for {items} items in {time.time() - start_time:.2f} seconds.")
+        return rankings
+    except Exception as e:
+        conn.rollback()
+        print(f"Error building popularity rankings: {e}")
+        return {}
+
+
+def refresh_popularity(conn, top_n=TOP_N):
+    """
+    Fold only interactions newer than the stored watermark into item_popularity.
+
+    Uses the interaction_id primary key to read just the new rows, so the cost
+    is proportional to what arrived since the last refresh. The watermark only
+    advances to an id below which every insert has committed or rolled back
+    (see settled_interaction_id), so late commits are not skipped. When every
+    new row is at or after the timestamp floor (see partitions.scan_floor),
+    the fold also filters on it so Postgres skips the older monthly
+    partitions. A bulk load of historical rows (load_data.py inserts
+    1997-2014 timestamps) is below the floor, so that refresh scans every
+    partition instead of dropping those rows.
+    """
+    start_time = time.time()
+    try:
+        with conn.cursor() as cur:
+            low, reference = get_watermark(cur)
+            high = settled_interaction_id(cur)
+            if high is None:
+                print(f"Inserts still in flight after {SETTLE_TIMEOUT_SECONDS}s, retrying next run.")
+                conn.rollback()
+                return 0
+            cur.execute(
+                "SELECT MIN(timestamp), MAX(timestamp) FROM interactions "
+                "WHERE interaction_id > %s AND interaction_id <= %s",
+                (low, high)
+            )
+            oldest, newest = cur.fetchone()
+            if newest is None:
+                print(f"No new interactions since id {low}.")
+                conn.rollback()
+                return 0
+            # The floor only prunes partitions; it must never drop rows in (low, high]
+            since = scan_floor(reference)
+            if oldest < since:
+                print(f"New interactions go back to {oldest}, before the partition floor; scanning all partitions.")
+                since = 0
+
+            reference = max(reference, newest)
+            items = fold_interactions(cur, low, high, reference, since)
+            write_rankings(cur, high, reference, top_n)
+
+        conn.commit()
+        print(
+            f"Folded interactions {low + 1}..{high} into {items} items "
+            f"in {time.time() - start_time:.2f} seconds."
+        )
+        return high - low
+    except Exception as e:
+        conn.rollback()
+        print(f"Error refreshing popularity rankings: {e}")
+        return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or incrementally refresh popularity rankings")
+    parser.add_argument("--rebuild", action="store_true", help="Rescan all interactions instead of refreshing")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    if conn is None:
+        print("Exiting due to database connection failure.")
+        return
+    try:
+        if args.rebuild:
+            build_popularity(conn)
+        else:
+            refresh_popularity(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import argparse
 import psycopg2
 from psycopg2.extras import execute_batch
 import pandas as pd
@@ -9,6 +10,9 @@ import pickle
 import os
 from typing import List, Dict, Any
 
+from parquet_cache import is_fresh, read_dataframe
+from popularity import build_popularity
+
 
 DB_CONFIG = {
     "host": "localhost",
@@ -17,6 +21,8 @@ DB_CONFIG = {
 }
 
 MODEL_PATH = "../data/models/svd_model.pkl"
+# Training input for --source file (its Parquet copy is used when fresh, see parquet_cache.py)
+INTERACTIONS_PATH = "../data/processed/interactions_filtered.csv"
 TOP_N = 20
 BATCH_SIZE = 10000
 
@@ -46,6 +52,20 @@ def load_interaction_data(conn) -> pd.DataFrame:
         return pd.DataFrame()
 
 
+def load_interaction_file(path: str) -> pd.DataFrame:
+    """Training data from the processed file instead of Postgres (skips interactions written since the load)."""
+    source = "Parquet" if is_fresh(path) else "CSV"
+    print(f" Loading interaction data from {path} ({source})...")
+    start_time = time.time()
+    try:
+        df = read_dataframe(path, columns=['user_id', 'item_id', 'rating'])
+        print(f" Loaded {len(df)} interactions into DataFrame in {time.time() - start_time:.2f} seconds.")
+        return df
+    except Exception as e:
+        print(f" Error loading interaction file: {e}")
+        return pd.DataFrame()
+
+
 def train_and_save_model(df: pd.DataFrame, model_path: str):
     print("\n Preparing dataset and training SVD model...")
 
@@ -144,12 +164,21 @@ def store_recommendations(conn, recommendations_data: Dict[str, List[Dict[str, A
         return 0
 
 def main():
+    parser = argparse.ArgumentParser(description="Train the SVD model and precompute recommendations")
+    parser.add_argument("--source", choices=["postgres", "file"], default="postgres",
+                        help="Read training interactions from Postgres or from the processed file")
+    parser.add_argument("--interactions-path", default=INTERACTIONS_PATH)
+    args = parser.parse_args()
+
     conn = get_db_connection()
     if conn is None:
         print("Exiting due to database connection failure.")
         return
     try:
-        interactions_df = load_interaction_data(conn)
+        if args.source == "file":
+            interactions_df = load_interaction_file(args.interactions_path)
+        else:
+            interactions_df = load_interaction_data(conn)
         if interactions_df.empty:
             return
 
@@ -161,6 +190,7 @@ def main():
             model, trainset, all_item_ids, TOP_N
         )
         stored_count = store_recommendations(conn, recommendations)
+        popularity = build_popularity(conn, TOP_N)
 
         print("\n=============================================")
         print("✨ Recommendation Precomputation Complete ✨")
@@ -170,6 +200,7 @@ def main():
         print(f"Total Time Breakdown:")
         print(f"  - Training Time:       {training_time:.2f} seconds")
         print(f"  - Computation Time:    {computation_time:.2f} seconds")
+        print(f"Popularity Rankings: {', '.join(popularity) or 'none'} (cold-user fallback)")
 
         print("\n--- Sample Recommendations ---")
         sample_users = list(recommendations.keys())[:5]
@@ -0,0 +1,344 @@
+"""
+Streaming replacement for the preprocessing in `650project (1).ipynb`.
+
+The notebook loads the whole raw reviews CSV into pandas. This makes bounded
+passes over the file instead, each split into byte ranges parsed in parallel:
+
+1. count   interactions per user in a SpaceSaving heavy-hitters summary of
+           --capacity users, so memory does not grow with the input
+           (--counter exact keeps a Counter of every user instead).
+2. filter  keep the rows of the candidate users in a temporary file and
+           count them exactly.
+3. write   the rows of the exact top --top-users users, and the top
+           --sample-users subset, plus their distinct users and items.
+
+Cleaning matches the notebook: the raw file has no header but pandas used
+its first row as one, so that row is dropped (--keep-first-row keeps it);
+rows with a missing field are dropped (dropna, with pandas' NA spellings);
+timestamps go through float to int. Row order is the input order, users and
+items are listed in order of first appearance, and ties in the top-N cut go
+to the user seen first.
+
+    python preprocess.py ../data/raw/initial_amazon_reviews.csv
+    python preprocess.py raw.csv --top-users 50000 --capacity 2000000 --workers 8
+"""
+import argparse
+import collections
+import csv
+import heapq
+import multiprocessing
+import os
+import tempfile
+import time
+
+OUTPUT_DIR = "../data/processed"
+TOP_USERS = 10000
+SAMPLE_USERS = 10
+CHUNK_BYTES = 32 * 1024 * 1024
+# SpaceSaving summary size, as a multiple of --top-users
+CAPACITY_FACTOR = 20
+
+HEADER = ["User_ID", "Product_ID", "Rating", "Timestamp"]
+# Strings pandas.read_csv reads as NaN by default; dropna removes those rows
+NA_VALUES = frozenset({
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+})
+
+
+#################### --- PARSING ---#################################
+def byte_ranges(path, chunk_bytes=CHUNK_BYTES):
+    size = os.path.getsize(path)
+    return [(start, min(start + chunk_bytes, size)) for start in range(0, size, chunk_bytes)] or [(0, 0)]
+
+
+def read_range(path, start, end, skip_first_row):
+    """Lines that start inside [start, end); a line straddling `end` belongs to this range."""
+    with open(path, "rb") as f:
+        if start:
+            f.seek(start - 1)
+            f.readline()  # Finish the line the previous range owns
+        elif skip_first_row:
+            f.readline()
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            yield line.decode("utf-8")
+
+
+def clean_rows(lines):
+    """(user_id, item_id, rating, timestamp) per usable line, plus the number dropped."""
+    dropped = 0
+    rows = []
+    for fields in csv.reader(lines):
+        if len(fields) < 4 or any(field.strip() in NA_VALUES for field in fields[:4]):
+            dropped += 1
+            continue
+        try:
+            rows.append((fields[0], fields[1], float(fields[2]), int(float(fields[3]))))
+        except ValueError:
+            dropped += 1
+    return rows, dropped
+
+
+def quote(value):
+    if any(char in value for char in ',"\r\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def format_row(row):
+    # float repr matches pandas' to_csv output (5.0, not 5)
+    return f"{quote(row[0])},{quote(row[1])},{row[2]!r},{row[3]}\n"
+
+
+def split_ids(line):
+    if '"' in line:
+        return next(csv.reader([line]))[:2]
+    return line.split(",", 2)[:2]
+
+
+#################### --- PASS 1: COUNT ---#################################
+def count_chunk(task):
+    path, start, end, skip_first_row = task
+    rows, dropped = clean_rows(read_range(path, start, end, skip_first_row))
+    # Counter keeps first-appearance order, which the tie-break relies on
+    return collections.Counter(row[0] for row in rows), len(rows), dropped
+
+
+class SpaceSaving:
+    """
+    Weighted SpaceSaving (Metwally et al.): at most `capacity` counters. A key
+    that is not tracked replaces the smallest counter and inherits its count
+    as over-estimation error, so any key with more than total/capacity
+    occurrences is guaranteed to be tracked.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self._heap = []  # (count, key), with stale entries skipped lazily
+
+    def add(self, key, weight=1):
+        if key in self.counts:
+            self.counts[key] += weight
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = weight
+            self.errors[key] = 0
+        else:
+            floor, evicted = self._pop_min()
+            del self.counts[evicted]
+            del self.errors[evicted]
+            self.counts[key] = floor + weight
+            self.errors[key] = floor
+        heapq.heappush(self._heap, (self.counts[key], key))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, key) for key, count in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self):
+        while True:
+            count, key = heapq.heappop(self._heap)
+            if self.counts.get(key) == count:
+                return count, key
+
+    def min_count(self):
+        """Upper bound on the count of every key that is not tracked."""
+        return min(self.counts.values()) if len(self.counts) >= self.capacity else 0
+
+    def keys(self):
+        return set(self.counts)
+
+
+#################### --- PASS 2: FILTER ---#################################
+_CANDIDATES = None
+
+
+def set_candidates(candidates):
+    global _CANDIDATES
+    _CANDIDATES = candidates
+
+
+def filter_chunk(task):
+    path, start, end, skip_first_row = task
+    rows, _ = clean_rows(read_range(path, start, end, skip_first_row))
+    kept = [row for row in rows if row[0] in _CANDIDATES]
+    return "".join(format_row(row) for row in kept), collections.Counter(row[0] for row in kept)
+
+
+#################### --- PIPELINE ---#################################
+def run_pool(workers, function, tasks, initializer=None, initargs=()):
+    if workers <= 1:
+        if initializer:
+            initializer(*initargs)
+        yield from map(function, tasks)
+        return
+    with multiprocessing.Pool(workers, initializer=initializer, initargs=initargs) as pool:
+        # Ordered, so rows and first appearances keep the input order
+        yield from pool.imap(function, tasks)
+
+
+def count_users(tasks, workers, counter, capacity):
+    summary = SpaceSaving(capacity) if counter == "spacesaving" else collections.Counter()
+    total = dropped = 0
+    for counts, rows, bad in run_pool(workers, count_chunk, tasks):
+        total += rows
+        dropped += bad
+        if counter == "spacesaving":
+            for user_id, count in counts.items():
+                summary.add(user_id, count)
+        else:
+            summary.update(counts)
+    return summary, total, dropped
+
+
+def top_users(counts, n):
+    # most_common sorts stably, so equal counts stay in first-appearance order
+    return [user_id for user_id, _ in collections.Counter(counts).most_common(n)]
+
+
+def write_outputs(candidate_file, top, sample, outputs):
+    """Third pass over the candidate rows: final interactions, users and items files."""
+    top, sample = set(top), set(sample)
+    users, items = {}, {}
+    sample_users, sample_items = {}, {}
+    kept = sample_rows = 0
+    files = {name: open(path, "w", newline="", encoding="utf-8") for name, path in outputs.items()}
+    try:
+        header = ",".join(HEADER) + "\n"
+        files["interactions"].write(header)
+        if sample:
+            files["sample_interactions"].write(header)
+        for line in candidate_file:
+            user_id, item_id = split_ids(line)
+            if user_id not in top:
+                continue
+            files["interactions"].write(line)
+            kept += 1
+            users.setdefault(user_id, None)
+            items.setdefault(item_id, None)
+            if user_id in sample:
+                files["sample_interactions"].write(line)
+                sample_rows += 1
+                sample_users.setdefault(user_id, None)
+                sample_items.setdefault(item_id, None)
+
+        write_ids(files["users"], "User_ID", users)
+        write_ids(files["items"], "Product_ID", items)
+        if sample:
+            write_ids(files["sample_users"], "User_ID", sample_users)
+            write_ids(files["sample_items"], "Product_ID", sample_items)
+    finally:
+        for f in files.values():
+            f.close()
+    return kept, len(users), len(items), sample_rows
+
+
+def write_ids(f, header, ids):
+    writer = csv.writer(f, lineterminator="\n")
+    writer.writerow([header])
+    writer.writerows([value] for value in ids)
+
+
+def preprocess(raw_path, output_dir=OUTPUT_DIR, top_n=TOP_USERS, sample_n=SAMPLE_USERS, counter="spacesaving",
+               capacity=None, workers=None, chunk_bytes=CHUNK_BYTES, skip_first_row=True, names=None):
+    workers = workers or os.cpu_count() or 1
+    capacity = capacity or top_n * CAPACITY_FACTOR
+    tasks = [(raw_path, start, end, skip_first_row) for start, end in byte_ranges(raw_path, chunk_bytes)]
+    print(f"Preprocessing {raw_path} ({os.path.getsize(raw_path) / 1e6:.1f} MB) "
+          f"in {len(tasks)} chunks on {workers} workers")
+
+    start_time = time.time()
+    summary, total, dropped = count_users(tasks, workers, counter, capacity)
+    if counter == "spacesaving":
+        candidates = summary.keys()
+        floor = summary.min_count()
+    else:
+        candidates = set(top_users(summary, top_n))
+        floor = 0
+    del summary
+    print(f"Pass 1: {total} rows ({dropped} dropped), {len(candidates)} candidate users "
+          f"in {time.time() - start_time:.2f} seconds")
+
+    os.makedirs(output_dir, exist_ok=True)
+    start_time = time.time()
+    exact = collections.Counter()
+    with tempfile.TemporaryFile("w+", encoding="utf-8", newline="", dir=output_dir) as candidate_file:
+        for lines, counts in run_pool(workers, filter_chunk, tasks, set_candidates, (candidates,)):
+            candidate_file.write(lines)
+            exact.update(counts)
+        print(f"Pass 2: {sum(exact.values())} candidate rows in {time.time() - start_time:.2f} seconds")
+
+        top = top_users(exact, top_n)
+        sample = top[:sample_n]
+        if counter == "spacesaving" and len(top) == top_n and exact[top[-1]] <= floor:
+            # An untracked user may have up to `floor` rows and tie with or beat the cut
+            print(f"⚠️  Top-{top_n} not guaranteed exact: the cut is at {exact[top[-1]]} rows but untracked "
+                  f"users may have up to {floor}. Re-run with a larger --capacity or --counter exact.")
+
+        names = names or {}
+        outputs = {
+            "interactions": names.get("interactions", "interactions_filtered.csv"),
+            "users": names.get("users", "users_top10k.csv"),
+            "items": names.get("items", "items_metadata.csv"),
+        }
+        if sample:
+            outputs.update({
+                "sample_interactions": names.get("sample_interactions", "interactions_sample.csv"),
+                "sample_users": names.get("sample_users", "users_sample10.csv"),
+                "sample_items": names.get("sample_items", "sample_items_metadata.csv"),
+            })
+        outputs = {name: os.path.join(output_dir, path) for name, path in outputs.items()}
+
+        start_time = time.time()
+        candidate_file.seek(0)
+        kept, num_users, num_items, sample_rows = write_outputs(candidate_file, top, sample, outputs)
+    print(f"Pass 3: wrote {kept} interactions, {num_users} users, {num_items} items "
+          f"({sample_rows} sample rows) in {time.time() - start_time:.2f} seconds")
+    for path in outputs.values():
+        print(f"  {path}")
+    return outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the processed datasets from the raw reviews CSV")
+    parser.add_argument("raw_path", help="Raw user,item,rating,timestamp CSV (no header)")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--top-users", type=int, default=TOP_USERS, help="Most active users to keep")
+    parser.add_argument("--sample-users", type=int, default=SAMPLE_USERS,
+                        help="Also write the sample files for this many top users (0 to skip)")
+    parser.add_argument("--counter", choices=["spacesaving", "exact"], default="spacesaving",
+                        help="Pass 1 user counts: a bounded SpaceSaving summary, or exact")
+    parser.add_argument("--capacity", type=int, default=None,
+                        help=f"SpaceSaving counters (default {CAPACITY_FACTOR} x --top-users)")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: all cores)")
+    parser.add_argument("--chunk-mb", type=float, default=CHUNK_BYTES / (1024 * 1024))
+    parser.add_argument("--keep-first-row", action="store_true",
+                        help="Keep the first line (the notebook lost it to pandas' header detection)")
+    parser.add_argument("--users-output", default="users_top10k.csv")
+    parser.add_argument("--items-output", default="items_metadata.csv")
+    parser.add_argument("--interactions-output", default="interactions_filtered.csv")
+    args = parser.parse_args()
+
+    preprocess(
+        args.raw_path,
+        output_dir=args.output_dir,
+        top_n=args.top_users,
+        sample_n=min(args.sample_users, args.top_users),
+        counter=args.counter,
+        capacity=args.capacity,
+        workers=args.workers,
+        chunk_bytes=max(1, int(args.chunk_mb * 1024 * 1024)),
+        skip_first_row=not args.keep_first_row,
+        names={
+            "interactions": args.interactions_output,
+            "users": args.users_output,
+            "items": args.items_output,
+        },
+    )
+
+
+if __name__ == "__main__":
+    main()
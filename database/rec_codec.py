@@ -0,0 +1,163 @@
+"""
+Compact binary encoding of a recommendation list for DynamoDB.
+
+The plain encoding stores recommended_items as a List of Maps, which repeats
+the "item_id"/"score" attribute names and a type descriptor for every element
+and stores each score as a Number. The compact encoding packs the whole list
+into a single Binary attribute:
+
+    byte 0      format version (2)
+    byte 1      flags (bit 0: payload is zlib-compressed)
+    payload     uint16 count, float64 min score, float64 max score,
+                count x uint16 quantized score,
+                count x (uint8 length + utf-8 item id)
+
+Scores are quantized linearly between the list's min and max. For ranges up to
+about 6 (ratings are 1-5) the error is below 0.00005, so scores rounded to 4
+decimals, as precompute stores them, decode exactly. The payload is only
+compressed when that makes it smaller. Version 1 stored the bounds as
+float32, which no longer bracket tightly clustered scores; it is still decoded.
+
+`python rec_codec.py` runs a roundtrip check over random and clustered lists.
+
+Standard library only, so the serving side (e.g. the Lambda handler) can
+vendor this file as is. decode_item() reads both encodings.
+"""
+import struct
+import zlib
+
+FORMAT_VERSION = 2
+FLAG_COMPRESSED = 0x01
+SCORE_LEVELS = 65535
+SCORE_DECIMALS = 4
+
+# Attribute names used by the compact encoding
+BINARY_ATTRIBUTE = 'recs'
+VERSION_ATTRIBUTE = 'recs_v'
+
+_HEADER = struct.Struct('>BB')
+_PAYLOAD_HEADERS = {1: struct.Struct('>Hff'), 2: struct.Struct('>Hdd')}
+_PAYLOAD_HEADER = _PAYLOAD_HEADERS[FORMAT_VERSION]
+
+
+def encode_recommendations(recommended_items, compress=True):
+    count = len(recommended_items)
+    scores = [float(rec['score']) for rec in recommended_items]
+    low = min(scores) if scores else 0.0
+    high = max(scores) if scores else 0.0
+    span = high - low
+
+    parts = [_PAYLOAD_HEADER.pack(count, low, high)]
+    parts.append(struct.pack(
+        f'>{count}H',
+        *(min(max(round((score - low) / span * SCORE_LEVELS), 0), SCORE_LEVELS) if span else 0
+          for score in scores)
+    ))
+    for rec in recommended_items:
+        item_id = rec['item_id'].encode('utf-8')
+        if len(item_id) > 255:
+            raise ValueError(f"item_id too long to encode: {rec['item_id']!r}")
+        parts.append(bytes((len(item_id),)))
+        parts.append(item_id)
+    payload = b''.join(parts)
+
+    flags = 0
+    if compress:
+        compressed = zlib.compress(payload, 9)
+        if len(compressed) < len(payload):
+            payload, flags = compressed, FLAG_COMPRESSED
+
+    return _HEADER.pack(FORMAT_VERSION, flags) + payload
+
+
+def decode_recommendations(blob):
+    blob = bytes(getattr(blob, 'value', blob))  # boto3 returns Binary wrappers
+    version, flags = _HEADER.unpack_from(blob)
+    if version not in _PAYLOAD_HEADERS:
+        raise ValueError(f"Unsupported recommendation encoding version: {version}")
+    payload_header = _PAYLOAD_HEADERS[version]
+
+    payload = blob[_HEADER.size:]
+    if flags & FLAG_COMPRESSED:
+        payload = zlib.decompress(payload)
+
+    count, low, high = payload_header.unpack_from(payload)
+    offset = payload_header.size
+    levels = struct.unpack_from(f'>{count}H', payload, offset)
+    offset += 2 * count
+
+    step = (high - low) / SCORE_LEVELS
+    recommended_items = []
+    for level in levels:
+        length = payload[offset]
+        item_id = payload[offset + 1:offset + 1 + length].decode('utf-8')
+        offset += 1 + length
+        recommended_items.append({
+            'item_id': item_id,
+            'score': round(low + level * step, SCORE_DECIMALS)
+        })
+    return recommended_items
+
+
+def encode_item(user_id, recommended_items, compress=True):
+    return {
+        'user_id': user_id,
+        BINARY_ATTRIBUTE: encode_recommendations(recommended_items, compress),
+        VERSION_ATTRIBUTE: FORMAT_VERSION
+    }
+
+
+def decode_item(item):
+    """Recommendation list from a DynamoDB item in either encoding."""
+    if BINARY_ATTRIBUTE in item:
+        return decode_recommendations(item[BINARY_ATTRIBUTE])
+    return [
+        {'item_id': rec['item_id'], 'score': float(rec['score'])}
+        for rec in item.get('recommended_items', [])
+    ]
+
+
+def estimate_item_size(item):
+    """Approximate DynamoDB item size in bytes (attribute names + values)."""
+    return sum(len(name.encode('utf-8')) + _value_size(value) for name, value in item.items())
+
+
+def _value_size(value):
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if hasattr(value, 'value') and isinstance(value.value, (bytes, bytearray)):
+        return len(value.value)
+    if isinstance(value, bool) or value is None:
+        return 1
+    if isinstance(value, dict):
+        # 3 bytes for the map, 1 per element, plus names and values
+        return 3 + sum(1 + len(k.encode('utf-8')) + _value_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return 3 + sum(1 + _value_size(v) for v in value)
+    # Numbers: about one byte per two significant digits, plus one
+    digits = len(str(value).replace('-', '').replace('.', '').lstrip('0')) or 1
+    return (digits + 1) // 2 + 1
+
+
+def _roundtrip_check(lists=20000, seed=42):
+    """Encode and decode random and tightly clustered 4-decimal score lists."""
+    import random
+
+    rng = random.Random(seed)
+    cases = [[4.1234, 4.1235], [3.0], [5.0, 5.0], []]
+    for i in range(lists):
+        low, high = (4.5, 4.6) if i % 2 else (1.0, 5.0)
+        cases.append([round(rng.uniform(low, high), SCORE_DECIMALS) for _ in range(rng.randint(1, 20))])
+
+    for scores in cases:
+        recs = [{'item_id': f'B{index:09d}', 'score': score} for index, score in enumerate(scores)]
+        decoded = decode_recommendations(encode_recommendations(recs))
+        if decoded != recs:
+            raise AssertionError(f"Roundtrip mismatch for {scores}: {decoded}")
+    print(f"{len(cases)} recommendation lists decoded exactly")
+
+
+if __name__ == "__main__":
+    _roundtrip_check()
@@ -6,13 +6,20 @@ CREATE TABLE items (
     item_id VARCHAR(50) PRIMARY KEY
 );
 
+-- Range-partitioned by month of the epoch-seconds timestamp. Monthly partitions
+-- (interactions_pYYYY_MM) are created by database/partitions.py and load_data.py;
+-- anything outside them lands in interactions_default. The primary key has to
+-- include the partition key.
 CREATE TABLE interactions (
-    interaction_id BIGSERIAL PRIMARY KEY,
+    interaction_id BIGSERIAL,
     user_id VARCHAR(50) NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
     item_id VARCHAR(50) NOT NULL REFERENCES items(item_id) ON DELETE CASCADE,
     rating NUMERIC NOT NULL,
-    timestamp BIGINT NOT NULL
-);
+    timestamp BIGINT NOT NULL,
+    PRIMARY KEY (interaction_id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+CREATE TABLE interactions_default PARTITION OF interactions DEFAULT;
 
 CREATE TABLE recommendations (
     user_id VARCHAR(50) PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
@@ -22,4 +29,26 @@ CREATE TABLE recommendations (
 
 CREATE INDEX idx_interactions_user_id ON interactions (user_id);
 CREATE INDEX idx_interactions_item_id ON interactions (item_id);
-CREATE INDEX idx_interactions_timestamp ON interactions (timestamp);
\ No newline at end of file
+-- Rows arrive roughly in time order, so a BRIN summary per block range is enough
+-- inside a partition, at a tiny fraction of a B-tree's size
+CREATE INDEX idx_interactions_timestamp ON interactions USING BRIN (timestamp);
+
+-- Incremental refresh of the API's conditional-GET version map
+CREATE INDEX idx_recommendations_computed_at ON recommendations (computed_at);
+
+-- Popularity fallback for cold users (built by precompute, refreshed by popularity.py)
+CREATE TABLE item_popularity (
+    item_id VARCHAR(50) PRIMARY KEY REFERENCES items(item_id) ON DELETE CASCADE,
+    interaction_count BIGINT NOT NULL,
+    rating_sum NUMERIC NOT NULL,
+    decayed_score DOUBLE PRECISION NOT NULL,
+    decay_reference BIGINT NOT NULL
+);
+
+CREATE TABLE popularity_rankings (
+    ranking VARCHAR(20) PRIMARY KEY,
+    ranked_items JSONB NOT NULL,
+    watermark BIGINT NOT NULL,
+    decay_reference BIGINT NOT NULL,
+    computed_at TIMESTAMP DEFAULT NOW()
+);
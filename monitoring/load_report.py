@@ -0,0 +1,439 @@
+"""
+Load-test report generator.
+
+Reads locust CSV output (<run>_stats.csv, <run>_stats_history.csv,
+<run>_failures.csv) together with the monitor's samples
+(system_metrics.csv, and postgres_metrics.csv if present), lines them up on
+time and writes:
+
+    load_report.md    per-phase table, saturation knee and its likely cause
+    load_report.json  the same numbers, stable key order, for diffing runs
+
+A phase is a stretch of the history with a constant user count lasting at
+least MIN_PHASE_SECONDS (ramp-up rows are dropped). Each run of the usual
+baseline/moderate/heavy/extreme set gives one phase; a stepped run gives one
+per step. Per phase:
+
+- throughput:  mean Requests/s of the history rows
+- P50/P95/P99: approximate. The history rows only carry locust's rolling-window
+               percentiles (about the last 10s each), and percentiles of
+               windows cannot be combined exactly, so the phase figure is their
+               median. It follows the typical window and hides a short spike.
+               The whole-run figures in the endpoint table come from the
+               cumulative <run>_stats.csv rows and are exact.
+- error rate:  failures / requests, from the cumulative totals at the phase edges
+- resources:   mean and max of the monitor samples inside the phase window
+
+The knee is the first phase where adding users stops adding throughput:
+the relative throughput gain is less than KNEE_ELASTICITY x the relative
+user increase, or P95 grows by more than KNEE_LATENCY_GROWTH. It is
+attributed to the resource closest to saturation in that phase.
+
+Standard library only. Usage:
+    python load_report.py                        # every ../results/*_stats_history.csv
+    python load_report.py --runs ../results/baseline ../results/moderate
+    python load_report.py --compare ../results/load_report_previous.json
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import statistics
+from datetime import datetime
+
+RESULTS_DIR = "../results"
+SYSTEM_LOG = "../logs/system_metrics.csv"
+POSTGRES_LOG = "../logs/postgres_metrics.csv"
+OUTPUT_MD = "../results/load_report.md"
+OUTPUT_JSON = "../results/load_report.json"
+
+MIN_PHASE_SECONDS = 10
+KNEE_ELASTICITY = 0.5
+KNEE_LATENCY_GROWTH = 2.0
+SATURATION = 0.85  # utilisation at which a resource counts as saturated
+
+RESOURCE_FIELDS = (
+    'system_cpu_percent', 'system_memory_percent',
+    'postgres_cpu_percent', 'postgres_process_count',
+    'api_cpu_percent', 'api_process_count',
+)
+POSTGRES_FIELDS = (
+    'pg_connections', 'pg_active', 'pg_waiting_lock', 'pg_waiting_other',
+    'pg_buffer_hit_ratio', 'pg_commits_per_sec', 'pg_temp_bytes',
+)
+
+
+#################### --- INPUT ---#################################
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None  # locust writes N/A before the first response
+
+
+def read_csv(path):
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def to_epoch(timestamp):
+    """Monitor rows carry local ISO timestamps; locust history uses epoch seconds."""
+    return datetime.fromisoformat(timestamp).timestamp()
+
+
+def load_samples(path, fields):
+    samples = []
+    for row in read_csv(path):
+        try:
+            t = to_epoch(row['timestamp'])
+        except (KeyError, ValueError):
+            continue
+        samples.append((t, {field: to_float(row.get(field)) for field in fields}))
+    return samples
+
+
+def discover_runs(results_dir):
+    suffix = '_stats_history.csv'
+    paths = sorted(glob.glob(os.path.join(results_dir, f'*{suffix}')))
+    return [path[:-len(suffix)] for path in paths]
+
+
+#################### --- PHASES ---#################################
+def split_phases(history):
+    """Contiguous runs of Aggregated rows with the same non-zero user count."""
+    rows = [row for row in history if row.get('Name') == 'Aggregated']
+    phases = []
+    current = []
+    for row in rows:
+        if current and row['User Count'] != current[-1]['User Count']:
+            phases.append(current)
+            current = []
+        current.append(row)
+    if current:
+        phases.append(current)
+
+    return [
+        phase for phase in phases
+        if int(phase[0]['User Count']) > 0
+        and int(phase[-1]['Timestamp']) - int(phase[0]['Timestamp']) >= MIN_PHASE_SECONDS
+    ]
+
+
+def median_of(rows, column):
+    values = [to_float(row[column]) for row in rows]
+    values = [value for value in values if value is not None]
+    return round(statistics.median(values), 1) if values else None
+
+
+def summarize_resources(samples, start, end):
+    window = [values for t, values in samples if start <= t <= end]
+    summary = {'samples': len(window)}
+    if not window:
+        return summary
+    for field in window[0]:
+        values = [values[field] for values in window if values[field] is not None]
+        if values:
+            summary[field] = {
+                'mean': round(statistics.fmean(values), 2),
+                'max': round(max(values), 2),
+            }
+    return summary
+
+
+def summarize_phase(run, rows, system_samples, postgres_samples):
+    start, end = int(rows[0]['Timestamp']), int(rows[-1]['Timestamp'])
+    requests = int(rows[-1]['Total Request Count']) - int(rows[0]['Total Request Count'])
+    failures = int(rows[-1]['Total Failure Count']) - int(rows[0]['Total Failure Count'])
+    throughput = [to_float(row['Requests/s']) for row in rows]
+    throughput = [value for value in throughput if value is not None]
+
+    phase = {
+        'run': os.path.basename(run),
+        'users': int(rows[0]['User Count']),
+        'start': start,
+        'end': end,
+        'duration_seconds': end - start,
+        'requests': requests,
+        'throughput_rps': round(statistics.fmean(throughput), 2) if throughput else None,
+        'p50_ms': median_of(rows, '50%'),
+        'p95_ms': median_of(rows, '95%'),
+        'p99_ms': median_of(rows, '99%'),
+        'error_rate': round(failures / requests, 4) if requests else 0.0,
+        'resources': summarize_resources(system_samples, start, end),
+    }
+    if postgres_samples:
+        phase['postgres'] = summarize_resources(postgres_samples, start, end)
+    return phase
+
+
+def summarize_endpoints(run):
+    """Whole-run numbers per endpoint from <run>_stats.csv."""
+    endpoints = {}
+    for row in read_csv(f'{run}_stats.csv'):
+        requests = int(row['Request Count'])
+        endpoints[row['Name']] = {
+            'requests': requests,
+            'throughput_rps': round(to_float(row['Requests/s']) or 0.0, 2),
+            'p50_ms': to_float(row['50%']),
+            'p95_ms': to_float(row['95%']),
+            'p99_ms': to_float(row['99%']),
+            'error_rate': round(int(row['Failure Count']) / requests, 4) if requests else 0.0,
+        }
+    return endpoints
+
+
+def top_failures(run, limit=5):
+    rows = read_csv(f'{run}_failures.csv')
+    rows.sort(key=lambda row: int(row.get('Occurrences') or 0), reverse=True)
+    return [
+        {'name': row['Name'], 'error': row['Error'], 'occurrences': int(row['Occurrences'])}
+        for row in rows[:limit]
+    ]
+
+
+#################### --- KNEE ---#################################
+def find_knee(phases):
+    """Index of the first phase past the knee, or None if throughput kept scaling."""
+    for i in range(1, len(phases)):
+        previous, current = phases[i - 1], phases[i]
+        if not previous['throughput_rps'] or previous['users'] == current['users']:
+            continue
+        user_growth = current['users'] / previous['users'] - 1
+        throughput_growth = (current['throughput_rps'] or 0) / previous['throughput_rps'] - 1
+        latency_growth = (
+            current['p95_ms'] / previous['p95_ms']
+            if current['p95_ms'] and previous['p95_ms'] else 1.0
+        )
+        if throughput_growth < KNEE_ELASTICITY * user_growth or latency_growth > KNEE_LATENCY_GROWTH:
+            return i
+    return None
+
+
+def mean_of(summary, field):
+    return summary.get(field, {}).get('mean')
+
+
+def attribute(phase, cpus):
+    """
+    Rank the candidate bottlenecks by utilisation in the phase.
+
+    process cpu_percent is per core (a busy single-threaded process shows
+    ~100), system_cpu_percent is across all cores (0-100):
+    - api:      api CPU per API process, against one core each (GIL-bound)
+    - database: postgres CPU against all cores, plus lock waits
+    - cpu:      whole-host CPU
+    """
+    resources = phase['resources']
+    if not resources.get('samples'):
+        return {'bottleneck': 'unknown', 'reason': 'no monitor samples overlap this phase', 'utilisation': {}}
+
+    api_processes = mean_of(resources, 'api_process_count') or 1
+    utilisation = {
+        'api': (mean_of(resources, 'api_cpu_percent') or 0) / (100 * max(api_processes, 1)),
+        'database': (mean_of(resources, 'postgres_cpu_percent') or 0) / (100 * cpus),
+        'cpu': (mean_of(resources, 'system_cpu_percent') or 0) / 100,
+    }
+    utilisation = {name: round(value, 3) for name, value in utilisation.items()}
+
+    lock_waits = mean_of(phase.get('postgres', {}), 'pg_waiting_lock') or 0
+    hit_ratio = mean_of(phase.get('postgres', {}), 'pg_buffer_hit_ratio')
+    name, value = max(utilisation.items(), key=lambda item: item[1])
+
+    if lock_waits >= 1:
+        return {'bottleneck': 'database', 'utilisation': utilisation,
+                'reason': f'{lock_waits:.1f} sessions waiting on locks on average'}
+    if hit_ratio is not None and hit_ratio < 0.9:
+        return {'bottleneck': 'database', 'utilisation': utilisation,
+                'reason': f'buffer hit ratio {hit_ratio:.2f}: reads are going to disk'}
+    if value >= SATURATION:
+        reasons = {
+            'api': f'API processes at {value:.0%} of a core each',
+            'database': f'postgres using {value:.0%} of all {cpus} cores',
+            'cpu': f'host CPU at {value:.0%}',
+        }
+        return {'bottleneck': name, 'utilisation': utilisation, 'reason': reasons[name]}
+    return {
+        'bottleneck': 'unattributed', 'utilisation': utilisation,
+        'reason': f'no resource above {SATURATION:.0%} (highest: {name} at {value:.0%}); '
+                  f'likely queuing in the server or the load generator',
+    }
+
+
+#################### --- OUTPUT ---#################################
+def build_report(runs, system_log, postgres_log, cpus):
+    system_samples = load_samples(system_log, RESOURCE_FIELDS)
+    postgres_samples = load_samples(postgres_log, POSTGRES_FIELDS)
+
+    phases, run_summaries = [], {}
+    for run in runs:
+        history = read_csv(f'{run}_stats_history.csv')
+        for rows in split_phases(history):
+            phases.append(summarize_phase(run, rows, system_samples, postgres_samples))
+        run_summaries[os.path.basename(run)] = {
+            'endpoints': summarize_endpoints(run),
+            'top_failures': top_failures(run),
+        }
+    phases.sort(key=lambda phase: (phase['users'], phase['start']))
+
+    knee_index = find_knee(phases)
+    knee = None
+    if knee_index is not None:
+        before, after = phases[knee_index - 1], phases[knee_index]
+        knee = {
+            'users_before': before['users'],
+            'users_after': after['users'],
+            'throughput_before_rps': before['throughput_rps'],
+            'throughput_after_rps': after['throughput_rps'],
+            'p95_before_ms': before['p95_ms'],
+            'p95_after_ms': after['p95_ms'],
+            'attribution': attribute(after, cpus),
+        }
+
+    throughputs = [phase['throughput_rps'] for phase in phases if phase['throughput_rps'] is not None]
+    return {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'inputs': {
+            'runs': [os.path.basename(run) for run in runs],
+            'system_samples': len(system_samples),
+            'postgres_samples': len(postgres_samples),
+            'cpus': cpus,
+        },
+        'phases': phases,
+        'peak_throughput_rps': max(throughputs) if throughputs else None,
+        'knee': knee,
+        'runs': run_summaries,
+    }
+
+
+def fmt(value, suffix=''):
+    return 'n/a' if value is None else f'{value:g}{suffix}'
+
+
+def render_markdown(report, previous=None):
+    lines = ['# Load Test Report', '']
+    lines.append(f"Generated {report['generated_at']} from runs: {', '.join(report['inputs']['runs'])}")
+    lines.append(f"Monitor samples: {report['inputs']['system_samples']} system, "
+                 f"{report['inputs']['postgres_samples']} postgres")
+    lines.append('')
+
+    previous_phases = {}
+    if previous:
+        previous_phases = {(p['run'], p['users']): p for p in previous.get('phases', [])}
+
+    lines.append('## Phases')
+    lines.append('')
+    lines.append("Percentiles are approximate: the median of locust's rolling-window "
+                 "percentiles over each phase.")
+    lines.append('')
+    header = '| Run | Users | Duration | Throughput | P50 | P95 | P99 | Error Rate | Host CPU | API CPU | DB CPU |'
+    if previous:
+        header += ' Δ Throughput | Δ P95 |'
+    lines.append(header)
+    lines.append('|' + '---|' * (header.count('|') - 1))
+    for phase in report['phases']:
+        resources = phase['resources']
+        row = (
+            f"| {phase['run']} | {phase['users']} | {phase['duration_seconds']}s "
+            f"| {fmt(phase['throughput_rps'], ' req/s')} | {fmt(phase['p50_ms'], 'ms')} "
+            f"| {fmt(phase['p95_ms'], 'ms')} | {fmt(phase['p99_ms'], 'ms')} "
+            f"| {phase['error_rate']:.2%} | {fmt(mean_of(resources, 'system_cpu_percent'), '%')} "
+            f"| {fmt(mean_of(resources, 'api_cpu_percent'), '%')} "
+            f"| {fmt(mean_of(resources, 'postgres_cpu_percent'), '%')} |"
+        )
+        if previous:
+            old = previous_phases.get((phase['run'], phase['users']))
+            if old and old['throughput_rps'] and phase['throughput_rps'] and old['p95_ms'] and phase['p95_ms']:
+                row += (f" {phase['throughput_rps'] / old['throughput_rps'] - 1:+.1%} "
+                        f"| {phase['p95_ms'] / old['p95_ms'] - 1:+.1%} |")
+            else:
+                row += ' n/a | n/a |'
+        lines.append(row)
+    lines.append('')
+
+    lines.append('## Saturation')
+    lines.append('')
+    lines.append(f"Peak throughput: {fmt(report['peak_throughput_rps'], ' req/s')}")
+    lines.append('')
+    knee = report['knee']
+    if knee is None:
+        lines.append('No knee found: throughput kept scaling with users across the measured phases.')
+    else:
+        attribution = knee['attribution']
+        lines.append(
+            f"Knee between {knee['users_before']} and {knee['users_after']} users: throughput "
+            f"{fmt(knee['throughput_before_rps'])} → {fmt(knee['throughput_after_rps'])} req/s, "
+            f"P95 {fmt(knee['p95_before_ms'], 'ms')} → {fmt(knee['p95_after_ms'], 'ms')}."
+        )
+        lines.append('')
+        lines.append(f"Likely bottleneck: **{attribution['bottleneck']}** ({attribution['reason']}).")
+        if attribution['utilisation']:
+            utilisation = ', '.join(f'{name} {value:.0%}' for name, value in attribution['utilisation'].items())
+            lines.append(f"Utilisation at the knee: {utilisation}.")
+    lines.append('')
+
+    lines.append('## Endpoints (whole run)')
+    lines.append('')
+    lines.append('| Run | Endpoint | Requests | Throughput | P50 | P95 | P99 | Error Rate |')
+    lines.append('|---|---|---|---|---|---|---|---|')
+    for run, summary in report['runs'].items():
+        for name, endpoint in summary['endpoints'].items():
+            lines.append(
+                f"| {run} | {name} | {endpoint['requests']} | {fmt(endpoint['throughput_rps'], ' req/s')} "
+                f"| {fmt(endpoint['p50_ms'], 'ms')} | {fmt(endpoint['p95_ms'], 'ms')} "
+                f"| {fmt(endpoint['p99_ms'], 'ms')} | {endpoint['error_rate']:.2%} |"
+            )
+    failures = [(run, f) for run, summary in report['runs'].items() for f in summary['top_failures']]
+    if failures:
+        lines.append('')
+        lines.append('## Top Failures')
+        lines.append('')
+        for run, failure in failures:
+            lines.append(f"- {run}: {failure['name']} — {failure['error']} ({failure['occurrences']}x)")
+    lines.append('')
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Correlate locust results with monitor samples")
+    parser.add_argument("--runs", nargs="*",
+                        help="Locust --csv prefixes (default: every *_stats_history.csv in ../results)")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    parser.add_argument("--system-log", default=SYSTEM_LOG)
+    parser.add_argument("--postgres-log", default=POSTGRES_LOG)
+    parser.add_argument("--cpus", type=int, default=os.cpu_count() or 1,
+                        help="Cores on the machine under test (for postgres CPU share)")
+    parser.add_argument("--compare", help="Previous load_report.json to show deltas against")
+    parser.add_argument("--output-md", default=OUTPUT_MD)
+    parser.add_argument("--output-json", default=OUTPUT_JSON)
+    args = parser.parse_args()
+
+    runs = args.runs or discover_runs(args.results_dir)
+    if not runs:
+        print(f"No locust *_stats_history.csv files found in {args.results_dir}")
+        return
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+
+    report = build_report(runs, args.system_log, args.postgres_log, args.cpus)
+    with open(args.output_json, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write('\n')
+    with open(args.output_md, 'w') as f:
+        f.write(render_markdown(report, previous))
+
+    print(f"{len(report['phases'])} phases from {len(runs)} runs")
+    if report['knee']:
+        knee = report['knee']
+        print(f"Knee between {knee['users_before']} and {knee['users_after']} users "
+              f"({knee['attribution']['bottleneck']})")
+    print(f"Report written to {args.output_md} and {args.output_json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,23 @@ import csv
 import os
 import signal
 import sys
+import argparse
 from datetime import datetime
 
+from timeseries import (
+    BACKUP_COUNT, FLUSH_EVERY, MAX_FILE_BYTES, QUERY_PORT,
+    BatchedCSVWriter, QueryServer, TimeSeriesStore, flatten_bucket,
+)
+
 # Configuration
-SAMPLE_INTERVAL = 5  # seconds between samples
+SAMPLE_INTERVAL = 5  # seconds between samples (fractions allowed, e.g. 0.25)
+RESCAN_INTERVAL = 10  # seconds between full process-table scans
 LOG_FILE = "../logs/system_metrics.csv"
+ROLLUP_RESOLUTION = 60  # seconds; these rollups are also written to ROLLUP_LOG_FILE
+ROLLUP_LOG_FILE = "../logs/system_metrics_1m.csv"
 POSTGRES_PROCESS_NAME = "postgres"
 PYTHON_PROCESS_NAME = "python"
+API_PROCESS_NAME = "app.py"
 
 # Global flag for graceful shutdown
 running = True
@@ -22,18 +32,21 @@ def signal_handler(sig, frame):
     running = False
 
 
+def matches(info, name):
+    # Check process name, then the command line (for Python scripts)
+    if info['name'] and name.lower() in info['name'].lower():
+        return True
+    if info['cmdline']:
+        return name.lower() in ' '.join(info['cmdline']).lower()
+    return False
+
+
 def find_process_by_name(name):
     pids = []
     for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
         try:
-            # Check process name
-            if name.lower() in proc.info['name'].lower():
+            if matches(proc.info, name):
                 pids.append(proc.info['pid'])
-            # Check command line for Python scripts
-            elif proc.info['cmdline']:
-                cmdline = ' '.join(proc.info['cmdline']).lower()
-                if name.lower() in cmdline:
-                    pids.append(proc.info['pid'])
         except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
             pass
     return pids
@@ -51,7 +64,127 @@ def get_process_stats(pid):
         return None
 
 
+class ProcessTracker:
+    """
+    Keeps psutil.Process handles for each watched group across samples.
+
+    The process table is only walked (once, for all groups) every
+    RESCAN_INTERVAL seconds; in between, the cached handles are reused and
+    dead ones dropped. CPU is measured with cpu_percent(None), i.e. the delta
+    since the previous sample of the same handle, so nothing blocks. A handle's
+    first reading has no previous sample and is reported as 0.
+    """
+
+    def __init__(self, groups, rescan_interval=RESCAN_INTERVAL):
+        self.groups = groups  # {'postgres': 'postgres', 'api': 'app.py'}
+        self.rescan_interval = rescan_interval
+        self.processes = {group: {} for group in groups}
+        self.last_scan = None
+        self.own_pid = os.getpid()
+
+    def rescan(self):
+        found = {group: set() for group in self.groups}
+        for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
+            try:
+                if proc.info['pid'] == self.own_pid:
+                    continue
+                for group, name in self.groups.items():
+                    if matches(proc.info, name):
+                        found[group].add(proc.info['pid'])
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                pass
+
+        for group, pids in found.items():
+            cached = self.processes[group]
+            for pid in list(cached):
+                if pid not in pids:
+                    del cached[pid]
+            for pid in pids - cached.keys():
+                try:
+                    cached[pid] = psutil.Process(pid)
+                    cached[pid].cpu_percent(None)  # prime the CPU delta
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    pass
+        self.last_scan = time.monotonic()
+
+    def maybe_rescan(self):
+        if self.last_scan is None or time.monotonic() - self.last_scan >= self.rescan_interval:
+            self.rescan()
+            return True
+        return False
+
+    def group_stats(self, group):
+        total_cpu = 0
+        total_mem = 0
+        total_mem_mb = 0
+        cached = self.processes[group]
+        for pid, proc in list(cached.items()):
+            try:
+                with proc.oneshot():
+                    total_cpu += proc.cpu_percent(None)
+                    total_mem += proc.memory_percent()
+                    total_mem_mb += proc.memory_info().rss / (1024 * 1024)
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                del cached[pid]
+        return {
+            'cpu_percent': round(total_cpu, 2),
+            'memory_percent': round(total_mem, 2),
+            'memory_mb': round(total_mem_mb, 2),
+            'process_count': len(cached),
+        }
+
+
+class Sampler:
+    """Collects one metrics row per call without blocking; see ProcessTracker."""
+
+    def __init__(self, rescan_interval=RESCAN_INTERVAL):
+        self.tracker = ProcessTracker(
+            {'postgres': POSTGRES_PROCESS_NAME, 'api': API_PROCESS_NAME},
+            rescan_interval
+        )
+        self.own = psutil.Process()
+        # Prime the system-wide and own CPU deltas
+        psutil.cpu_percent(None)
+        self.own.cpu_percent(None)
+        self.tracker.rescan()
+
+    def collect(self):
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        timestamp = datetime.now().isoformat()
+
+        # System-wide metrics
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage('/')
+        net_io = psutil.net_io_counters()
+
+        metrics = {
+            'timestamp': timestamp,
+            'system_cpu_percent': psutil.cpu_percent(None),
+            'system_memory_percent': memory.percent,
+            'system_memory_used_gb': memory.used / (1024 ** 3),
+            'system_memory_available_gb': memory.available / (1024 ** 3),
+            'disk_percent': disk.percent,
+            'network_bytes_sent': net_io.bytes_sent,
+            'network_bytes_recv': net_io.bytes_recv
+        }
+
+        rescanned = self.tracker.maybe_rescan()
+        for group in ('postgres', 'api'):
+            for key, value in self.tracker.group_stats(group).items():
+                metrics[f'{group}_{key}'] = value
+
+        # The monitor's own cost: this sample, and its CPU share since the last one
+        metrics['monitor_sample_ms'] = round((time.perf_counter() - start_wall) * 1000, 3)
+        metrics['monitor_sample_cpu_ms'] = round((time.process_time() - start_cpu) * 1000, 3)
+        metrics['monitor_cpu_percent'] = self.own.cpu_percent(None)
+        metrics['monitor_memory_mb'] = round(self.own.memory_info().rss / (1024 * 1024), 2)
+        metrics['monitor_rescanned'] = int(rescanned)
+        return metrics
+
+
 def collect_metrics():
+    """One-off sample with blocking CPU measurement (kept for ad-hoc use)."""
     timestamp = datetime.now().isoformat()
 
     # System-wide metrics
@@ -71,52 +204,21 @@ def collect_metrics():
         'network_bytes_recv': net_io.bytes_recv
     }
 
-    # PostgreSQL process metrics
-    postgres_pids = find_process_by_name(POSTGRES_PROCESS_NAME)
-    if postgres_pids:
-        # Sum metrics across all postgres processes
-        total_pg_cpu = 0
-        total_pg_mem = 0
-        total_pg_mem_mb = 0
-        for pid in postgres_pids:
-            stats = get_process_stats(pid)
-            if stats:
-                total_pg_cpu += stats['cpu_percent']
-                total_pg_mem += stats['memory_percent']
-                total_pg_mem_mb += stats['memory_mb']
-
-        metrics['postgres_cpu_percent'] = round(total_pg_cpu, 2)
-        metrics['postgres_memory_percent'] = round(total_pg_mem, 2)
-        metrics['postgres_memory_mb'] = round(total_pg_mem_mb, 2)
-        metrics['postgres_process_count'] = len(postgres_pids)
-    else:
-        metrics['postgres_cpu_percent'] = 0
-        metrics['postgres_memory_percent'] = 0
-        metrics['postgres_memory_mb'] = 0
-        metrics['postgres_process_count'] = 0
-
-    # Python API process metrics (look for app.py)
-    python_pids = [pid for pid in find_process_by_name("app.py")]
-    if python_pids:
-        total_py_cpu = 0
-        total_py_mem = 0
-        total_py_mem_mb = 0
-        for pid in python_pids:
+    for group, name in (('postgres', POSTGRES_PROCESS_NAME), ('api', API_PROCESS_NAME)):
+        pids = find_process_by_name(name)
+        total_cpu = 0
+        total_mem = 0
+        total_mem_mb = 0
+        for pid in pids:
             stats = get_process_stats(pid)
             if stats:
-                total_py_cpu += stats['cpu_percent']
-                total_py_mem += stats['memory_percent']
-                total_py_mem_mb += stats['memory_mb']
-
-        metrics['api_cpu_percent'] = round(total_py_cpu, 2)
-        metrics['api_memory_percent'] = round(total_py_mem, 2)
-        metrics['api_memory_mb'] = round(total_py_mem_mb, 2)
-        metrics['api_process_count'] = len(python_pids)
-    else:
-        metrics['api_cpu_percent'] = 0
-        metrics['api_memory_percent'] = 0
-        metrics['api_memory_mb'] = 0
-        metrics['api_process_count'] = 0
+                total_cpu += stats['cpu_percent']
+                total_mem += stats['memory_percent']
+                total_mem_mb += stats['memory_mb']
+        metrics[f'{group}_cpu_percent'] = round(total_cpu, 2)
+        metrics[f'{group}_memory_percent'] = round(total_mem, 2)
+        metrics[f'{group}_memory_mb'] = round(total_mem_mb, 2)
+        metrics[f'{group}_process_count'] = len(pids)
 
     return metrics
 
@@ -147,10 +249,42 @@ def print_metrics(metrics):
     print(f"  Processes:        {metrics['api_process_count']}")
     print(f"  CPU Usage:        {metrics['api_cpu_percent']:.1f}%")
     print(f"  Memory Usage:     {metrics['api_memory_percent']:.1f}% ({metrics['api_memory_mb']:.1f} MB)")
+    if 'monitor_sample_ms' in metrics:
+        print("\nMONITOR OVERHEAD:")
+        print(f"  Sample Time:      {metrics['monitor_sample_ms']:.2f} ms "
+              f"({metrics['monitor_sample_cpu_ms']:.2f} ms CPU)")
+        print(f"  CPU Usage:        {metrics['monitor_cpu_percent']:.1f}% ({metrics['monitor_memory_mb']:.1f} MB)")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sample system, PostgreSQL and API resource usage to CSV")
+    parser.add_argument("--interval", type=float, default=SAMPLE_INTERVAL,
+                        help="Seconds between samples; sub-second values are fine")
+    parser.add_argument("--rescan-interval", type=float, default=RESCAN_INTERVAL,
+                        help="Seconds between process-table scans for new/exited processes")
+    parser.add_argument("--print-every", type=int, default=None,
+                        help="Print every Nth sample to the console (default: about once a second)")
+    parser.add_argument("--log-file", default=LOG_FILE)
+    parser.add_argument("--flush-every", type=int, default=FLUSH_EVERY,
+                        help="Samples buffered before each append to the log file")
+    parser.add_argument("--max-log-mb", type=float, default=MAX_FILE_BYTES / (1024 * 1024),
+                        help=f"Rotate the log file at this size, keeping {BACKUP_COUNT} backups (0 = never)")
+    parser.add_argument("--query-port", type=int, default=QUERY_PORT,
+                        help="Local port for the rollup query interface (0 = disabled)")
+    parser.add_argument("--postgres", action="store_true",
+                        help="Also sample PostgreSQL statistics views (see pg_collector.py)")
+    parser.add_argument("--pg-every", type=int, default=1,
+                        help="With --postgres, sample the statistics views every Nth sample")
+    return parser.parse_args()
 
 
 def main():
-    global running
+    global running, LOG_FILE
+
+    args = parse_args()
+    LOG_FILE = args.log_file
+    interval = args.interval
+    print_every = args.print_every or max(1, round(1 / interval))
 
     # Set up signal handler for Ctrl+C
     signal.signal(signal.SIGINT, signal_handler)
@@ -158,15 +292,15 @@ def main():
     print("=" * 70)
     print("SYSTEM RESOURCE MONITOR")
     print("=" * 70)
-    print(f"Sampling interval: {SAMPLE_INTERVAL} seconds")
-    print(f"Log file: {LOG_FILE}")
+    print(f"Sampling interval: {interval} seconds (process rescan every {args.rescan_interval}s)")
+    print(f"Log file: {LOG_FILE} (1m rollups: {ROLLUP_LOG_FILE})")
     print(f"Monitoring: System, PostgreSQL, API (app.py)")
     print("Press Ctrl+C to stop monitoring")
     print("=" * 70)
 
-    # Check if processes are running
-    postgres_pids = find_process_by_name(POSTGRES_PROCESS_NAME)
-    python_pids = find_process_by_name("app.py")
+    sampler = Sampler(rescan_interval=args.rescan_interval)
+    postgres_pids = sampler.tracker.processes['postgres']
+    python_pids = sampler.tracker.processes['api']
 
     print(f"\nInitial process detection:")
     print(f"  PostgreSQL processes found: {len(postgres_pids)}")
@@ -177,34 +311,75 @@ def main():
     if not python_pids:
         print("\n⚠️  WARNING: No API (app.py) processes detected!")
 
+    store = TimeSeriesStore()
+    max_bytes = int(args.max_log_mb * 1024 * 1024)
+    log = BatchedCSVWriter(LOG_FILE, flush_every=args.flush_every, max_bytes=max_bytes)
+    rollup_log = BatchedCSVWriter(ROLLUP_LOG_FILE, flush_every=1, max_bytes=max_bytes)
+    server = None
+    if args.query_port:
+        server = QueryServer(store, port=args.query_port).start()
+        print(f"\nRollup queries: {server.address}/rollups?resolution=10")
+
+    pg_collector = pg_logs = None
+    if args.postgres:
+        # Only needs psycopg2 when asked for
+        from pg_collector import PostgresCollector, PostgresLogs
+        pg_collector = PostgresCollector()
+        pg_logs = PostgresLogs(flush_every=args.flush_every)
+
     print("\nStarting monitoring...\n")
 
-    is_first_write = True
     sample_count = 0
+    # Samples are scheduled on a fixed grid, so the time spent sampling does
+    # not stretch the interval
+    next_sample = time.monotonic()
 
     while running:
         try:
             # Collect metrics
-            metrics = collect_metrics()
+            metrics = sampler.collect()
 
-            # Write to CSV
-            write_metrics_to_csv(metrics, is_first_write)
-            is_first_write = False
+            # Keep in memory; the CSV is appended in batches
+            closed = store.add(metrics)
+            log.write(metrics)
+            if ROLLUP_RESOLUTION in closed:
+                rollup_log.write(flatten_bucket(closed[ROLLUP_RESOLUTION]))
 
-            # Print to console
-            print_metrics(metrics)
+            # Same timestamp as the system row, so the two CSVs join exactly
+            if pg_collector and sample_count % args.pg_every == 0:
+                try:
+                    pg_logs.write(*pg_collector.collect(metrics['timestamp']))
+                except Exception as e:
+                    print(f"\n❌ Error collecting PostgreSQL metrics: {e}")
 
             sample_count += 1
-            print(f"\nSamples collected: {sample_count} | Next sample in {SAMPLE_INTERVAL}s...")
-
-            # Wait for next sample
-            time.sleep(SAMPLE_INTERVAL)
+            # Print to console
+            if sample_count % print_every == 0:
+                print_metrics(metrics)
+                print(f"\nSamples collected: {sample_count} | Sampling every {interval}s...")
 
         except Exception as e:
             print(f"\n❌ Error collecting metrics: {e}")
-            time.sleep(SAMPLE_INTERVAL)
+
+        # Wait for next sample; skip slots that were missed rather than bursting
+        next_sample += interval
+        now = time.monotonic()
+        if next_sample < now:
+            next_sample = now + interval - (now - next_sample) % interval
+        time.sleep(next_sample - now)
 
     # Graceful shutdown
+    closed = store.close()
+    if ROLLUP_RESOLUTION in closed:
+        rollup_log.write(flatten_bucket(closed[ROLLUP_RESOLUTION]))
+    log.close()
+    rollup_log.close()
+    if pg_collector:
+        pg_logs.close()
+        pg_collector.close()
+    if server:
+        server.stop()
+
     print("\n" + "=" * 70)
     print(f"Monitoring stopped. Collected {sample_count} samples.")
     print(f"Results saved to: {LOG_FILE}")
@@ -212,4 +387,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,389 @@
+"""
+PostgreSQL internals collector.
+
+monitor_system.py only sees postgres as OS processes; this samples the
+statistics views so load-test latency can be attributed to connection churn,
+lock waits or cache misses:
+
+- pg_stat_activity:      connections by state, sessions waiting on locks / other events
+- pg_stat_database:      commits/rollbacks per second, buffer hit ratio, temp bytes, deadlocks
+- pg_stat_user_tables:   scans, tuples and dead tuples for TABLES (+ heap hit ratio)
+- pg_stat_user_indexes:  scans per index on TABLES
+- pg_stat_statements:    top queries by execution time, if the extension is installed
+
+Counters are cumulative in postgres, so rows report per-interval deltas and
+rates. Output, one row per sample in each file:
+
+    ../logs/postgres_metrics.csv     one wide row per sample
+    ../logs/postgres_indexes.csv     one row per index per sample
+    ../logs/postgres_statements.csv  top STATEMENTS_TOP queries per sample
+
+Run it by itself, or let monitor_system.py drive it with --postgres so both
+CSVs share the same timestamp per sample.
+
+Usage:
+    python pg_collector.py --interval 5
+"""
+import argparse
+import os
+import signal
+import time
+from datetime import datetime
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from timeseries import BatchedCSVWriter
+
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "database": os.getenv("DB_NAME", "recommendations"),
+    "user": os.getenv("DB_USER", "s4p"),
+    "password": os.getenv("DB_PASSWORD", ""),
+    "application_name": "pg_collector",
+    "connect_timeout": 5,
+}
+
+SAMPLE_INTERVAL = 5  # seconds
+LOG_FILE = "../logs/postgres_metrics.csv"
+INDEX_LOG_FILE = "../logs/postgres_indexes.csv"
+STATEMENTS_LOG_FILE = "../logs/postgres_statements.csv"
+TABLES = ("interactions", "recommendations")
+STATEMENTS_TOP = 5
+STATEMENTS_EVERY = 6  # pg_stat_statements is larger, read it every Nth sample
+QUERY_TEXT_CHARS = 200
+
+ACTIVITY_SQL = """
+    SELECT COALESCE(state, 'unknown') AS state,
+           COALESCE(wait_event_type, '') AS wait_event_type,
+           COUNT(*) AS sessions
+    FROM pg_stat_activity
+    WHERE datname = current_database()
+      AND backend_type = 'client backend'
+      AND pid <> pg_backend_pid()
+    GROUP BY 1, 2
+"""
+
+DATABASE_SQL = """
+    SELECT numbackends, xact_commit, xact_rollback, blks_read, blks_hit,
+           tup_returned, tup_fetched, tup_inserted, tup_updated, tup_deleted,
+           temp_files, temp_bytes, deadlocks
+    FROM pg_stat_database
+    WHERE datname = current_database()
+"""
+
+# Partitions (e.g. interactions_p2014_03) are summed into their root table and
+# partition indexes into the root's partitioned index; pg_partition_root is NULL
+# for tables that are not partitioned. Needs PostgreSQL 12+.
+TABLES_SQL = """
+    SELECT COALESCE(root.relname, t.relname) AS relname,
+           SUM(t.seq_scan)::BIGINT AS seq_scan, SUM(t.seq_tup_read)::BIGINT AS seq_tup_read,
+           SUM(COALESCE(t.idx_scan, 0))::BIGINT AS idx_scan,
+           SUM(t.n_tup_ins)::BIGINT AS n_tup_ins, SUM(t.n_tup_upd)::BIGINT AS n_tup_upd,
+           SUM(t.n_tup_del)::BIGINT AS n_tup_del,
+           SUM(t.n_live_tup)::BIGINT AS n_live_tup, SUM(t.n_dead_tup)::BIGINT AS n_dead_tup,
+           SUM(COALESCE(io.heap_blks_read, 0))::BIGINT AS heap_blks_read,
+           SUM(COALESCE(io.heap_blks_hit, 0))::BIGINT AS heap_blks_hit
+    FROM pg_stat_user_tables t
+    JOIN pg_statio_user_tables io USING (relid)
+    LEFT JOIN pg_class root ON root.oid = pg_partition_root(t.relid)
+    WHERE COALESCE(root.relname, t.relname) = ANY(%s)
+    GROUP BY 1
+"""
+
+INDEXES_SQL = """
+    SELECT COALESCE(root_table.relname, i.relname) AS relname,
+           COALESCE(root_index.relname, i.indexrelname) AS indexrelname,
+           SUM(i.idx_scan)::BIGINT AS idx_scan, SUM(i.idx_tup_read)::BIGINT AS idx_tup_read,
+           SUM(i.idx_tup_fetch)::BIGINT AS idx_tup_fetch,
+           SUM(COALESCE(io.idx_blks_read, 0))::BIGINT AS idx_blks_read,
+           SUM(COALESCE(io.idx_blks_hit, 0))::BIGINT AS idx_blks_hit
+    FROM pg_stat_user_indexes i
+    JOIN pg_statio_user_indexes io USING (indexrelid)
+    LEFT JOIN pg_class root_table ON root_table.oid = pg_partition_root(i.relid)
+    LEFT JOIN pg_class root_index ON root_index.oid = pg_partition_root(i.indexrelid)
+    WHERE COALESCE(root_table.relname, i.relname) = ANY(%s)
+    GROUP BY 1, 2
+"""
+
+# total_exec_time replaced total_time in PostgreSQL 13
+STATEMENTS_SQL = """
+    SELECT queryid, calls, {total} AS total_ms, rows, query
+    FROM pg_stat_statements
+    WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+    ORDER BY {total} DESC
+    LIMIT 200
+"""
+
+running = True
+
+
+def signal_handler(sig, frame):
+    global running
+    print("\n\nStopping collector gracefully...")
+    running = False
+
+
+def ratio(hit, read):
+    total = hit + read
+    return round(hit / total, 4) if total else None
+
+
+class PostgresCollector:
+    """
+    Samples the statistics views on one autocommit connection and turns the
+    cumulative counters into deltas against the previous sample. Reconnects
+    on the next sample if the connection drops.
+    """
+
+    def __init__(self, tables=TABLES, statements_every=STATEMENTS_EVERY):
+        self.tables = list(tables)
+        self.statements_every = statements_every
+        self.conn = None
+        self.statements_sql = None
+        self.samples = 0
+        self._previous = {}
+        self._previous_time = None
+
+    def connect(self):
+        self.conn = psycopg2.connect(**DB_CONFIG)
+        self.conn.autocommit = True
+        self.statements_sql = self._detect_statements()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def _detect_statements(self):
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'")
+            if cur.fetchone() is None:
+                return None
+            cur.execute("""
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name = 'pg_stat_statements' AND column_name = 'total_exec_time'
+            """)
+            total = "total_exec_time" if cur.fetchone() else "total_time"
+        return STATEMENTS_SQL.format(total=total)
+
+    def _delta(self, key, value):
+        previous = self._previous.get(key)
+        self._previous[key] = value
+        return value - previous if previous is not None and value >= previous else None
+
+    def collect(self, timestamp=None):
+        """
+        One sample. Returns (row, index_rows, statement_rows); the first sample
+        after (re)connecting has empty deltas and rates.
+        """
+        if self.conn is None or self.conn.closed:
+            self._previous = {}
+            self._previous_time = None
+            self.connect()
+
+        timestamp = timestamp or datetime.now().isoformat()
+        now = time.monotonic()
+        elapsed = now - self._previous_time if self._previous_time else None
+        self._previous_time = now
+
+        try:
+            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+                row = {'timestamp': timestamp}
+                row.update(self._activity(cur))
+                row.update(self._database(cur, elapsed))
+                row.update(self._tables(cur))
+                index_rows = self._indexes(cur, timestamp)
+                statement_rows = []
+                if self.statements_sql and self.samples % self.statements_every == 0:
+                    statement_rows = self._statements(cur, timestamp)
+        except psycopg2.Error:
+            self.close()
+            raise
+
+        self.samples += 1
+        return row, index_rows, statement_rows
+
+    def _activity(self, cur):
+        cur.execute(ACTIVITY_SQL)
+        counts = {
+            'pg_connections': 0,
+            'pg_active': 0,
+            'pg_idle': 0,
+            'pg_idle_in_transaction': 0,
+            'pg_waiting_lock': 0,
+            'pg_waiting_other': 0,
+        }
+        for result in cur.fetchall():
+            sessions = result['sessions']
+            counts['pg_connections'] += sessions
+            state = result['state']
+            if state == 'active':
+                counts['pg_active'] += sessions
+                # Idle sessions report wait_event_type Client; only active waits matter
+                if result['wait_event_type'] == 'Lock':
+                    counts['pg_waiting_lock'] += sessions
+                elif result['wait_event_type']:
+                    counts['pg_waiting_other'] += sessions
+            elif state == 'idle':
+                counts['pg_idle'] += sessions
+            elif state.startswith('idle in transaction'):
+                counts['pg_idle_in_transaction'] += sessions
+        return counts
+
+    def _database(self, cur, elapsed):
+        cur.execute(DATABASE_SQL)
+        stats = cur.fetchone()
+        deltas = {key: self._delta(('db', key), stats[key]) for key in stats if key != 'numbackends'}
+
+        def rate(key):
+            if deltas[key] is None or not elapsed:
+                return None
+            return round(deltas[key] / elapsed, 2)
+
+        hit, read = deltas['blks_hit'], deltas['blks_read']
+        return {
+            'pg_backends': stats['numbackends'],
+            'pg_commits_per_sec': rate('xact_commit'),
+            'pg_rollbacks_per_sec': rate('xact_rollback'),
+            'pg_tuples_returned_per_sec': rate('tup_returned'),
+            'pg_tuples_inserted_per_sec': rate('tup_inserted'),
+            # Over the interval, not since stats reset, so a cold cache shows up
+            'pg_buffer_hit_ratio': ratio(hit, read) if hit is not None and read is not None else None,
+            'pg_buffer_hit_ratio_total': ratio(stats['blks_hit'], stats['blks_read']),
+            'pg_blocks_read': read,
+            'pg_temp_files': deltas['temp_files'],
+            'pg_temp_bytes': deltas['temp_bytes'],
+            'pg_deadlocks': deltas['deadlocks'],
+        }
+
+    def _tables(self, cur):
+        cur.execute(TABLES_SQL, (self.tables,))
+        found = {result['relname']: result for result in cur.fetchall()}
+        row = {}
+        for table in self.tables:
+            stats = found.get(table)
+            prefix = f'{table}_'
+            if stats is None:
+                for key in ('seq_scans', 'idx_scans', 'rows_inserted', 'live_rows', 'dead_rows',
+                            'heap_hit_ratio'):
+                    row[prefix + key] = None
+                continue
+            hit = self._delta((table, 'heap_blks_hit'), stats['heap_blks_hit'])
+            read = self._delta((table, 'heap_blks_read'), stats['heap_blks_read'])
+            row[prefix + 'seq_scans'] = self._delta((table, 'seq_scan'), stats['seq_scan'])
+            row[prefix + 'idx_scans'] = self._delta((table, 'idx_scan'), stats['idx_scan'])
+            row[prefix + 'rows_inserted'] = self._delta((table, 'n_tup_ins'), stats['n_tup_ins'])
+            row[prefix + 'live_rows'] = stats['n_live_tup']
+            row[prefix + 'dead_rows'] = stats['n_dead_tup']
+            row[prefix + 'heap_hit_ratio'] = ratio(hit, read) if hit is not None and read is not None else None
+        return row
+
+    def _indexes(self, cur, timestamp):
+        cur.execute(INDEXES_SQL, (self.tables,))
+        rows = []
+        for stats in cur.fetchall():
+            key = ('index', stats['indexrelname'])
+            hit = self._delta(key + ('hit',), stats['idx_blks_hit'])
+            read = self._delta(key + ('read',), stats['idx_blks_read'])
+            rows.append({
+                'timestamp': timestamp,
+                'table': stats['relname'],
+                'index': stats['indexrelname'],
+                'scans': self._delta(key + ('scan',), stats['idx_scan']),
+                'tuples_read': self._delta(key + ('tup_read',), stats['idx_tup_read']),
+                'blocks_read': read,
+                'hit_ratio': ratio(hit, read) if hit is not None and read is not None else None,
+            })
+        return rows
+
+    def _statements(self, cur, timestamp):
+        cur.execute(self.statements_sql)
+        changed = []
+        for stats in cur.fetchall():
+            key = ('statement', stats['queryid'])
+            calls = self._delta(key + ('calls',), stats['calls'])
+            total_ms = self._delta(key + ('total_ms',), float(stats['total_ms']))
+            rows = self._delta(key + ('rows',), stats['rows'])
+            if calls:
+                changed.append((total_ms, calls, rows, stats))
+
+        changed.sort(key=lambda entry: entry[0], reverse=True)
+        return [
+            {
+                'timestamp': timestamp,
+                'rank': rank,
+                'queryid': stats['queryid'],
+                'calls': calls,
+                'total_ms': round(total_ms, 3),
+                'mean_ms': round(total_ms / calls, 3),
+                'rows': rows,
+                'query': ' '.join(stats['query'].split())[:QUERY_TEXT_CHARS],
+            }
+            for rank, (total_ms, calls, rows, stats) in enumerate(changed[:STATEMENTS_TOP], start=1)
+        ]
+
+
+class PostgresLogs:
+    """The collector's three CSV files, written through batched appends."""
+
+    def __init__(self, flush_every=1):
+        self.metrics = BatchedCSVWriter(LOG_FILE, flush_every=flush_every)
+        self.indexes = BatchedCSVWriter(INDEX_LOG_FILE, flush_every=flush_every)
+        self.statements = BatchedCSVWriter(STATEMENTS_LOG_FILE, flush_every=flush_every)
+
+    def write(self, row, index_rows, statement_rows):
+        self.metrics.write(row)
+        for index_row in index_rows:
+            self.indexes.write(index_row)
+        for statement_row in statement_rows:
+            self.statements.write(statement_row)
+
+    def close(self):
+        self.metrics.close()
+        self.indexes.close()
+        self.statements.close()
+
+
+def print_sample(row):
+    print(f"Timestamp: {row['timestamp']}")
+    print(f"  Connections:      {row['pg_connections']} "
+          f"(active {row['pg_active']}, idle {row['pg_idle']}, "
+          f"idle in txn {row['pg_idle_in_transaction']})")
+    print(f"  Waiting:          {row['pg_waiting_lock']} on locks, {row['pg_waiting_other']} on other events")
+    print(f"  Commits/s:        {row['pg_commits_per_sec']}")
+    print(f"  Buffer hit ratio: {row['pg_buffer_hit_ratio']} (since reset {row['pg_buffer_hit_ratio_total']})")
+    print(f"  Temp bytes:       {row['pg_temp_bytes']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sample PostgreSQL statistics views to CSV")
+    parser.add_argument("--interval", type=float, default=SAMPLE_INTERVAL)
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGINT, signal_handler)
+
+    collector = PostgresCollector()
+    logs = PostgresLogs()
+    print(f"Sampling PostgreSQL every {args.interval}s to {LOG_FILE}. Press Ctrl+C to stop.")
+
+    sample_count = 0
+    while running:
+        try:
+            row, index_rows, statement_rows = collector.collect()
+            logs.write(row, index_rows, statement_rows)
+            sample_count += 1
+            print_sample(row)
+            if sample_count == 1 and collector.statements_sql is None:
+                print("  (pg_stat_statements not installed; skipping top queries)")
+        except Exception as e:
+            print(f"\n❌ Error collecting PostgreSQL metrics: {e}")
+        time.sleep(args.interval)
+
+    logs.close()
+    collector.close()
+    print(f"Collector stopped. Collected {sample_count} samples. Results saved to: {LOG_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+Bounded in-memory time series for the monitor.
+
+- raw samples live in a fixed-size ring buffer
+- each sample is also folded into 1s / 10s / 1m rollups (min, max, mean, p95
+  per numeric field), each kept in its own ring buffer
+- rows reach disk through BatchedCSVWriter: appends in batches through one
+  open file handle, rotated at a size limit, so disk use is bounded too
+- QueryServer serves the rollups as JSON on a local port:
+
+    GET /fields
+    GET /latest
+    GET /raw?since=<epoch>&fields=a,b
+    GET /rollups?resolution=10&since=<epoch>&fields=a,b
+
+Memory: RAW_CAPACITY samples plus ROLLUP_CAPACITY buckets per resolution,
+whatever the run length. Standard library only.
+"""
+import csv
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+RAW_CAPACITY = 3600  # samples (an hour at 1s, six minutes at 0.1s)
+RESOLUTIONS = (1, 10, 60)  # seconds
+ROLLUP_CAPACITY = 1440  # buckets per resolution (a day of 1m rollups)
+FLUSH_EVERY = 50  # rows buffered before a write
+MAX_FILE_BYTES = 50 * 1024 * 1024
+BACKUP_COUNT = 3
+QUERY_HOST = "127.0.0.1"
+QUERY_PORT = 9108
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+def summarize(values):
+    ordered = sorted(values)
+    return {
+        'min': ordered[0],
+        'max': ordered[-1],
+        'mean': round(sum(ordered) / len(ordered), 4),
+        'p95': percentile(ordered, 95),
+    }
+
+
+def numeric_fields(metrics):
+    return {
+        key: value for key, value in metrics.items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    }
+
+
+class Rollup:
+    """Downsamples samples into fixed buckets of `resolution` seconds."""
+
+    def __init__(self, resolution, capacity=ROLLUP_CAPACITY):
+        self.resolution = resolution
+        self.buckets = deque(maxlen=capacity)
+        self._index = None
+        self._values = {}
+        self._count = 0
+
+    def add(self, t, values):
+        """Fold one sample in; returns the bucket this sample closed, if any."""
+        closed = None
+        index = int(t // self.resolution)
+        if self._index is not None and index != self._index:
+            closed = self.close()
+        self._index = index
+        self._count += 1
+        for key, value in values.items():
+            self._values.setdefault(key, []).append(value)
+        return closed
+
+    def close(self):
+        """Summarize the open bucket into the ring (also called on shutdown)."""
+        if self._index is None or not self._count:
+            return None
+        start = self._index * self.resolution
+        bucket = {
+            'start': start,
+            'timestamp': datetime.fromtimestamp(start).isoformat(),
+            'count': self._count,
+            'fields': {key: summarize(values) for key, values in self._values.items()},
+        }
+        self.buckets.append(bucket)
+        self._index = None
+        self._values = {}
+        self._count = 0
+        return bucket
+
+
+class TimeSeriesStore:
+    """Ring buffer of raw samples plus one Rollup per resolution; thread-safe."""
+
+    def __init__(self, raw_capacity=RAW_CAPACITY, resolutions=RESOLUTIONS,
+                 rollup_capacity=ROLLUP_CAPACITY):
+        self.raw = deque(maxlen=raw_capacity)
+        self.rollups = {res: Rollup(res, rollup_capacity) for res in resolutions}
+        self.fields = []
+        self._lock = threading.Lock()
+
+    def add(self, metrics, t=None):
+        """Record a sample; returns {resolution: bucket} for rollups it closed."""
+        t = time.time() if t is None else t
+        values = numeric_fields(metrics)
+        with self._lock:
+            if not self.fields:
+                self.fields = list(values)
+            self.raw.append((t, metrics))
+            closed = {}
+            for resolution, rollup in self.rollups.items():
+                bucket = rollup.add(t, values)
+                if bucket:
+                    closed[resolution] = bucket
+        return closed
+
+    def close(self):
+        """Close the open buckets; returns them like add()."""
+        with self._lock:
+            closed = {}
+            for resolution, rollup in self.rollups.items():
+                bucket = rollup.close()
+                if bucket:
+                    closed[resolution] = bucket
+        return closed
+
+    def latest(self):
+        with self._lock:
+            return self.raw[-1][1] if self.raw else None
+
+    def query_raw(self, since=0, fields=None):
+        with self._lock:
+            rows = [metrics for t, metrics in self.raw if t >= since]
+        if fields:
+            rows = [{k: v for k, v in row.items() if k in fields or k == 'timestamp'} for row in rows]
+        return rows
+
+    def query_rollups(self, resolution, since=0, fields=None):
+        if resolution not in self.rollups:
+            raise KeyError(f"no {resolution}s rollup (have {sorted(self.rollups)})")
+        with self._lock:
+            buckets = [b for b in self.rollups[resolution].buckets if b['start'] >= since]
+        if fields:
+            buckets = [
+                dict(b, fields={k: v for k, v in b['fields'].items() if k in fields})
+                for b in buckets
+            ]
+        return buckets
+
+
+class BatchedCSVWriter:
+    """
+    Appends rows through one open handle, writing every `flush_every` rows.
+    When the file passes max_bytes it is rotated to .1, .2, ... (oldest
+    dropped after backup_count), like logging.handlers.RotatingFileHandler.
+    """
+
+    def __init__(self, path, flush_every=FLUSH_EVERY, max_bytes=MAX_FILE_BYTES,
+                 backup_count=BACKUP_COUNT, append=False):
+        self.path = path
+        self.flush_every = flush_every
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.fieldnames = None
+        self.rows = []
+        self.file = None
+        self.writer = None
+        self.rows_written = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if not append and os.path.exists(path):
+            os.remove(path)
+
+    def write(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        if self.file is None:
+            self._open()
+        self.writer.writerows(self.rows)
+        self.file.flush()
+        self.rows_written += len(self.rows)
+        self.rows = []
+        if self.max_bytes and self.file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def close(self):
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _open(self):
+        if self.fieldnames is None:
+            self.fieldnames = list(self.rows[0].keys())
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self.file = open(self.path, 'a', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=self.fieldnames, extrasaction='ignore')
+        if new_file:
+            self.writer.writeheader()
+
+    def _rotate(self):
+        self.file.close()
+        self.file = None
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backup_count:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+def flatten_bucket(bucket):
+    """One CSV row per rollup bucket: timestamp, count, <field>_<stat>..."""
+    row = {'timestamp': bucket['timestamp'], 'count': bucket['count']}
+    for key, stats in bucket['fields'].items():
+        for stat, value in stats.items():
+            row[f'{key}_{stat}'] = value
+    return row
+
+
+class QueryServer:
+    """Local JSON query interface over a TimeSeriesStore, served from a daemon thread."""
+
+    def __init__(self, store, host=QUERY_HOST, port=QUERY_PORT):
+        self.store = store
+        handler = self._make_handler(store)
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def address(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    @staticmethod
+    def _make_handler(store):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = parse_qs(url.query)
+                try:
+                    since = float(params.get('since', ['0'])[0])
+                    fields = set(params['fields'][0].split(',')) if 'fields' in params else None
+                    if url.path == '/fields':
+                        body = {'fields': store.fields, 'resolutions': sorted(store.rollups)}
+                    elif url.path == '/latest':
+                        body = store.latest()
+                    elif url.path == '/raw':
+                        body = store.query_raw(since, fields)
+                    elif url.path == '/rollups':
+                        resolution = int(params.get('resolution', ['10'])[0])
+                        body = store.query_rollups(resolution, since, fields)
+                    else:
+                        self._send(404, {'error': f"unknown path {url.path}"})
+                        return
+                except (KeyError, ValueError) as e:
+                    self._send(400, {'error': str(e)})
+                    return
+                self._send(200, body)
+
+            def _send(self, status, body):
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass  # keep the monitor's console output readable
+
+        return Handler
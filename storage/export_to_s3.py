@@ -17,14 +17,33 @@ Usage:
 5. log progress every 100 users
 6. close the DB connection and print final summary 
 
+By default uploads run on a pool of UPLOAD_WORKERS threads
+(export_recommendations_to_s3_parallel); pass --workers 1 for the original
+one-at-a-time export. Set S3_ENDPOINT_URL to test against a moto server or
+MinIO instead of AWS.
+
+--incremental (export_recommendations_to_s3_incremental) only uploads users
+whose recommendations changed since the last run, using a watermark and a
+per-user content hash manifest stored at <prefix>/_export_state.json;
+--delete-removed also deletes objects of users no longer in the table.
+
 
 """
 #################### --- ENVIRONMENT SET UP ---#################################
 import os 
 import json
+import hashlib
+import queue
+import random
+import sys
+import threading
+import time
+import argparse
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import boto3
+from botocore.config import Config as BotoConfig
+from botocore.exceptions import BotoCoreError, ClientError
 from datetime import datetime, timezone
 
 #################### --- DB CONFIG: mirrors app.py ---#################################
@@ -40,8 +59,34 @@ DB_CONFIG = {
 RESULTS_BUCKET = os.getenv("RESULTS_BUCKET")  
 S3_PREFIX = os.getenv("RESULTS_PREFIX", "recommendations/")  
 
+# Optional S3-compatible endpoint, e.g. a moto server or MinIO for local testing
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+
+#################### --- PARALLEL UPLOAD CONFIG ---#################################
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "16"))
+UPLOAD_MAX_RETRIES = 5
+UPLOAD_BASE_BACKOFF = 0.2  # seconds, doubled per attempt with full jitter
+UPLOAD_MAX_BACKOFF = 10.0
+# Rows buffered between the DB reader and the uploaders
+UPLOAD_QUEUE_SIZE = UPLOAD_WORKERS * 4
+
+"""
+S3 client shared by all upload threads (boto3 clients are thread-safe).
+One pooled HTTP connection per worker; retries are done per object below.
+"""
+def get_s3_client(max_pool_connections=UPLOAD_WORKERS):
+    return boto3.client(
+        "s3",
+        endpoint_url=S3_ENDPOINT_URL,
+        config=BotoConfig(
+            max_pool_connections=max_pool_connections,
+            retries={"total_max_attempts": 1},
+        ),
+    )
+
+
 # Create S3 client with AWS credentials
-s3 = boto3.client("s3")
+s3 = boto3.client("s3", endpoint_url=S3_ENDPOINT_URL)
 
 """
 Open Posetgres connection using DB_CONFIG
@@ -83,6 +128,50 @@ def normalize_recommended_items(raw):
     # Fallback: wrap in a dict for safety
     return {"value": raw}
 
+"""
+Build the per-user JSON document and its S3 key
+"""
+def build_payload(row):
+    computed_at = row["computed_at"]
+    return {
+        "user_id": row["user_id"],
+        "recommendations": normalize_recommended_items(row["recommended_items"]),
+        "computed_at": computed_at.isoformat() if computed_at else None,
+        "exported_at": datetime.now(timezone.utc).isoformat(),
+        "source": "non-cloud-postgres",
+    }
+
+
+def object_key(user_id):
+    return f"{S3_PREFIX.rstrip('/')}/{user_id}.json"
+
+
+"""
+Upload one object, retrying throttling/5xx/network errors with jittered
+exponential backoff. Returns None on success, or the last error message.
+"""
+def upload_with_retry(client, key, body, max_retries=UPLOAD_MAX_RETRIES):
+    for attempt in range(max_retries + 1):
+        try:
+            client.put_object(
+                Bucket=RESULTS_BUCKET,
+                Key=key,
+                Body=body,
+                ContentType="application/json",
+            )
+            return None
+        except (ClientError, BotoCoreError) as e:
+            if isinstance(e, ClientError):
+                status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+                code = e.response.get("Error", {}).get("Code", "")
+                # 4xx other than throttling will not succeed on retry
+                if status < 500 and code not in ("SlowDown", "Throttling", "RequestTimeout"):
+                    return f"{code}: {e}"
+            if attempt == max_retries:
+                return str(e)
+            time.sleep(random.uniform(0, min(UPLOAD_MAX_BACKOFF, UPLOAD_BASE_BACKOFF * 2 ** attempt)))
+
+
 """
 Exporter
 1. check s3 config 
@@ -123,21 +212,8 @@ def export_recommendations_to_s3():
             break
 
         for row in rows:
-            user_id = row["user_id"]
-            raw_recs = row["recommended_items"]
-            computed_at = row["computed_at"]
-
-            recs = normalize_recommended_items(raw_recs)
-
-            payload = {
-                "user_id": user_id,
-                "recommendations": recs,
-                "computed_at": computed_at.isoformat() if computed_at else None,
-                "exported_at": datetime.now(timezone.utc).isoformat(),
-                "source": "non-cloud-postgres",
-            }
-
-            key = f"{S3_PREFIX.rstrip('/')}/{user_id}.json"
+            payload = build_payload(row)
+            key = object_key(row["user_id"])
 
             s3.put_object(
                 Bucket=RESULTS_BUCKET,
@@ -159,6 +235,285 @@ def export_recommendations_to_s3():
     )
 
 
+"""
+Yield rows from a cursor in fetchmany batches of 1000
+"""
+def iter_rows(cur, batch_size=1000):
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+
+"""
+Upload pool shared by the parallel and incremental exporters
+1. start a bounded pool of upload threads sharing one S3 client
+2. the calling thread keeps pulling rows (i.e. fetching from the DB) into a
+   bounded queue while the uploads run, so DB reads overlap with HTTP round trips
+3. each upload retries with backoff; failures (including unexpected errors
+   building or recording a row) are collected, not fatal
+4. on_uploaded(row) runs (under a lock) after each successful upload
+"""
+def upload_rows(client, rows, workers, total, on_uploaded=None):
+    work = queue.Queue(maxsize=max(workers * 4, UPLOAD_QUEUE_SIZE))
+    lock = threading.Lock()
+    report = {"exported": 0, "failed": []}
+    start_time = time.time()
+
+    def uploader():
+        while True:
+            row = work.get()
+            if row is None:
+                return
+            user_id = row["user_id"]
+            # Any error is recorded against the row; a worker that died here
+            # would leave the producer blocked on a full queue
+            try:
+                error = upload_with_retry(client, object_key(user_id), json.dumps(build_payload(row)))
+                with lock:
+                    if error:
+                        report["failed"].append((user_id, error))
+                        continue
+                    report["exported"] += 1
+                    if on_uploaded:
+                        on_uploaded(row)
+                    if report["exported"] % 100 == 0:
+                        rate = report["exported"] / (time.time() - start_time)
+                        print(f"Exported {report['exported']}/{total} users... ({rate:.0f} objects/s)")
+            except Exception as e:
+                with lock:
+                    report["failed"].append((user_id, str(e)))
+
+    threads = [threading.Thread(target=uploader, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        for row in rows:
+            work.put(row)  # blocks while the uploaders are behind
+    finally:
+        for _ in threads:
+            work.put(None)
+        for thread in threads:
+            thread.join()
+
+    elapsed = time.time() - start_time
+    report["elapsed_seconds"] = round(elapsed, 2)
+    report["objects_per_second"] = round(report["exported"] / elapsed, 1) if elapsed else 0.0
+    return report
+
+
+def print_upload_report(report, total):
+    print(
+        f"Done. Exported {report['exported']}/{total} users' recommendations to "
+        f"s3://{RESULTS_BUCKET}/{S3_PREFIX} in {report['elapsed_seconds']:.1f}s "
+        f"({report['objects_per_second']} objects/s)"
+    )
+    if report["failed"]:
+        print(f"{len(report['failed'])} uploads failed after retries:")
+        for user_id, error in report["failed"][:20]:
+            print(f"  {user_id}: {error}")
+
+
+def require_bucket():
+    if not RESULTS_BUCKET:
+        raise RuntimeError(
+            "RESULTS_BUCKET environment variable is not set. "
+            "Set it to your S3 bucket name before running."
+        )
+
+
+"""
+Parallel exporter
+1. check s3 config
+2. connect to DB, count rows
+3. stream every row through the upload pool
+4. print a success/failure report and return it
+"""
+def export_recommendations_to_s3_parallel(workers=UPLOAD_WORKERS, client=None):
+    require_bucket()
+
+    client = client or get_s3_client(max_pool_connections=workers)
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    cur.execute("SELECT COUNT(*) AS count FROM recommendations;")
+    total = cur.fetchone()["count"]
+    print(f"Found {total} rows in 'recommendations' table. Uploading with {workers} threads.")
+
+    cur.close()
+
+    # Server-side cursor, so the table is fetched 1000 rows at a time instead
+    # of being materialized client-side by execute()
+    stream = conn.cursor(name="export_recommendations")
+    stream.itersize = 1000
+    stream.execute("SELECT user_id, recommended_items, computed_at FROM recommendations;")
+    try:
+        report = upload_rows(client, iter_rows(stream), workers, total)
+    finally:
+        stream.close()
+        conn.close()
+
+    print_upload_report(report, total)
+    return report
+
+
+#################### --- INCREMENTAL EXPORT STATE ---#################################
+# Watermark + per-user content hashes, kept next to the exported objects
+STATE_KEY = f"{S3_PREFIX.rstrip('/')}/_export_state.json"
+
+"""
+Hash of what a consumer cares about: the user and their list.
+computed_at/exported_at are left out, so re-running precompute with the same
+result does not trigger a re-upload (the object keeps the computed_at of the
+run that last changed it).
+"""
+def content_hash(row):
+    content = {
+        "user_id": row["user_id"],
+        "recommendations": normalize_recommended_items(row["recommended_items"]),
+    }
+    encoded = json.dumps(content, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:32]
+
+
+def load_export_state(client):
+    try:
+        response = client.get_object(Bucket=RESULTS_BUCKET, Key=STATE_KEY)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            return {"watermark": None, "hashes": {}}
+        raise
+    return json.loads(response["Body"].read())
+
+
+def save_export_state(client, state):
+    client.put_object(
+        Bucket=RESULTS_BUCKET,
+        Key=STATE_KEY,
+        Body=json.dumps(state),
+        ContentType="application/json",
+    )
+
+
+def delete_objects(client, user_ids):
+    """Delete per-user objects in batches of 1000 (the DeleteObjects limit)"""
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), 1000):
+        batch = user_ids[start:start + 1000]
+        client.delete_objects(
+            Bucket=RESULTS_BUCKET,
+            Delete={"Objects": [{"Key": object_key(user_id)} for user_id in batch], "Quiet": True},
+        )
+
+
+"""
+Incremental exporter
+1. load the watermark (max computed_at exported) and content-hash manifest from S3
+2. select only rows with computed_at past the watermark
+3. skip rows whose content hash matches the manifest; upload the rest in parallel
+4. optionally delete objects of users no longer in the table
+5. save the manifest; the watermark only advances if every upload succeeded,
+   so failed users are selected again next run
+"""
+def export_recommendations_to_s3_incremental(workers=UPLOAD_WORKERS, delete_removed=False, client=None):
+    require_bucket()
+
+    client = client or get_s3_client(max_pool_connections=workers)
+    state = load_export_state(client)
+    hashes = state["hashes"]
+    watermark = state["watermark"]
+    print(f"Last export watermark: {watermark or 'none (full export)'}; {len(hashes)} users in manifest.")
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    if watermark:
+        cur.execute(
+            "SELECT COUNT(*) AS count, MAX(computed_at) AS high FROM recommendations WHERE computed_at > %s;",
+            (watermark,)
+        )
+    else:
+        cur.execute("SELECT COUNT(*) AS count, MAX(computed_at) AS high FROM recommendations;")
+    summary = cur.fetchone()
+    changed, high = summary["count"], summary["high"]
+    print(f"{changed} rows changed since the watermark.")
+
+    skipped = 0
+    pending = {}
+
+    def rows_to_upload():
+        nonlocal skipped
+        for row in iter_rows(stream):
+            digest = content_hash(row)
+            if hashes.get(row["user_id"]) == digest:
+                skipped += 1
+                continue
+            pending[row["user_id"]] = digest
+            yield row
+
+    def on_uploaded(row):
+        hashes[row["user_id"]] = pending.pop(row["user_id"])
+
+    stream = conn.cursor(name="export_recommendations_incremental")
+    stream.itersize = 1000
+    if watermark:
+        stream.execute(
+            "SELECT user_id, recommended_items, computed_at FROM recommendations WHERE computed_at > %s;",
+            (watermark,)
+        )
+    else:
+        stream.execute("SELECT user_id, recommended_items, computed_at FROM recommendations;")
+
+    try:
+        report = upload_rows(client, rows_to_upload(), workers, changed, on_uploaded)
+
+        removed = []
+        if delete_removed:
+            cur.execute("SELECT user_id FROM recommendations;")
+            current = {row["user_id"] for row in iter_rows(cur)}
+            removed = [user_id for user_id in hashes if user_id not in current]
+            delete_objects(client, removed)
+            for user_id in removed:
+                del hashes[user_id]
+    finally:
+        stream.close()
+        cur.close()
+        conn.close()
+
+    if not report["failed"] and high is not None:
+        state["watermark"] = high.isoformat()
+    state["updated_at"] = datetime.now(timezone.utc).isoformat()
+    save_export_state(client, state)
+
+    report["skipped_unchanged"] = skipped
+    report["deleted"] = len(removed)
+    print_upload_report(report, changed - skipped)
+    print(f"Skipped {skipped} unchanged users; deleted {len(removed)} removed users.")
+    return report
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export recommendations from Postgres to S3")
+    parser.add_argument("--workers", type=int, default=UPLOAD_WORKERS,
+                        help="Concurrent uploads (1 = original sequential export)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Upload only users whose recommendations changed since the last export")
+    parser.add_argument("--delete-removed", action="store_true",
+                        help="With --incremental, delete objects for users no longer in the table")
+    args = parser.parse_args()
+
     print("Starting export of recommendations to S3...")
-    export_recommendations_to_s3()
\ No newline at end of file
+    report = None
+    if args.incremental:
+        report = export_recommendations_to_s3_incremental(workers=max(1, args.workers),
+                                                          delete_removed=args.delete_removed)
+    elif args.workers <= 1:
+        export_recommendations_to_s3()  # raises on the first failed upload
+    else:
+        report = export_recommendations_to_s3_parallel(workers=args.workers)
+
+    # Non-zero exit so cron or CI notices an export that lost objects
+    if report and report["failed"]:
+        sys.exit(1)
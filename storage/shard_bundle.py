@@ -0,0 +1,278 @@
+"""
+Sharded bundle export of recommendations to S3, plus a reader.
+
+Instead of one tiny JSON object per user, users are hash-partitioned
+(crc32(user_id) % N) into N shard objects. A shard is a sequence of
+independent gzip members, each holding a block of up to BLOCK_RECORDS NDJSON
+lines (the same documents export_to_s3.py writes per user). Concatenated gzip
+members are still one valid gzip stream, so a shard can be read with a single
+GET and a normal gzip decoder.
+
+Users are written to their shard in user_id order, so the manifest only
+needs a sparse index: per shard, the first user_id, byte offset and byte
+length of every block. That is one entry per BLOCK_RECORDS users (about
+300 entries, ~15 KB, for 10k users) instead of one per user:
+- one user:   load the manifest once, bisect the shard's block index, then
+              one ranged GET of a few KB and gunzip one block
+- everything: N large sequential GETs, one per shard
+
+Layout under S3_PREFIX:
+    bundles/<export_id>/shard-0000-of-0016.ndjson.gz
+    bundles/<export_id>/manifest.json
+    bundles/LATEST        (key of the newest manifest)
+
+Usage:
+    python shard_bundle.py export --shards 16
+    python shard_bundle.py get <user_id>
+    python shard_bundle.py scan
+"""
+#################### --- ENVIRONMENT SET UP ---#################################
+import argparse
+import bisect
+import gzip
+import json
+import os
+import tempfile
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from export_to_s3 import (
+    RESULTS_BUCKET,
+    S3_PREFIX,
+    build_payload,
+    get_db_connection,
+    get_s3_client,
+)
+
+#################### --- BUNDLE CONFIG ---#################################
+NUM_SHARDS = int(os.getenv("BUNDLE_SHARDS", "16"))
+# Users per gzip member; bigger blocks compress better, smaller ones make ranged GETs cheaper
+BLOCK_RECORDS = 32
+FORMAT = "ndjson-gzip-blocks/2"
+
+
+def bundle_root():
+    return f"{S3_PREFIX.rstrip('/')}/bundles"
+
+
+def shard_for(user_id, num_shards):
+    """Stable across processes and Python versions, unlike hash()."""
+    return zlib.crc32(user_id.encode("utf-8")) % num_shards
+
+
+"""
+Writes one shard to a local temp file, a gzip member per block, recording
+each block's first user, start and length (users must arrive in user_id order)
+"""
+class ShardWriter:
+    def __init__(self, index, num_shards, directory):
+        self.index = index
+        self.key = f"shard-{index:04d}-of-{num_shards:04d}.ndjson.gz"
+        self.path = os.path.join(directory, self.key)
+        self.file = open(self.path, "wb")
+        self.offset = 0
+        self.records = 0
+        self.block = []
+        self.block_users = []
+        self.blocks = []  # [first user_id, offset, length]
+
+    def add(self, user_id, document):
+        self.block.append(json.dumps(document))
+        self.block_users.append(user_id)
+        if len(self.block) >= BLOCK_RECORDS:
+            self.flush_block()
+
+    def flush_block(self):
+        if not self.block:
+            return
+        member = gzip.compress(("\n".join(self.block) + "\n").encode("utf-8"), mtime=0)
+        self.file.write(member)
+        self.blocks.append([self.block_users[0], self.offset, len(member)])
+        self.offset += len(member)
+        self.records += len(self.block)
+        self.block, self.block_users = [], []
+
+    def close(self):
+        self.flush_block()
+        self.file.close()
+
+
+"""
+Bundle exporter
+1. stream rows from Postgres in user_id order (server-side batches of 1000)
+2. route each user to its shard's temp file
+3. upload shards in parallel (managed multipart uploads)
+4. upload the manifest, then move the LATEST pointer to it
+"""
+def export_bundles(num_shards=NUM_SHARDS, client=None):
+    if not RESULTS_BUCKET:
+        raise RuntimeError(
+            "RESULTS_BUCKET environment variable is not set. "
+            "Set it to your S3 bucket name before running."
+        )
+
+    client = client or get_s3_client(max_pool_connections=num_shards)
+    export_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    export_root = f"{bundle_root()}/{export_id}"
+    start_time = time.time()
+
+    conn = get_db_connection()
+    # Named (server-side) cursor: without a name execute() would pull the whole table at once
+    cur = conn.cursor(name="export_bundles")
+    cur.itersize = 1000
+    # Byte order ("C"), which is also how Python compares the ids when bisecting
+    cur.execute('SELECT user_id, recommended_items, computed_at FROM recommendations ORDER BY user_id COLLATE "C";')
+
+    with tempfile.TemporaryDirectory() as directory:
+        shards = [ShardWriter(i, num_shards, directory) for i in range(num_shards)]
+        exported = 0
+        while True:
+            rows = cur.fetchmany(1000)
+            if not rows:
+                break
+            for row in rows:
+                user_id = row["user_id"]
+                shards[shard_for(user_id, num_shards)].add(user_id, build_payload(row))
+                exported += 1
+        cur.close()
+        conn.close()
+
+        for shard in shards:
+            shard.close()
+
+        def upload(shard):
+            client.upload_file(
+                shard.path, RESULTS_BUCKET, f"{export_root}/{shard.key}",
+                ExtraArgs={"ContentType": "application/gzip"},
+            )
+
+        with ThreadPoolExecutor(max_workers=num_shards) as pool:
+            list(pool.map(upload, shards))
+
+        manifest = {
+            "format": FORMAT,
+            "export_id": export_id,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "partitioning": {"hash": "crc32", "num_shards": num_shards},
+            "block_records": BLOCK_RECORDS,
+            "shards": [
+                {
+                    "key": f"{export_root}/{shard.key}",
+                    "bytes": shard.offset,
+                    "records": shard.records,
+                    "blocks": shard.blocks,
+                }
+                for shard in shards
+            ],
+        }
+
+    manifest_key = f"{export_root}/manifest.json"
+    client.put_object(
+        Bucket=RESULTS_BUCKET, Key=manifest_key,
+        Body=json.dumps(manifest), ContentType="application/json",
+    )
+    # Written last, so readers never see a manifest whose shards are still uploading
+    client.put_object(Bucket=RESULTS_BUCKET, Key=f"{bundle_root()}/LATEST", Body=manifest_key)
+
+    total_bytes = sum(shard["bytes"] for shard in manifest["shards"])
+    print(
+        f"Done. Exported {exported} users into {num_shards} shards "
+        f"({total_bytes / 1024:.1f} KiB) at s3://{RESULTS_BUCKET}/{export_root}/ "
+        f"in {time.time() - start_time:.1f}s"
+    )
+    return manifest_key
+
+
+#################### --- READER ---#################################
+def load_manifest(client=None, manifest_key=None):
+    """Manifest for manifest_key, or for the newest export if none is given"""
+    client = client or get_s3_client()
+    if manifest_key is None:
+        latest = client.get_object(Bucket=RESULTS_BUCKET, Key=f"{bundle_root()}/LATEST")
+        manifest_key = latest["Body"].read().decode("utf-8").strip()
+    response = client.get_object(Bucket=RESULTS_BUCKET, Key=manifest_key)
+    return json.loads(response["Body"].read())
+
+
+"""
+One user with one ranged GET: find the block that would hold the user in
+its shard's index, fetch it, gunzip it, pick the line.
+Returns None for users not in the export.
+"""
+def get_user(manifest, user_id, client=None):
+    shard = shard_for(user_id, manifest["partitioning"]["num_shards"])
+    blocks = manifest["shards"][shard]["blocks"]
+    position = bisect.bisect_right([block[0] for block in blocks], user_id) - 1
+    if position < 0:
+        return None
+
+    client = client or get_s3_client()
+    _, offset, length = blocks[position]
+    response = client.get_object(
+        Bucket=RESULTS_BUCKET,
+        Key=manifest["shards"][shard]["key"],
+        Range=f"bytes={offset}-{offset + length - 1}",
+    )
+    block = gzip.decompress(response["Body"].read()).decode("utf-8")
+    for line in block.splitlines():
+        document = json.loads(line)
+        if document["user_id"] == user_id:
+            return document
+    return None
+
+
+"""
+Every user, shard by shard: one streaming GET per shard
+"""
+def iter_shard(manifest, shard, client=None):
+    client = client or get_s3_client()
+    response = client.get_object(Bucket=RESULTS_BUCKET, Key=manifest["shards"][shard]["key"])
+    with gzip.GzipFile(fileobj=response["Body"]) as lines:
+        for line in lines:
+            yield json.loads(line)
+
+
+def iter_all(manifest, client=None):
+    client = client or get_s3_client()
+    for shard in range(len(manifest["shards"])):
+        yield from iter_shard(manifest, shard, client)
+
+
+def load_all(manifest, workers=None, client=None):
+    """Every user as {user_id: document}, reading the shards concurrently"""
+    num_shards = len(manifest["shards"])
+    client = client or get_s3_client(max_pool_connections=num_shards)
+
+    def read(shard):
+        return [(doc["user_id"], doc) for doc in iter_shard(manifest, shard, client)]
+
+    documents = {}
+    with ThreadPoolExecutor(max_workers=workers or num_shards) as pool:
+        for pairs in pool.map(read, range(num_shards)):
+            documents.update(pairs)
+    return documents
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sharded NDJSON bundle export/reader for S3")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="Export Postgres recommendations as sharded bundles")
+    export_parser.add_argument("--shards", type=int, default=NUM_SHARDS)
+    get_parser = commands.add_parser("get", help="Fetch one user with a ranged GET")
+    get_parser.add_argument("user_id")
+    get_parser.add_argument("--manifest", help="Manifest key (default: LATEST)")
+    scan_parser = commands.add_parser("scan", help="Read every shard and count users")
+    scan_parser.add_argument("--manifest", help="Manifest key (default: LATEST)")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_bundles(num_shards=args.shards)
+    elif args.command == "get":
+        document = get_user(load_manifest(manifest_key=args.manifest), args.user_id)
+        print(json.dumps(document, indent=2) if document else f"User {args.user_id} not in export")
+    else:
+        start_time = time.time()
+        documents = load_all(load_manifest(manifest_key=args.manifest))
+        print(f"Read {len(documents)} users in {time.time() - start_time:.1f}s")
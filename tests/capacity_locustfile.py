@@ -0,0 +1,214 @@
+"""
+Capacity finder: one run, one number.
+
+CapacityShape steps the user count up (START_USERS, +STEP_USERS, ...). It
+holds each step until P99 over consecutive CHECK_INTERVAL windows agrees to
+within STABLE_TOLERANCE (at least MIN_HOLD, at most MAX_HOLD seconds). It
+stops at the first step whose P99 exceeds the SLO or whose error rate exceeds
+MAX_ERROR_RATE. The result is the maximum sustainable throughput: the best
+throughput of any step that met the SLO. The step-by-step curve is written
+next to locust's own CSVs:
+
+    <csv prefix>_capacity_curve.csv     one row per step
+    <csv prefix>_capacity.json          summary (default prefix: ../results/capacity)
+
+    locust -f capacity_locustfile.py --host=http://localhost:8000 --headless \
+        --csv ../results/capacity --slo-p99-ms 500 --step-users 20
+
+Runs RecommendationUser from locustfile.py, so --user-distribution and the
+other traffic options apply. Latencies come from the shared histograms in
+latency_histogram.py, so distributed runs (--master/--worker) work too.
+"""
+import csv
+import json
+import os
+
+from locust import LoadTestShape, events
+
+from locustfile import LATENCY, RecommendationUser  # noqa: F401  (the user class under test)
+from latency_histogram import AGGREGATED
+
+SLO_P99_MS = 500.0
+MAX_ERROR_RATE = 0.01
+START_USERS = 10
+STEP_USERS = 10
+MAX_USERS = 2000
+SPAWN_RATE = 10  # users/s while stepping
+SETTLE_SECONDS = 5  # ignored after spawning finishes, while connections warm up
+CHECK_INTERVAL = 10  # seconds per measurement window
+MIN_HOLD = 30
+MAX_HOLD = 120
+STABLE_TOLERANCE = 0.10  # consecutive window P99s within 10%
+DEFAULT_PREFIX = "../results/capacity"
+
+
+@events.init_command_line_parser.add_listener
+def on_parser_init(parser):
+    parser.add_argument("--slo-p99-ms", type=float, default=SLO_P99_MS, help="Stop when step P99 exceeds this")
+    parser.add_argument("--max-error-rate", type=float, default=MAX_ERROR_RATE,
+                        help="Stop when a step's error rate exceeds this fraction")
+    parser.add_argument("--start-users", type=int, default=START_USERS)
+    parser.add_argument("--step-users", type=int, default=STEP_USERS)
+    parser.add_argument("--max-users", type=int, default=MAX_USERS)
+    parser.add_argument("--step-spawn-rate", type=float, default=SPAWN_RATE)
+    parser.add_argument("--min-hold", type=float, default=MIN_HOLD, help="Minimum seconds per step")
+    parser.add_argument("--max-hold", type=float, default=MAX_HOLD, help="Maximum seconds per step")
+
+
+def summarize_window(window, seconds):
+    aggregated = window.histograms.get(AGGREGATED)
+    if aggregated is None:
+        return None
+    total = aggregated.count + aggregated.errors
+    return {
+        "seconds": seconds,
+        "requests": total,
+        "throughput_rps": round(total / seconds, 2) if seconds else 0.0,
+        "error_rate": round(aggregated.errors / total, 4) if total else 0.0,
+        "p50_ms": round(aggregated.percentile(50), 2) if aggregated.count else None,
+        "p95_ms": round(aggregated.percentile(95), 2) if aggregated.count else None,
+        "p99_ms": round(aggregated.percentile(99), 2) if aggregated.count else None,
+    }
+
+
+class CapacityShape(LoadTestShape):
+    def __init__(self):
+        super().__init__()
+        self.users = None
+        self.step_start = 0.0
+        self.ramp_seconds = 0.0
+        self.measure_start = 0.0
+        self.window = None
+        self.window_start = 0.0
+        self.step_window = None
+        self.previous_p99 = None
+        self.stable_windows = 0
+        self.curve = []
+        self.stop_reason = None
+        self.finished = False
+
+    def setting(self, name, default):
+        options = self.runner.environment.parsed_options if self.runner else None
+        return getattr(options, name, default) if options is not None else default
+
+    def tick(self):
+        if self.finished:
+            return None
+        run_time = self.get_run_time()
+        spawn_rate = self.setting("step_spawn_rate", SPAWN_RATE)
+
+        if self.users is None:
+            self.start_step(self.setting("start_users", START_USERS), run_time)
+            return self.users, spawn_rate
+
+        elapsed = run_time - self.step_start
+        if self.window is None:
+            # Ramp to the new count, then let it settle before measuring
+            if elapsed >= self.ramp_seconds + SETTLE_SECONDS:
+                self.open_windows(run_time)
+            return self.users, spawn_rate
+
+        if run_time - self.window_start < CHECK_INTERVAL:
+            return self.users, spawn_rate
+
+        window = summarize_window(self.window, run_time - self.window_start)
+        LATENCY.close_window(self.window)
+        self.window = LATENCY.open_window()
+        self.window_start = run_time
+        # Errors first: a window where every request failed has no P99 at all
+        if window is not None and window["error_rate"] > self.setting("max_error_rate", MAX_ERROR_RATE):
+            return self.finish_step(run_time, f"error rate {window['error_rate']:.2%} over the limit", passed=False)
+
+        if window is not None and window["p99_ms"] is not None:
+            if window["p99_ms"] > self.setting("slo_p99_ms", SLO_P99_MS):
+                return self.finish_step(run_time, f"P99 {window['p99_ms']}ms over the SLO", passed=False)
+            if self.previous_p99 and abs(window["p99_ms"] / self.previous_p99 - 1) <= STABLE_TOLERANCE:
+                self.stable_windows += 1
+            else:
+                self.stable_windows = 0
+            self.previous_p99 = window["p99_ms"]
+
+        stable = self.stable_windows >= 1 and elapsed >= self.setting("min_hold", MIN_HOLD)
+        if stable or elapsed >= self.setting("max_hold", MAX_HOLD):
+            self.finish_step(run_time, None, passed=True, stable=stable)
+            if self.finished:
+                return None
+            self.start_step(self.users + self.setting("step_users", STEP_USERS), run_time)
+        return self.users, spawn_rate
+
+    def start_step(self, users, run_time):
+        previous = self.users or 0
+        self.users = users
+        self.step_start = run_time
+        self.ramp_seconds = abs(users - previous) / max(self.setting("step_spawn_rate", SPAWN_RATE), 0.1)
+        self.previous_p99 = None
+        self.stable_windows = 0
+        self.window = None
+        print(f"\n[capacity] step {len(self.curve) + 1}: {users} users")
+
+    def open_windows(self, run_time):
+        self.window = LATENCY.open_window()
+        self.step_window = LATENCY.open_window()
+        self.window_start = run_time
+        self.measure_start = run_time
+
+    def finish_step(self, run_time, reason, passed, stable=False):
+        step = summarize_window(self.step_window, run_time - self.measure_start) or {}
+        LATENCY.close_window(self.window)
+        LATENCY.close_window(self.step_window)
+        self.window = self.step_window = None
+        step.update({"users": self.users, "passed": passed, "stable": stable})
+        self.curve.append(step)
+        print(f"[capacity] {self.users} users: {step.get('throughput_rps')} req/s, "
+              f"P99 {step.get('p99_ms')}ms, errors {step.get('error_rate', 0):.2%}"
+              f"{'' if passed else ' -> ' + reason}")
+
+        if not passed:
+            self.stop_reason = reason
+            self.finished = True
+        elif self.users + self.setting("step_users", STEP_USERS) > self.setting("max_users", MAX_USERS):
+            self.stop_reason = "reached --max-users without breaching the SLO"
+            self.finished = True
+        if self.finished:
+            self.write_report()
+            return None
+
+    def write_report(self):
+        passed = [step for step in self.curve if step["passed"] and step.get("throughput_rps") is not None]
+        best = max(passed, key=lambda step: step["throughput_rps"]) if passed else None
+        summary = {
+            "slo_p99_ms": self.setting("slo_p99_ms", SLO_P99_MS),
+            "max_error_rate": self.setting("max_error_rate", MAX_ERROR_RATE),
+            "max_sustainable_throughput_rps": best["throughput_rps"] if best else None,
+            "users_at_max_throughput": best["users"] if best else None,
+            "stop_reason": self.stop_reason,
+            "steps": self.curve,
+        }
+
+        prefix = self.setting("csv_prefix", None) or DEFAULT_PREFIX
+        directory = os.path.dirname(prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fields = ["users", "throughput_rps", "p50_ms", "p95_ms", "p99_ms", "error_rate",
+                  "requests", "seconds", "stable", "passed"]
+        with open(f"{prefix}_capacity_curve.csv", "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(self.curve)
+        with open(f"{prefix}_capacity.json", "w") as f:
+            json.dump(summary, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+        print("\nCAPACITY SUMMARY")
+        print(f"  {'Users':>8}{'Req/s':>10}{'P50':>10}{'P95':>10}{'P99':>10}{'Errors':>9}")
+        for step in self.curve:
+            print(f"  {step['users']:>8}{step.get('throughput_rps') or 0:>10.1f}{step.get('p50_ms') or 0:>10.1f}"
+                  f"{step.get('p95_ms') or 0:>10.1f}{step.get('p99_ms') or 0:>10.1f}"
+                  f"{step.get('error_rate', 0):>9.2%}{'' if step['passed'] else '  x'}")
+        if best:
+            print(f"\nMax sustainable throughput: {best['throughput_rps']} req/s at {best['users']} users "
+                  f"(P99 SLO {summary['slo_p99_ms']}ms)")
+        else:
+            print("\nNo step met the SLO")
+        print(f"Stopped: {self.stop_reason}")
+        print(f"Curve written to {prefix}_capacity_curve.csv and {prefix}_capacity.json")
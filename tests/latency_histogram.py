@@ -0,0 +1,285 @@
+"""
+Fixed-memory latency histograms for the locustfiles.
+
+LatencyHistogram buckets response times logarithmically: bucket i covers
+[GROWTH^i, GROWTH^(i+1)) microseconds, so every recorded value is known to
+within RELATIVE_ERROR (0.5%) and 1µs..1h fits in about 2,200 buckets however
+many requests are recorded. Histograms merge by adding bucket counts, which
+is what makes them work under distributed locust:
+
+- every process records into LatencyRecorder (one histogram per endpoint)
+- workers send what they recorded since their last report with
+  report_to_master and start over; the master merges it in worker_report
+- the master (or a local runner) writes an interval snapshot every
+  SNAPSHOT_INTERVAL seconds and prints P50/P95/P99/P99.9 at test stop
+
+Usage in a locustfile:
+
+    from latency_histogram import LatencyRecorder
+    LatencyRecorder().register(events)
+"""
+import csv
+import math
+import os
+import time
+
+import gevent
+from locust.runners import WorkerRunner
+
+RELATIVE_ERROR = 0.005
+GROWTH = 1 + 2 * RELATIVE_ERROR
+LOG_GROWTH = math.log(GROWTH)
+PERCENTILES = (50, 95, 99, 99.9)
+SNAPSHOT_INTERVAL = 10  # seconds
+LATENCY_LOG = "../results/latency_intervals.csv"
+MESSAGE_KEY = "latency_histograms"
+AGGREGATED = "Aggregated"
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.errors = 0
+        self.total_us = 0
+        self.min_us = None
+        self.max_us = None
+
+    def record(self, response_time_ms):
+        value = max(1, int(response_time_ms * 1000))
+        index = int(math.log(value) / LOG_GROWTH)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total_us += value
+        self.min_us = value if self.min_us is None else min(self.min_us, value)
+        self.max_us = value if self.max_us is None else max(self.max_us, value)
+
+    def merge(self, other):
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        self.errors += other.errors
+        self.total_us += other.total_us
+        if other.min_us is not None:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+        if other.max_us is not None:
+            self.max_us = other.max_us if self.max_us is None else max(self.max_us, other.max_us)
+
+    def percentile(self, pct):
+        """Value in ms at the given percentile (bucket midpoint, clamped to min/max)."""
+        if not self.count:
+            return None
+        target = max(1, math.ceil(pct / 100 * self.count))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= target:
+                midpoint = GROWTH ** (index + 0.5)
+                return min(max(midpoint, self.min_us), self.max_us) / 1000
+        return self.max_us / 1000
+
+    def mean(self):
+        return self.total_us / self.count / 1000 if self.count else None
+
+    def to_dict(self):
+        # Lists of pairs rather than an int-keyed dict, for locust's msgpack messages
+        return {
+            "buckets": sorted(self.buckets.items()),
+            "count": self.count,
+            "errors": self.errors,
+            "total_us": self.total_us,
+            "min_us": self.min_us,
+            "max_us": self.max_us,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        histogram.buckets = {int(index): count for index, count in data["buckets"]}
+        histogram.count = data["count"]
+        histogram.errors = data["errors"]
+        histogram.total_us = data["total_us"]
+        histogram.min_us = data["min_us"]
+        histogram.max_us = data["max_us"]
+        return histogram
+
+
+class HistogramSet:
+    """One LatencyHistogram per endpoint, plus an Aggregated one."""
+
+    def __init__(self):
+        self.histograms = {}
+
+    def get(self, name):
+        if name not in self.histograms:
+            self.histograms[name] = LatencyHistogram()
+        return self.histograms[name]
+
+    def record(self, name, response_time_ms, failed=False):
+        for key in (name, AGGREGATED):
+            if failed:
+                self.get(key).errors += 1
+            else:
+                self.get(key).record(response_time_ms)
+
+    def merge(self, other):
+        for name, histogram in other.histograms.items():
+            self.get(name).merge(histogram)
+
+    def to_dict(self):
+        return {name: histogram.to_dict() for name, histogram in self.histograms.items()}
+
+    @classmethod
+    def from_dict(cls, data):
+        histograms = cls()
+        for name, histogram in data.items():
+            histograms.histograms[name] = LatencyHistogram.from_dict(histogram)
+        return histograms
+
+    def rows(self):
+        """Endpoints first (alphabetically), Aggregated last, like locust's own stats."""
+        names = sorted(name for name in self.histograms if name != AGGREGATED)
+        if AGGREGATED in self.histograms:
+            names.append(AGGREGATED)
+        return [(name, self.histograms[name]) for name in names]
+
+
+class LatencyRecorder:
+    """
+    Wires HistogramSets into locust's events. `total` holds the whole run,
+    `interval` what arrived since the last snapshot and, on workers,
+    `pending` what has not been sent to the master yet. open_window() adds
+    another set that receives everything from then on (used by load shapes).
+    """
+
+    def __init__(self, snapshot_interval=SNAPSHOT_INTERVAL, log_path=LATENCY_LOG):
+        self.snapshot_interval = snapshot_interval
+        self.log_path = log_path
+        self.total = HistogramSet()
+        self.interval = HistogramSet()
+        self.pending = HistogramSet()
+        self.is_worker = False
+        self.windows = []
+        self._snapshots = None
+
+    def register(self, events):
+        events.init.add_listener(self.on_init)
+        events.request.add_listener(self.on_request)
+        events.report_to_master.add_listener(self.on_report_to_master)
+        events.worker_report.add_listener(self.on_worker_report)
+        events.test_start.add_listener(self.on_test_start)
+        events.test_stop.add_listener(self.on_test_stop)
+
+    def on_init(self, environment, **kwargs):
+        self.is_worker = isinstance(environment.runner, WorkerRunner)
+        prefix = getattr(environment.parsed_options, "csv_prefix", None) if environment.parsed_options else None
+        if prefix:
+            self.log_path = f"{prefix}_latency_intervals.csv"
+
+    def on_request(self, request_type, name, response_time, response_length, exception=None, **kwargs):
+        key = f"{request_type} {name}"
+        failed = exception is not None
+        if self.is_worker:
+            self.pending.record(key, response_time, failed)
+        else:
+            for histograms in [self.total, self.interval] + self.windows:
+                histograms.record(key, response_time, failed)
+
+    def on_report_to_master(self, client_id, data, **kwargs):
+        data[MESSAGE_KEY] = self.pending.to_dict()
+        self.pending = HistogramSet()
+
+    def on_worker_report(self, client_id, data, **kwargs):
+        if MESSAGE_KEY not in data:
+            return
+        received = HistogramSet.from_dict(data[MESSAGE_KEY])
+        for histograms in [self.total, self.interval] + self.windows:
+            histograms.merge(received)
+
+    def open_window(self):
+        window = HistogramSet()
+        self.windows.append(window)
+        return window
+
+    def close_window(self, window):
+        if window in self.windows:
+            self.windows.remove(window)
+
+    def on_test_start(self, environment, **kwargs):
+        if self.is_worker:
+            return
+        self.total = HistogramSet()
+        self.interval = HistogramSet()
+        if self.log_path:
+            directory = os.path.dirname(self.log_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.log_path, "w", newline="") as f:
+                csv.writer(f).writerow(snapshot_header())
+        self._snapshots = gevent.spawn(self._snapshot_loop)
+
+    def _snapshot_loop(self):
+        while True:
+            gevent.sleep(self.snapshot_interval)
+            self.write_snapshot()
+
+    def write_snapshot(self):
+        interval, self.interval = self.interval, HistogramSet()
+        if not self.log_path or not interval.histograms:
+            return
+        timestamp = int(time.time())
+        with open(self.log_path, "a", newline="") as f:
+            writer = csv.writer(f)
+            for name, histogram in interval.rows():
+                writer.writerow(snapshot_row(timestamp, name, histogram, self.snapshot_interval))
+
+    def on_test_stop(self, environment, **kwargs):
+        if self.is_worker:
+            return
+        if self._snapshots is not None:
+            self._snapshots.kill(block=False)
+            self._snapshots = None
+            self.write_snapshot()
+        print_summary(self.total)
+
+
+def snapshot_header():
+    return ["Timestamp", "Name", "Requests/s", "Requests", "Failures", "Mean"] + \
+        [f"P{pct:g}" for pct in PERCENTILES] + ["Max"]
+
+
+def snapshot_row(timestamp, name, histogram, interval):
+    return [
+        timestamp, name,
+        round((histogram.count + histogram.errors) / interval, 2),
+        histogram.count, histogram.errors,
+        round(histogram.mean(), 2) if histogram.count else "",
+    ] + [
+        round(histogram.percentile(pct), 2) if histogram.count else "" for pct in PERCENTILES
+    ] + [round(histogram.max_us / 1000, 2) if histogram.count else ""]
+
+
+def print_summary(histograms):
+    aggregated = histograms.histograms.get(AGGREGATED)
+    if aggregated is None or not aggregated.count:
+        print("\nNo successful requests recorded")
+        return
+
+    total = aggregated.count + aggregated.errors
+    print("LOAD TEST SUMMARY")
+    print(f"Total successful requests: {aggregated.count}")
+    print(f"Total errors: {aggregated.errors}")
+    print(f"Error rate: {(aggregated.errors / total * 100):.2f}%")
+    print(f"\nLatency Percentiles (±{RELATIVE_ERROR:.1%}):")
+    header = f"  {'Endpoint':<32}{'Requests':>10}" + "".join(f"{f'P{pct:g}':>10}" for pct in PERCENTILES)
+    print(header + f"{'Max':>10}")
+    for name, histogram in histograms.rows():
+        if not histogram.count:
+            print(f"  {name:<32}{0:>10}  (errors only: {histogram.errors})")
+            continue
+        line = f"  {name:<32}{histogram.count:>10}"
+        line += "".join(f"{histogram.percentile(pct):>10.2f}" for pct in PERCENTILES)
+        print(line + f"{histogram.max_us / 1000:>10.2f}")
+    print(f"\n  Min:          {aggregated.min_us / 1000:.2f} ms")
+    print(f"  Max:          {aggregated.max_us / 1000:.2f} ms")
+    print(f"  Average:      {aggregated.mean():.2f} ms")
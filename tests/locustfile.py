@@ -1,31 +1,46 @@
 from locust import HttpUser, task, between, events
-import random
-import csv
 import os
+import sys
 import time
 
+from latency_histogram import LatencyRecorder
+import traffic
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "database"))
+from parquet_cache import is_fresh, read_column  # noqa: E402
+
 # Load valid user IDs from CSV
 USER_IDS = []
+# Picks which user each request asks for (--user-distribution, see traffic.py)
+USER_CHOOSER = None
 # CSV_PATH = "../data/processed/users_top10k.csv"
 CSV_PATH = "../data/processed/users_sample10.csv"
 
 
+@events.init_command_line_parser.add_listener
+def on_parser_init(parser):
+    traffic.add_arguments(parser)
+
+
 @events.init.add_listener
 def on_locust_init(environment, **kwargs):
-    global USER_IDS
+    global USER_IDS, USER_CHOOSER
 
-    if not os.path.exists(CSV_PATH):
+    if not os.path.exists(CSV_PATH) and not is_fresh(CSV_PATH):
         print(f"ERROR: User CSV not found at {CSV_PATH}")
         print(f"Current directory: {os.getcwd()}")
         return
 
-    with open(CSV_PATH, 'r') as f:
-        reader = csv.reader(f)
-        next(reader)  # Skip header
-        USER_IDS = [row[0] for row in reader]
+    # From the Parquet copy when parquet_cache.py has written a fresh one
+    USER_IDS = read_column(CSV_PATH)
 
     print(f"Loaded {len(USER_IDS)} user IDs for testing")
 
+    if USER_IDS:
+        USER_CHOOSER = traffic.chooser_from_options(environment.parsed_options, USER_IDS)
+        distribution = getattr(environment.parsed_options, "user_distribution", "uniform")
+        print(f"User distribution: {distribution}")
+
 
 class RecommendationUser(HttpUser):
     # Wait 1-3 seconds between requests (simulates real user behavior)
@@ -36,7 +51,7 @@ class RecommendationUser(HttpUser):
         if not USER_IDS:
             return
 
-        user_id = random.choice(USER_IDS)
+        user_id = USER_CHOOSER.choose()
 
         with self.client.get(
                 f"/recommend/{user_id}",
@@ -90,48 +105,14 @@ class BurstTrafficUser(HttpUser):
         if not USER_IDS:
             return
 
-        user_id = random.choice(USER_IDS)
+        user_id = USER_CHOOSER.choose()
         self.client.get(
             f"/recommend/{user_id}",
             name="/recommend/[user_id]"
         )
 
 
-request_times = []
-error_count = 0
-
-
-@events.request.add_listener
-def on_request(request_type, name, response_time, response_length, exception, **kwargs):
-    global request_times, error_count
-
-    if exception:
-        error_count += 1
-    else:
-        request_times.append(response_time)
-
-
-@events.test_stop.add_listener
-def on_test_stop(environment, **kwargs):
-    if not request_times:
-        print("\nNo successful requests recorded")
-        return
-
-    request_times.sort()
-    total_requests = len(request_times)
-
-    p50_index = int(total_requests * 0.50)
-    p95_index = int(total_requests * 0.95)
-    p99_index = int(total_requests * 0.99)
-
-    print("LOAD TEST SUMMARY")
-    print(f"Total successful requests: {total_requests}")
-    print(f"Total errors: {error_count}")
-    print(f"Error rate: {(error_count / (total_requests + error_count) * 100):.2f}%")
-    print(f"\nLatency Percentiles:")
-    print(f"  P50 (median): {request_times[p50_index]:.2f} ms")
-    print(f"  P95:          {request_times[p95_index]:.2f} ms")
-    print(f"  P99:          {request_times[p99_index]:.2f} ms")
-    print(f"  Min:          {min(request_times):.2f} ms")
-    print(f"  Max:          {max(request_times):.2f} ms")
-    print(f"  Average:      {sum(request_times) / len(request_times):.2f} ms")
\ No newline at end of file
+# Per-endpoint latency histograms: fixed memory, merged across distributed
+# workers, snapshotted every few seconds (see latency_histogram.py)
+LATENCY = LatencyRecorder()
+LATENCY.register(events)
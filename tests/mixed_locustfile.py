@@ -0,0 +1,253 @@
+"""
+Mixed read/write workload: GET /recommend reads contending with
+POST /interaction writes on the same Postgres instance.
+
+Each MixedWorkloadUser request is a write with probability --write-ratio,
+otherwise a read. Writes post ratings for users from the users CSV (picked
+with the same --user-distribution as reads) on items from the items CSV,
+with ratings drawn from the rating distribution of the interactions sample.
+
+At test stop:
+- every acknowledged write (the interaction_id returned by the API) is
+  checked against the interactions table; acknowledged-but-missing rows are
+  reported (--cleanup-writes deletes the verified rows afterwards)
+- one row per run is appended to ../results/mixed_workload.csv, and read
+  latency is compared with earlier rows at the same user count and a lower
+  write ratio, so a sweep (--write-ratio 0, 0.1, 0.3, ...) shows how reads
+  degrade as the write share grows
+
+    locust -f mixed_locustfile.py --host=http://localhost:8000 --headless \
+        --users 50 --spawn-rate 10 --run-time 3m --write-ratio 0.2
+"""
+import csv
+import os
+import random
+from datetime import datetime
+
+from locust import HttpUser, task, between, events
+from locust.runners import WorkerRunner
+
+import locustfile  # user IDs, --user-distribution and the latency histograms
+from parquet_cache import read_column  # on the path once locustfile is imported
+
+ITEMS_CSV = "../data/processed/items_metadata.csv"
+INTERACTIONS_CSV = "../data/processed/interactions_sample.csv"
+RESULTS_CSV = "../results/mixed_workload.csv"
+WRITE_RATIO = 0.1
+READ_NAME = "GET /recommend/[user_id]"
+WRITE_NAME = "POST /interaction"
+MESSAGE_KEY = "acked_interactions"
+VERIFY_CHUNK = 10000
+
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "database": os.getenv("DB_NAME", "recommendations"),
+    "user": os.getenv("DB_USER", "s4p"),
+    "password": os.getenv("DB_PASSWORD", ""),
+}
+
+ITEM_IDS = []
+RATINGS = []
+# interaction_ids the API acknowledged; on workers, only those not yet sent to the master
+ACKED = []
+IS_WORKER = False
+START_TIME = None
+
+
+@events.init_command_line_parser.add_listener
+def on_parser_init(parser):
+    parser.add_argument("--write-ratio", type=float, default=WRITE_RATIO,
+                        help="Fraction of requests that are POST /interaction")
+    parser.add_argument("--cleanup-writes", action="store_true",
+                        help="Delete the verified interactions after the run")
+
+
+@events.init.add_listener
+def on_locust_init(environment, **kwargs):
+    global ITEM_IDS, RATINGS, IS_WORKER
+    IS_WORKER = isinstance(environment.runner, WorkerRunner)
+
+    ITEM_IDS = read_column(ITEMS_CSV)
+
+    # Empirical rating distribution (1.0-5.0) from the interactions sample
+    with open(INTERACTIONS_CSV, newline="") as f:
+        RATINGS = [float(row["Rating"]) for row in csv.DictReader(f)]
+
+    print(f"Loaded {len(ITEM_IDS)} item IDs and {len(RATINGS)} sample ratings for writes")
+
+
+class MixedWorkloadUser(HttpUser):
+    wait_time = between(1, 3)
+
+    def on_start(self):
+        options = self.environment.parsed_options
+        self.write_ratio = getattr(options, "write_ratio", WRITE_RATIO) if options else WRITE_RATIO
+
+    @task
+    def read_or_write(self):
+        if not locustfile.USER_IDS:
+            return
+        if random.random() < self.write_ratio:
+            self.post_interaction()
+        else:
+            self.get_recommendations()
+
+    def get_recommendations(self):
+        user_id = locustfile.USER_CHOOSER.choose()
+        with self.client.get(
+                f"/recommend/{user_id}",
+                catch_response=True,
+                name="/recommend/[user_id]"
+        ) as response:
+            if response.status_code == 200:
+                response.success()
+            else:
+                response.failure(f"Status code: {response.status_code}")
+
+    def post_interaction(self):
+        if not ITEM_IDS:
+            return
+        params = {
+            "user_id": locustfile.USER_CHOOSER.choose(),
+            "item_id": random.choice(ITEM_IDS),
+            "rating": random.choice(RATINGS) if RATINGS else float(random.randint(1, 5)),
+        }
+        with self.client.post("/interaction", params=params, catch_response=True,
+                              name="/interaction") as response:
+            if response.status_code != 200:
+                response.failure(f"Status code: {response.status_code}")
+                return
+            try:
+                ACKED.append(int(response.json()["interaction_id"]))
+                response.success()
+            except (ValueError, KeyError, TypeError) as e:
+                response.failure(f"No interaction_id in response: {e}")
+
+
+@events.report_to_master.add_listener
+def on_report_to_master(client_id, data, **kwargs):
+    global ACKED
+    data[MESSAGE_KEY] = ACKED
+    ACKED = []
+
+
+@events.worker_report.add_listener
+def on_worker_report(client_id, data, **kwargs):
+    ACKED.extend(data.get(MESSAGE_KEY, []))
+
+
+def verify_writes(interaction_ids, cleanup=False):
+    """(found, missing ids) for the acknowledged writes; None if the DB is unreachable."""
+    try:
+        import psycopg2  # only the machine that verifies needs it
+    except ImportError:
+        print("psycopg2 not installed; skipping write verification")
+        return None
+
+    try:
+        conn = psycopg2.connect(**DB_CONFIG)
+    except Exception as e:
+        print(f"Could not connect to Postgres to verify writes: {e}")
+        return None
+
+    found = set()
+    try:
+        with conn.cursor() as cur:
+            for start in range(0, len(interaction_ids), VERIFY_CHUNK):
+                chunk = interaction_ids[start:start + VERIFY_CHUNK]
+                cur.execute("SELECT interaction_id FROM interactions WHERE interaction_id = ANY(%s)", (chunk,))
+                found.update(row[0] for row in cur.fetchall())
+            if cleanup and found:
+                cur.execute("DELETE FROM interactions WHERE interaction_id = ANY(%s)", (list(found),))
+                print(f"Deleted {cur.rowcount} load-test interactions")
+        conn.commit()
+    finally:
+        conn.close()
+    return len(found), sorted(set(interaction_ids) - found)
+
+
+def histogram_summary(histograms, name, duration):
+    histogram = histograms.histograms.get(name)
+    if histogram is None or not histogram.count:
+        return {"rps": 0.0, "p50": None, "p95": None, "p99": None, "errors": histogram.errors if histogram else 0}
+    return {
+        "rps": round((histogram.count + histogram.errors) / duration, 2) if duration else 0.0,
+        "p50": round(histogram.percentile(50), 2),
+        "p95": round(histogram.percentile(95), 2),
+        "p99": round(histogram.percentile(99), 2),
+        "errors": histogram.errors,
+    }
+
+
+def read_results():
+    if not os.path.exists(RESULTS_CSV):
+        return []
+    with open(RESULTS_CSV, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+@events.test_start.add_listener
+def on_test_start(environment, **kwargs):
+    global START_TIME
+    START_TIME = datetime.now()
+
+
+@events.test_stop.add_listener
+def on_test_stop(environment, **kwargs):
+    if IS_WORKER:
+        return
+
+    options = environment.parsed_options
+    duration = (datetime.now() - START_TIME).total_seconds() if START_TIME else 0
+    histograms = locustfile.LATENCY.total
+    reads = histogram_summary(histograms, READ_NAME, duration)
+    writes = histogram_summary(histograms, WRITE_NAME, duration)
+
+    acked = list(ACKED)
+    verified = verify_writes(acked, cleanup=getattr(options, "cleanup_writes", False)) if acked else (0, [])
+    found, missing = verified if verified else (None, [])
+
+    row = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "users": environment.runner.target_user_count if environment.runner else "",
+        "write_ratio": getattr(options, "write_ratio", WRITE_RATIO),
+        "duration_s": round(duration, 1),
+        "read_rps": reads["rps"], "read_p50_ms": reads["p50"],
+        "read_p95_ms": reads["p95"], "read_p99_ms": reads["p99"], "read_errors": reads["errors"],
+        "write_rps": writes["rps"], "write_p50_ms": writes["p50"],
+        "write_p95_ms": writes["p95"], "write_p99_ms": writes["p99"], "write_errors": writes["errors"],
+        "writes_acked": len(acked),
+        "writes_verified": "" if found is None else found,
+        "writes_missing": "" if found is None else len(missing),
+    }
+
+    print("\nMIXED WORKLOAD SUMMARY")
+    print(f"Write ratio: {row['write_ratio']:.0%}")
+    print(f"  Reads:  {reads['rps']} req/s, P50 {reads['p50']}ms, P95 {reads['p95']}ms, P99 {reads['p99']}ms")
+    print(f"  Writes: {writes['rps']} req/s, P50 {writes['p50']}ms, P95 {writes['p95']}ms, P99 {writes['p99']}ms")
+    if found is None:
+        print(f"  {len(acked)} writes acknowledged (not verified)")
+    else:
+        print(f"  {len(acked)} writes acknowledged, {found} found in interactions, {len(missing)} missing")
+        if missing:
+            print(f"  ⚠️  Missing interaction_ids (first 20): {missing[:20]}")
+
+    # Read latency against earlier runs at the same user count with fewer writes
+    previous = [
+        r for r in read_results()
+        if str(r["users"]) == str(row["users"]) and float(r["write_ratio"]) < row["write_ratio"] and r["read_p95_ms"]
+    ]
+    if previous and reads["p95"]:
+        baseline = min(previous, key=lambda r: float(r["write_ratio"]))
+        change = reads["p95"] / float(baseline["read_p95_ms"]) - 1
+        print(f"  Read P95 vs {float(baseline['write_ratio']):.0%} writes at {row['users']} users: "
+              f"{float(baseline['read_p95_ms'])}ms -> {reads['p95']}ms ({change:+.1%})")
+
+    new_file = not os.path.exists(RESULTS_CSV)
+    os.makedirs(os.path.dirname(RESULTS_CSV), exist_ok=True)
+    with open(RESULTS_CSV, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(row))
+        if new_file:
+            writer.writeheader()
+        writer.writerow(row)
+    print(f"Results appended to {RESULTS_CSV}")
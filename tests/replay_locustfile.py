@@ -0,0 +1,76 @@
+"""
+Replays a recorded (or synthesized) JSONL trace against the API, keeping
+the trace's inter-arrival times, divided by --trace-speedup. See traffic.py
+for the trace format.
+
+    locust -f replay_locustfile.py --host=http://localhost:8000 --headless \
+        --users 50 --spawn-rate 50 --trace ../results/trace_zipf.jsonl --trace-speedup 2
+
+--users must cover the trace's peak concurrency. If the replay falls behind,
+the late-request count printed at the end says by how much. Meant for a
+single locust process: distributed workers would each replay the whole trace.
+"""
+import gevent
+import time
+
+from locust import HttpUser, task, constant, events
+from locust.exception import StopUser
+
+from latency_histogram import LatencyRecorder
+import traffic
+
+SCHEDULE = None
+
+
+@events.init_command_line_parser.add_listener
+def on_parser_init(parser):
+    traffic.add_arguments(parser)
+
+
+@events.init.add_listener
+def on_locust_init(environment, **kwargs):
+    global SCHEDULE
+    options = environment.parsed_options
+    if options is None or not options.trace:
+        print("ERROR: --trace is required for replay_locustfile.py")
+        return
+    entries = traffic.load_trace(options.trace)
+    SCHEDULE = traffic.TraceSchedule(entries, speedup=options.trace_speedup, loop=options.trace_loop)
+    print(f"Loaded {len(entries)} trace entries spanning {entries[-1]['t']:.1f}s "
+          f"(replaying at {options.trace_speedup}x)")
+
+
+class TraceReplayUser(HttpUser):
+    wait_time = constant(0)
+
+    @task
+    def replay(self):
+        scheduled = SCHEDULE.next() if SCHEDULE else None
+        if scheduled is None:
+            raise StopUser()
+
+        due, entry = scheduled
+        delay = due - time.monotonic()
+        if delay > 0:
+            gevent.sleep(delay)
+
+        self.client.request(
+            entry["method"],
+            entry["path"],
+            name=entry["name"],
+            params=entry.get("params"),
+            json=entry.get("json"),
+        )
+
+
+@events.test_stop.add_listener
+def on_test_stop(environment, **kwargs):
+    if SCHEDULE is None:
+        return
+    print(f"\nTrace replay: {SCHEDULE.position} requests sent, "
+          f"{SCHEDULE.late} more than {SCHEDULE.LATE_THRESHOLD * 1000:.0f}ms late "
+          f"(max lag {SCHEDULE.max_lag:.2f}s)")
+
+
+LATENCY = LatencyRecorder()
+LATENCY.register(events)
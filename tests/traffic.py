@@ -0,0 +1,254 @@
+"""
+Traffic shapes for the load tests.
+
+Key choosers (which user a simulated client asks for):
+    uniform  every user equally likely (the old random.choice behaviour)
+    zipf     P(rank k) ~ 1 / k^s; s around 1 is typical of real key popularity
+    hotset   hot_share of requests go to a hot_fraction of the users
+
+Users are shuffled with a fixed seed before ranks are assigned, so the hot
+users are not just the first rows of the CSV, and every worker in a
+distributed run agrees on which users are hot.
+
+Trace replay drives requests from a JSONL trace, one request per line:
+
+    {"t": 0.000, "method": "GET", "path": "/recommend/A1B2C3"}
+    {"t": 0.041, "method": "POST", "path": "/interaction",
+     "params": {"user_id": "A1B2C3", "item_id": "B000123", "rating": 4.0}}
+
+"t" is seconds since the start of the trace (or any epoch; it is rebased to
+the first entry). "name" is optional; by default ids in known paths are
+collapsed so locust groups them (/recommend/[user_id]). A trace can be
+synthesized from a chooser with Poisson arrivals:
+
+    python traffic.py synthesize --distribution zipf --rate 50 --duration 300 \
+        --output ../results/trace_zipf.jsonl
+
+Locust options (added by add_arguments, see locustfile.py and
+replay_locustfile.py):
+    --user-distribution uniform|zipf|hotset  --zipf-s 1.1
+    --hot-fraction 0.01 --hot-share 0.9      --traffic-seed 42
+    --trace PATH --trace-speedup 1.0 --trace-loop
+
+Standard library only, so traces can be generated without locust installed.
+"""
+import argparse
+import bisect
+import csv
+import itertools
+import json
+import random
+import re
+import time
+
+DISTRIBUTIONS = ("uniform", "zipf", "hotset")
+DEFAULT_DISTRIBUTION = "uniform"
+ZIPF_S = 1.1
+HOT_FRACTION = 0.01
+HOT_SHARE = 0.9
+SEED = 42
+USERS_CSV = "../data/processed/users_sample10.csv"
+
+# Request names locust should group by, so per-key paths do not each get a stats row
+PATH_NAMES = [
+    (re.compile(r"^/recommend/[^/?]+"), "/recommend/[user_id]"),
+]
+
+
+#################### --- KEY CHOOSERS ---#################################
+class UniformChooser:
+    def __init__(self, keys, rng=None):
+        self.keys = list(keys)
+        self.rng = rng or random.Random()
+
+    def choose(self):
+        return self.rng.choice(self.keys)
+
+
+class ZipfChooser:
+    """Inverse-CDF sampling over precomputed cumulative 1/k^s weights."""
+
+    def __init__(self, keys, s=ZIPF_S, seed=SEED, rng=None):
+        self.keys = list(keys)
+        random.Random(seed).shuffle(self.keys)
+        self.cumulative = list(itertools.accumulate(1 / (rank ** s) for rank in range(1, len(self.keys) + 1)))
+        self.rng = rng or random.Random()
+
+    def choose(self):
+        point = self.rng.random() * self.cumulative[-1]
+        return self.keys[min(bisect.bisect_left(self.cumulative, point), len(self.keys) - 1)]
+
+
+class HotSetChooser:
+    def __init__(self, keys, hot_fraction=HOT_FRACTION, hot_share=HOT_SHARE, seed=SEED, rng=None):
+        keys = list(keys)
+        random.Random(seed).shuffle(keys)
+        hot_count = max(1, int(len(keys) * hot_fraction))
+        self.hot = keys[:hot_count]
+        self.cold = keys[hot_count:] or self.hot
+        self.hot_share = hot_share
+        self.rng = rng or random.Random()
+
+    def choose(self):
+        pool = self.hot if self.rng.random() < self.hot_share else self.cold
+        return self.rng.choice(pool)
+
+
+def make_chooser(distribution, keys, zipf_s=ZIPF_S, hot_fraction=HOT_FRACTION,
+                 hot_share=HOT_SHARE, seed=SEED, rng=None):
+    if not keys:
+        raise ValueError("no keys to choose from")
+    if distribution == "uniform":
+        return UniformChooser(keys, rng)
+    if distribution == "zipf":
+        return ZipfChooser(keys, zipf_s, seed, rng)
+    if distribution == "hotset":
+        return HotSetChooser(keys, hot_fraction, hot_share, seed, rng)
+    raise ValueError(f"unknown distribution {distribution!r} (choose from {', '.join(DISTRIBUTIONS)})")
+
+
+def chooser_from_options(options, keys):
+    """Chooser for parsed locust options (falls back to uniform without them)."""
+    if options is None:
+        return make_chooser(DEFAULT_DISTRIBUTION, keys)
+    return make_chooser(
+        getattr(options, "user_distribution", DEFAULT_DISTRIBUTION), keys,
+        zipf_s=getattr(options, "zipf_s", ZIPF_S),
+        hot_fraction=getattr(options, "hot_fraction", HOT_FRACTION),
+        hot_share=getattr(options, "hot_share", HOT_SHARE),
+        seed=getattr(options, "traffic_seed", SEED),
+    )
+
+
+def load_user_ids(path=USERS_CSV):
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        next(reader)  # Skip header
+        return [row[0] for row in reader]
+
+
+#################### --- TRACE REPLAY ---#################################
+def request_name(path):
+    for pattern, name in PATH_NAMES:
+        if pattern.match(path):
+            return name
+    return path.split("?", 1)[0]
+
+
+def load_trace(path):
+    entries = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if "t" not in entry or "path" not in entry:
+                raise ValueError(f"{path}:{line_number}: trace entries need 't' and 'path'")
+            entry.setdefault("method", "GET")
+            entry.setdefault("name", request_name(entry["path"]))
+            entries.append(entry)
+    if not entries:
+        raise ValueError(f"{path}: empty trace")
+
+    entries.sort(key=lambda entry: entry["t"])
+    origin = entries[0]["t"]
+    for entry in entries:
+        entry["t"] = float(entry["t"]) - origin
+    return entries
+
+
+class TraceSchedule:
+    """
+    Hands out trace entries in order, with the monotonic time each is due.
+    Shared by all replay users in a process: whichever user is free takes the
+    next entry, so enough users are needed to cover the trace's peak
+    concurrency. Entries handed out more than LATE_THRESHOLD after they were
+    due are counted, to tell whether the replay kept up.
+    """
+    LATE_THRESHOLD = 0.1  # seconds
+
+    def __init__(self, entries, speedup=1.0, loop=False):
+        self.entries = entries
+        self.speedup = speedup
+        self.loop = loop
+        self.span = entries[-1]["t"] + (entries[-1]["t"] / max(len(entries) - 1, 1))
+        self.position = 0
+        self.origin = None
+        self.late = 0
+        self.max_lag = 0.0
+
+    def next(self):
+        """(due_monotonic, entry), or None when the trace is finished."""
+        if self.origin is None:
+            self.origin = time.monotonic()
+        rounds, index = divmod(self.position, len(self.entries))
+        if rounds and not self.loop:
+            return None
+        self.position += 1
+        entry = self.entries[index]
+        due = self.origin + (rounds * self.span + entry["t"]) / self.speedup
+        lag = time.monotonic() - due
+        if lag > self.LATE_THRESHOLD:
+            self.late += 1
+            self.max_lag = max(self.max_lag, lag)
+        return due, entry
+
+
+def synthesize_trace(chooser, rate, duration, seed=SEED):
+    """Poisson arrivals at `rate` requests/s of GET /recommend/<chosen user>."""
+    rng = random.Random(seed)
+    t = 0.0
+    while True:
+        t += rng.expovariate(rate)
+        if t >= duration:
+            return
+        yield {"t": round(t, 6), "method": "GET", "path": f"/recommend/{chooser.choose()}"}
+
+
+#################### --- LOCUST OPTIONS ---#################################
+def add_arguments(parser):
+    """Listener body for events.init_command_line_parser."""
+    parser.add_argument("--user-distribution", choices=DISTRIBUTIONS, default=DEFAULT_DISTRIBUTION,
+                        help="How simulated clients pick which user to request")
+    parser.add_argument("--zipf-s", type=float, default=ZIPF_S, help="Zipf exponent")
+    parser.add_argument("--hot-fraction", type=float, default=HOT_FRACTION,
+                        help="hotset: fraction of users that are hot")
+    parser.add_argument("--hot-share", type=float, default=HOT_SHARE,
+                        help="hotset: fraction of requests that go to hot users")
+    parser.add_argument("--traffic-seed", type=int, default=SEED,
+                        help="Seed for which users are hot (same on every worker)")
+    parser.add_argument("--trace", default="", help="JSONL trace to replay (replay_locustfile.py)")
+    parser.add_argument("--trace-speedup", type=float, default=1.0,
+                        help="Replay the trace this many times faster than recorded")
+    parser.add_argument("--trace-loop", action="store_true", help="Start the trace over when it ends")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate load-test traces")
+    commands = parser.add_subparsers(dest="command", required=True)
+    synth = commands.add_parser("synthesize", help="Poisson arrivals over a key distribution")
+    synth.add_argument("--users-csv", default=USERS_CSV)
+    synth.add_argument("--distribution", choices=DISTRIBUTIONS, default="zipf")
+    synth.add_argument("--zipf-s", type=float, default=ZIPF_S)
+    synth.add_argument("--hot-fraction", type=float, default=HOT_FRACTION)
+    synth.add_argument("--hot-share", type=float, default=HOT_SHARE)
+    synth.add_argument("--seed", type=int, default=SEED)
+    synth.add_argument("--rate", type=float, default=50.0, help="Mean requests per second")
+    synth.add_argument("--duration", type=float, default=300.0, help="Seconds of traffic")
+    synth.add_argument("--output", required=True)
+    args = parser.parse_args()
+
+    keys = load_user_ids(args.users_csv)
+    chooser = make_chooser(args.distribution, keys, args.zipf_s, args.hot_fraction, args.hot_share,
+                           args.seed, rng=random.Random(args.seed + 1))
+    count = 0
+    with open(args.output, "w") as f:
+        for entry in synthesize_trace(chooser, args.rate, args.duration, args.seed):
+            f.write(json.dumps(entry) + "\n")
+            count += 1
+    print(f"Wrote {count} requests ({args.distribution} over {len(keys)} users) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()